@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import CustomTrip, CustomTripDestination, CustomTripService, Booking
+from .models import CustomTrip, CustomTripDestination, CustomTripService, Booking, IdempotencyKey, NumberSequence, ServiceAvailability, ServiceReservation
 
 class CustomTripDestinationInline(admin.TabularInline):
     model = CustomTripDestination
@@ -17,6 +17,12 @@ class CustomTripAdmin(admin.ModelAdmin):
     list_editable = ('status', 'total_price')
     inlines = [CustomTripDestinationInline, CustomTripServiceInline]
 
+class ServiceReservationInline(admin.TabularInline):
+    model = ServiceReservation
+    extra = 0
+    readonly_fields = ('service', 'date', 'quantity', 'created_at', 'released_at')
+    can_delete = False
+
 @admin.register(Booking)
 class BookingAdmin(admin.ModelAdmin):
     list_display = ('booking_number', 'user', 'booking_type', 'status', 'total_price', 'start_date', 'booking_date')
@@ -24,6 +30,29 @@ class BookingAdmin(admin.ModelAdmin):
     search_fields = ('booking_number', 'user__username')
     list_editable = ('status',)
     readonly_fields = ('booking_number', 'booking_date')
+    inlines = [ServiceReservationInline]
 
     def get_queryset(self, request):
-        return super().get_queryset(request).select_related('user', 'package', 'custom_trip')
\ No newline at end of file
+        return super().get_queryset(request).select_related('user', 'package', 'custom_trip')
+
+@admin.register(ServiceAvailability)
+class ServiceAvailabilityAdmin(admin.ModelAdmin):
+    list_display = ('service', 'date', 'capacity', 'reserved')
+    list_filter = ('date',)
+    search_fields = ('service__name',)
+    # المحجوز يتغير بالحجز والإلغاء فقط؛ تعديل السعة اليدوي مسموح
+    readonly_fields = ('reserved',)
+    list_select_related = ('service',)
+
+@admin.register(NumberSequence)
+class NumberSequenceAdmin(admin.ModelAdmin):
+    list_display = ('name', 'next_value')
+    # التعديل اليدوي قد يعيد توزيع أرقام مستخدمة
+    readonly_fields = ('name', 'next_value')
+
+@admin.register(IdempotencyKey)
+class IdempotencyKeyAdmin(admin.ModelAdmin):
+    list_display = ('key', 'scope', 'user', 'status', 'response_status', 'created_at', 'expires_at')
+    list_filter = ('scope', 'status')
+    search_fields = ('key', 'user__username')
+    readonly_fields = ('user', 'scope', 'key', 'fingerprint', 'status', 'response_status', 'response_body', 'locked_at', 'created_at', 'expires_at')
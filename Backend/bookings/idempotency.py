@@ -0,0 +1,165 @@
+import functools
+import hashlib
+import json
+from contextlib import nullcontext
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import exceptions, status
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+
+
+def _ttl():
+    return getattr(settings, 'IDEMPOTENCY_TTL', 24 * 60 * 60)
+
+
+def fingerprint(request):
+    """بصمة الطلب: الطريقة والمسار والجسم بصيغة ثابتة (ترتيب المفاتيح لا يغير البصمة)"""
+    data = request.data
+    body = data.dict() if hasattr(data, 'dict') else data
+    raw = json.dumps([request.method, request.path, body], sort_keys=True, cls=DjangoJSONEncoder)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+# الردود التي تُحفظ وتُعاد عند التكرار: النجاح وأخطاء الطلب الثابتة. التعارضات (نقص السعة) وأخطاء الخادم مؤقتة
+# فيُحرر المفتاح ليُعاد تنفيذ الطلب نفسه لاحقاً
+STORED_ERROR_STATUSES = (status.HTTP_400_BAD_REQUEST, status.HTTP_404_NOT_FOUND)
+# رمز الخطأ للطلب المكرر أثناء تنفيذ الأول، تمييزاً له عن تعارضات العرض نفسه (409 نقص السعة أو المقاعد)
+IN_PROGRESS_CODE = 'idempotency_key_in_progress'
+
+
+def _claim(user, scope, key, request_fingerprint):
+    """حجز المفتاح بإدراج صفه وتثبيته قبل تنفيذ العرض؛ يعيد (الصف، هل هو لهذا الطلب).
+
+    الصف المثبت يجعل الطلب المكرر المتزامن يرى المفتاح قيد المعالجة فوراً، ولا يُنفذ العرض مرتين.
+    لا يُستولى على مفتاح قيد المعالجة: إن توقفت العملية قبل إكماله يبقى كذلك حتى انتهاء صلاحيته.
+    """
+    from .models import IdempotencyKey
+
+    now = timezone.now()
+    try:
+        with transaction.atomic():
+            return IdempotencyKey.objects.create(
+                user=user, scope=scope, key=key, fingerprint=request_fingerprint,
+                locked_at=now, expires_at=now + timedelta(seconds=_ttl())
+            ), True
+    except IntegrityError:
+        pass
+
+    record = IdempotencyKey.objects.filter(user=user, scope=scope, key=key).first()
+    if record is None:
+        # حُذف المفتاح بين الإدراج والقراءة (انتهت صلاحيته أو حُرر)
+        return _claim(user, scope, key, request_fingerprint)
+    if record.expires_at <= now:
+        IdempotencyKey.objects.filter(pk=record.pk, expires_at=record.expires_at).delete()
+        return _claim(user, scope, key, request_fingerprint)
+    return record, False
+
+
+def _replay(record):
+    response = Response(record.response_body, status=record.response_status)
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def _is_stored(response):
+    if not hasattr(response, 'data'):
+        return False
+    return status.is_success(response.status_code) or response.status_code in STORED_ERROR_STATUSES
+
+
+def _complete(owned_record, response):
+    owned_record.update(
+        status='completed',
+        response_status=response.status_code,
+        response_body=json.loads(json.dumps(response.data, cls=DjangoJSONEncoder))
+    )
+
+
+def idempotent(scope, atomic=True):
+    """تفعيل ترويسة Idempotency-Key لعرض كتابة: الطلب المكرر يعيد الرد المحفوظ دون تنفيذ العرض مجدداً.
+
+    atomic=True ينفذ العرض وإكمال المفتاح في معاملة واحدة. العروض التي تستدعي خدمة خارجية (بوابة الدفع)
+    تمرر atomic=False وتدير معاملاتها بنفسها حتى لا تُمسك أقفال قاعدة البيانات أثناء الاستدعاء.
+    """
+
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            key = request.headers.get(HEADER)
+            if not key or not request.user.is_authenticated:
+                return view(request, *args, **kwargs)
+            if len(key) > MAX_KEY_LENGTH:
+                return Response(
+                    {'error': f'طول {HEADER} يجب ألا يتجاوز {MAX_KEY_LENGTH} حرفاً'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            request_fingerprint = fingerprint(request)
+            record, owned = _claim(request.user, scope, key, request_fingerprint)
+            if not owned:
+                if record.fingerprint != request_fingerprint:
+                    return Response(
+                        {'error': f'{HEADER} مستخدم مسبقاً لطلب مختلف'},
+                        status=status.HTTP_422_UNPROCESSABLE_ENTITY
+                    )
+                if record.status != 'completed':
+                    response = Response(
+                        {'error': 'طلب بنفس المفتاح قيد المعالجة، أعد المحاولة لاحقاً', 'code': IN_PROGRESS_CODE},
+                        status=status.HTTP_409_CONFLICT
+                    )
+                    response['Retry-After'] = '1'
+                    return response
+                return _replay(record)
+
+            # locked_at يميز حجز هذا الطلب: لا يُعدَّل ولا يُحذف إلا الصف الذي أدرجه
+            owned_record = type(record).objects.filter(pk=record.pk, locked_at=record.locked_at)
+            try:
+                with transaction.atomic() if atomic else nullcontext():
+                    response = view(request, *args, **kwargs)
+                    if _is_stored(response):
+                        _complete(owned_record, response)
+                        return response
+                    if atomic and response.status_code >= 500:
+                        # خطأ مؤقت: التراجع عن كتابات العرض كلها
+                        transaction.set_rollback(True)
+            except exceptions.APIException as exc:
+                # أخطاء التحقق المرفوعة من العرض (400) ثابتة فتُحفظ كالردود؛ وكتابات العرض تراجعت مع المعاملة
+                response = api_settings.EXCEPTION_HANDLER(exc, {'request': request, 'args': args, 'kwargs': kwargs})
+                if response is None or not _is_stored(response):
+                    owned_record.delete()
+                    raise
+                _complete(owned_record, response)
+                return response
+            except BaseException:
+                owned_record.delete()
+                raise
+            # رد لا يُحفظ: يُحرر المفتاح فتُنفذ إعادة المحاولة من جديد
+            owned_record.delete()
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def purge_expired(batch_size=1000):
+    """حذف المفاتيح المنتهية على دفعات؛ يعيد عدد المحذوف"""
+    from .models import IdempotencyKey
+
+    deleted = 0
+    while True:
+        ids = list(
+            IdempotencyKey.objects.filter(expires_at__lte=timezone.now())
+            .values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return deleted
+        deleted += IdempotencyKey.objects.filter(id__in=ids).delete()[0]
@@ -0,0 +1,172 @@
+from datetime import timedelta
+
+from django.db.models import F, OuterRef, Subquery
+from django.utils import timezone
+
+from packages import catalog_cache
+from packages.models import PackageDeparture, PackageService, Service
+
+from .models import CustomTripService, ServiceAvailability, ServiceReservation
+
+
+class InsufficientCapacity(Exception):
+    """لا يكفي المتبقي من سعة خدمة في يوم معين للكمية المطلوبة"""
+
+    def __init__(self, service_id, date, requested, remaining):
+        super().__init__(f'service {service_id} on {date}: requested {requested}, remaining {remaining}')
+        self.service_id = service_id
+        self.date = date
+        self.requested = requested
+        self.remaining = remaining
+
+
+class InsufficientSeats(Exception):
+    """لا يكفي المتبقي من مقاعد موعد الانطلاق لعدد المسافرين"""
+
+    def __init__(self, departure, requested):
+        super().__init__(f'departure {departure.pk}: requested {requested}, remaining {departure.seats_remaining}')
+        self.departure = departure
+        self.requested = requested
+
+
+def reserve_seats(booking):
+    """خصم مقاعد موعد انطلاق الباقة في تاريخ بدء الحجز (إن كانت الباقة مجدولة) بتحديث شرطي واحد"""
+    if booking.booking_type != 'package' or not booking.package_id:
+        return None
+    departure = PackageDeparture.objects.filter(
+        package_id=booking.package_id, departure_date=booking.start_date, is_active=True
+    ).only('id').first()
+    if departure is None:
+        return None
+    updated = PackageDeparture.objects.filter(
+        pk=departure.pk, seats_remaining__gte=booking.number_of_travelers
+    ).update(seats_remaining=F('seats_remaining') - booking.number_of_travelers)
+    if not updated:
+        departure.refresh_from_db(fields=['seats_remaining'])
+        raise InsufficientSeats(departure, booking.number_of_travelers)
+    booking.departure = departure
+    booking.save(update_fields=['departure'])
+    # update() لا يطلق الإشارات؛ نتائج البحث المخزنة حسب المقاعد تُبطل يدوياً
+    catalog_cache.bump_generation_on_commit('departure')
+    return departure
+
+
+def booking_requirements(booking):
+    """الكميات المطلوبة من كل خدمة في كل يوم {(service_id, date): quantity}"""
+    if booking.booking_type == 'package' and booking.package_id:
+        items = PackageService.objects.filter(package_id=booking.package_id).values_list('service_id', 'day_number', 'quantity')
+        items = [(service_id, day_number, None, quantity) for service_id, day_number, quantity in items]
+    elif booking.custom_trip_id:
+        items = CustomTripService.objects.filter(custom_trip_id=booking.custom_trip_id).values_list(
+            'service_id', 'day_number', 'date', 'quantity'
+        )
+    else:
+        return {}
+
+    requirements = {}
+    for service_id, day_number, date, quantity in items:
+        # الكمية في الباقة أو الرحلة لكل مسافر؛ اليوم N من الرحلة = تاريخ البدء + N - 1
+        date = date or booking.start_date + timedelta(days=day_number - 1)
+        key = (service_id, date)
+        requirements[key] = requirements.get(key, 0) + quantity * booking.number_of_travelers
+    return requirements
+
+
+def _ensure_rows(requirements):
+    """إنشاء صفوف التوفر الناقصة بسعة الخدمة؛ يعيد الطلبات على الخدمات محدودة السعة فقط مرتبة بـ(الخدمة، التاريخ).
+
+    الإدراج والتحديثات بعده بالترتيب نفسه في كل الحجوزات، فلا تأخذ معاملتان أقفال الصفوف بترتيبين متعاكسين.
+    """
+    capacities = dict(
+        Service.objects.filter(id__in={service_id for service_id, _ in requirements}, capacity__isnull=False)
+        .values_list('id', 'capacity')
+    )
+    limited = {key: requirements[key] for key in sorted(requirements) if key[0] in capacities}
+    if limited:
+        ServiceAvailability.objects.bulk_create(
+            [
+                ServiceAvailability(service_id=service_id, date=date, capacity=max(capacities[service_id], 0))
+                for service_id, date in limited
+            ],
+            ignore_conflicts=True,
+        )
+    return limited
+
+
+def reserve(booking):
+    """خصم الكميات المطلوبة من المخزون وتسجيلها؛ يجب استدعاؤها داخل معاملة الحجز.
+
+    كل خصم تحديث شرطي واحد (reserved + n <= capacity) فلا يُباع أكثر من السعة مهما تزامنت الطلبات،
+    والصفوف تُنشأ وتُحدَّث بترتيب ثابت (الخدمة ثم التاريخ) حتى لا تتقاطع أقفال معاملتين.
+    """
+    limited = _ensure_rows(booking_requirements(booking))
+    # السعة تُقرأ من الخدمة نفسها في التحديث الشرطي: عمود capacity نسخة تُزامَن هنا،
+    # فتعديل سعة الخدمة بعد إنشاء الصف (من الإدارة أو الاستيراد) يسري فوراً
+    capacity = Subquery(Service.objects.filter(pk=OuterRef('service_id')).values('capacity')[:1])
+    for (service_id, date), quantity in limited.items():
+        updated = ServiceAvailability.objects.filter(
+            service_id=service_id, date=date, reserved__lte=capacity - quantity
+        ).update(reserved=F('reserved') + quantity, capacity=capacity)
+        if not updated:
+            row = ServiceAvailability.objects.only('reserved').get(service_id=service_id, date=date)
+            remaining = max(Service.objects.values_list('capacity', flat=True).get(pk=service_id) - row.reserved, 0)
+            raise InsufficientCapacity(service_id, date, quantity, remaining)
+
+    ServiceReservation.objects.bulk_create([
+        ServiceReservation(booking=booking, service_id=service_id, date=date, quantity=quantity)
+        for (service_id, date), quantity in limited.items()
+    ])
+    return limited
+
+
+def release_seats(booking):
+    """إعادة مقاعد موعد الانطلاق عند الإلغاء (يُستدعى مرة واحدة مع قفل الحجز)"""
+    if not booking.departure_id:
+        return 0
+    PackageDeparture.objects.filter(pk=booking.departure_id).update(
+        seats_remaining=F('seats_remaining') + booking.number_of_travelers
+    )
+    catalog_cache.bump_generation_on_commit('departure')
+    return booking.number_of_travelers
+
+
+def release(booking):
+    """إعادة ما حجزه الحجز إلى المخزون (مرة واحدة فقط)؛ يعيد عدد السجلات المُرجعة"""
+    reservations = list(
+        ServiceReservation.objects.filter(booking=booking, released_at__isnull=True)
+        .order_by('service_id', 'date')
+        .values_list('id', 'service_id', 'date', 'quantity')
+    )
+    if not reservations:
+        return 0
+    # تعليم السجلات أولاً بشرط عدم إرجاعها؛ إلغاءان متزامنان لا يعيدان الكمية مرتين
+    released = ServiceReservation.objects.filter(
+        id__in=[reservation_id for reservation_id, _, _, _ in reservations], released_at__isnull=True
+    ).update(released_at=timezone.now())
+    if released != len(reservations):
+        return 0
+    for _, service_id, date, quantity in reservations:
+        ServiceAvailability.objects.filter(service_id=service_id, date=date).update(reserved=F('reserved') - quantity)
+    return released
+
+
+def availability(service_ids, start_date, end_date):
+    """المتبقي لكل خدمة في كل يوم من المدى [start_date, end_date] باستعلامين؛ None = غير محدودة"""
+    capacities = dict(Service.objects.filter(id__in=service_ids).values_list('id', 'capacity'))
+    rows = ServiceAvailability.objects.filter(
+        service_id__in=[service_id for service_id, capacity in capacities.items() if capacity is not None],
+        date__gte=start_date, date__lte=end_date
+    ).values_list('service_id', 'date', 'reserved')
+    # المتبقي من سعة الخدمة الحالية لا من نسخة الصف (قد تكون أقدم من تعديل السعة)
+    booked = {
+        (service_id, date): max(capacities[service_id] - reserved, 0) for service_id, date, reserved in rows
+    }
+
+    days = [start_date + timedelta(days=offset) for offset in range((end_date - start_date).days + 1)]
+    result = {}
+    for service_id, capacity in capacities.items():
+        result[service_id] = {
+            date: booked.get((service_id, date), None if capacity is None else max(capacity, 0))
+            for date in days
+        }
+    return result
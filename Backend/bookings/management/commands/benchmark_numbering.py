@@ -0,0 +1,54 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from bookings.models import Booking
+from bookings.numbering import DOMAIN, NumberAllocator
+
+
+class Command(BaseCommand):
+    help = 'قياس توزيع أرقام الحجوزات من عدة عمال متزامنين والتحقق من عدم تكرارها'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8, help='عدد العمال (لكل عامل موزع مستقل كأنه عملية منفصلة)')
+        parser.add_argument('--count', type=int, default=5000, help='عدد الأرقام لكل عامل')
+        parser.add_argument('--block-size', type=int, default=None)
+        parser.add_argument('--sequence', default='benchmark', help='اسم التسلسل (منفصل عن تسلسلات الإنتاج افتراضياً)')
+
+    def handle(self, *args, **options):
+        workers, count = options['workers'], options['count']
+        allocators = [NumberAllocator(options['block_size']) for _ in range(workers)]
+        results = [[] for _ in range(workers)]
+
+        def run(index):
+            try:
+                for _ in range(count):
+                    results[index].append(allocators[index].next_number(options['sequence'], 'BM'))
+            finally:
+                close_old_connections()
+
+        threads = [threading.Thread(target=run, args=(index,)) for index in range(workers)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        numbers = [number for result in results for number in result]
+        duplicates = len(numbers) - len(set(numbers))
+        reservations = sum(allocator.reservations for allocator in allocators)
+        self.stdout.write(
+            f'{len(numbers)} رقم في {elapsed:.3f} ثانية ({len(numbers) / elapsed:.0f} رقم/ث)، '
+            f'{reservations} رحلة لقاعدة البيانات، {duplicates} مكرر'
+        )
+
+        # للمقارنة: التصادمات المتوقعة لو وُلّد العدد نفسه عشوائياً من ثمانية أرقام (مسألة عيد الميلاد)
+        existing = Booking.objects.count()
+        total = existing + len(numbers)
+        expected = (total * (total - 1) - existing * (existing - 1)) / (2 * DOMAIN)
+        self.stdout.write(f'التصادمات المتوقعة بالأرقام العشوائية فوق {existing} حجز: {expected:.2f}')
+        if duplicates:
+            self.stderr.write(self.style.ERROR('أرقام مكررة!'))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from bookings import idempotency
+
+
+class Command(BaseCommand):
+    help = 'حذف مفاتيح Idempotency-Key المنتهية صلاحيتها'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        deleted = idempotency.purge_expired(options['batch_size'])
+        self.stdout.write(f'حُذف {deleted} مفتاح منتهٍ')
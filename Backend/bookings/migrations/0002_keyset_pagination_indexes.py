@@ -0,0 +1,20 @@
+# Generated by Django 5.2.7 on 2026-10-17 17:42
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0001_initial'),
+        ('packages', '0003_keyset_pagination_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['user', 'booking_date', 'id'], name='bookings_user_id_6c78bc_idx'),
+        ),
+    ]
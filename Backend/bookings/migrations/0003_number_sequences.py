@@ -0,0 +1,26 @@
+# Generated by Django 5.2.7 on 2026-10-17 18:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0002_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NumberSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True, verbose_name='الاسم')),
+                ('next_value', models.PositiveBigIntegerField(default=0, verbose_name='القيمة التالية')),
+            ],
+            options={
+                'verbose_name': 'تسلسل أرقام',
+                'verbose_name_plural': 'تسلسلات الأرقام',
+                'db_table': 'number_sequences',
+            },
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.7 on 2026-10-17 18:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0003_number_sequences'),
+        ('packages', '0007_package_similarity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ServiceAvailability',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='التاريخ')),
+                ('capacity', models.PositiveIntegerField(verbose_name='السعة')),
+                ('reserved', models.PositiveIntegerField(default=0, verbose_name='المحجوز')),
+                ('service', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='availability', to='packages.service', verbose_name='الخدمة')),
+            ],
+            options={
+                'verbose_name': 'توفر خدمة',
+                'verbose_name_plural': 'توفر الخدمات',
+                'db_table': 'service_availability',
+                'constraints': [models.UniqueConstraint(fields=('service', 'date'), name='unique_service_availability_day'), models.CheckConstraint(condition=models.Q(('reserved__lte', models.F('capacity'))), name='service_availability_not_oversold')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ServiceReservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='التاريخ')),
+                ('quantity', models.PositiveIntegerField(verbose_name='الكمية')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='تاريخ الإنشاء')),
+                ('released_at', models.DateTimeField(blank=True, null=True, verbose_name='تاريخ الإرجاع')),
+                ('booking', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to='bookings.booking', verbose_name='الحجز')),
+                ('service', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='packages.service', verbose_name='الخدمة')),
+            ],
+            options={
+                'verbose_name': 'حجز مخزون',
+                'verbose_name_plural': 'حجوزات المخزون',
+                'db_table': 'service_reservations',
+                'indexes': [models.Index(fields=['service', 'date'], name='service_res_service_267b4d_idx')],
+            },
+        ),
+    ]
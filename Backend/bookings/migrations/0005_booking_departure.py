@@ -0,0 +1,20 @@
+# Generated by Django 5.2.7 on 2026-10-17 18:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0004_service_inventory'),
+        ('packages', '0008_package_departures'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='booking',
+            name='departure',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='bookings', to='packages.packagedeparture', verbose_name='موعد الانطلاق'),
+        ),
+    ]
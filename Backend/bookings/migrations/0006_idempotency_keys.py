@@ -0,0 +1,40 @@
+# Generated by Django 5.2.7 on 2026-10-17 18:28
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0005_booking_departure'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IdempotencyKey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(max_length=50, verbose_name='العملية')),
+                ('key', models.CharField(max_length=255, verbose_name='المفتاح')),
+                ('fingerprint', models.CharField(max_length=64, verbose_name='بصمة الطلب')),
+                ('status', models.CharField(choices=[('processing', 'قيد المعالجة'), ('completed', 'مكتمل')], default='processing', max_length=15, verbose_name='الحالة')),
+                ('response_status', models.PositiveSmallIntegerField(blank=True, null=True, verbose_name='رمز الرد')),
+                ('response_body', models.JSONField(blank=True, null=True, verbose_name='الرد')),
+                ('locked_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='وقت بدء المعالجة')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='تاريخ الإنشاء')),
+                ('expires_at', models.DateTimeField(verbose_name='تاريخ الانتهاء')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='idempotency_keys', to=settings.AUTH_USER_MODEL, verbose_name='المستخدم')),
+            ],
+            options={
+                'verbose_name': 'مفتاح منع التكرار',
+                'verbose_name_plural': 'مفاتيح منع التكرار',
+                'db_table': 'idempotency_keys',
+                'indexes': [models.Index(fields=['expires_at'], name='idempotency_expires_6c9d28_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'scope', 'key'), name='unique_idempotency_key')],
+            },
+        ),
+    ]
@@ -1,8 +1,11 @@
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from packages.models import Package
 
+from .numbering import save_with_number
+
 class CustomTrip(models.Model):
     TRIP_STATUS = (
         ('draft', 'مسودة'),
@@ -95,6 +98,7 @@ class Booking(models.Model):
     booking_type = models.CharField(_('نوع الحجز'), max_length=10, choices=BOOKING_TYPES)
     package = models.ForeignKey('packages.Package', on_delete=models.CASCADE, blank=True, null=True, verbose_name=_('الباقة'))
     custom_trip = models.ForeignKey(CustomTrip, on_delete=models.CASCADE, blank=True, null=True, verbose_name=_('الرحلة المخصصة'))
+    departure = models.ForeignKey('packages.PackageDeparture', on_delete=models.PROTECT, blank=True, null=True, related_name='bookings', verbose_name=_('موعد الانطلاق'))
     status = models.CharField(_('حالة الحجز'), max_length=15, choices=BOOKING_STATUS, default='pending')
     total_price = models.DecimalField(_('السعر الإجمالي'), max_digits=10, decimal_places=2)
     number_of_travelers = models.PositiveIntegerField(_('عدد المسافرين'), default=1)
@@ -123,6 +127,7 @@ class Booking(models.Model):
             models.Index(fields=['user', 'status']),
             models.Index(fields=['booking_number']),
             models.Index(fields=['start_date', 'end_date']),
+            models.Index(fields=['user', 'booking_date', 'id']),
         ]
 
     def __str__(self):
@@ -130,8 +135,96 @@ class Booking(models.Model):
 
     def save(self, *args, **kwargs):
         if not self.booking_number:
-            # إنشاء رقم حجز فريد
-            import random
-            import string
-            self.booking_number = 'BK' + ''.join(random.choices(string.digits, k=8))
-        super().save(*args, **kwargs)
\ No newline at end of file
+            # رقم حجز فريد من تسلسل محجوز على دفعات (بدل الأرقام العشوائية القابلة للتصادم)
+            return save_with_number(self, 'booking_number', 'booking', 'BK', super().save, *args, **kwargs)
+        super().save(*args, **kwargs)
+
+
+class ServiceAvailability(models.Model):
+    """مخزون خدمة في يوم محدد: السعة والمحجوز منها (يُنشأ عند أول حجز في ذلك اليوم)"""
+    service = models.ForeignKey('packages.Service', on_delete=models.CASCADE, related_name='availability', verbose_name=_('الخدمة'))
+    date = models.DateField(_('التاريخ'))
+    capacity = models.PositiveIntegerField(_('السعة'))
+    reserved = models.PositiveIntegerField(_('المحجوز'), default=0)
+
+    class Meta:
+        db_table = 'service_availability'
+        verbose_name = _('توفر خدمة')
+        verbose_name_plural = _('توفر الخدمات')
+        constraints = [
+            models.UniqueConstraint(fields=['service', 'date'], name='unique_service_availability_day'),
+            models.CheckConstraint(condition=models.Q(reserved__lte=models.F('capacity')), name='service_availability_not_oversold'),
+        ]
+
+    def __str__(self):
+        return f"{self.service_id} - {self.date}: {self.reserved}/{self.capacity}"
+
+    @property
+    def remaining(self):
+        return self.capacity - self.reserved
+
+
+class ServiceReservation(models.Model):
+    """سجل ما حجزه كل حجز من مخزون الخدمات ليُعاد عند الإلغاء"""
+    booking = models.ForeignKey(Booking, on_delete=models.CASCADE, related_name='reservations', verbose_name=_('الحجز'))
+    service = models.ForeignKey('packages.Service', on_delete=models.CASCADE, verbose_name=_('الخدمة'))
+    date = models.DateField(_('التاريخ'))
+    quantity = models.PositiveIntegerField(_('الكمية'))
+    created_at = models.DateTimeField(_('تاريخ الإنشاء'), auto_now_add=True)
+    released_at = models.DateTimeField(_('تاريخ الإرجاع'), blank=True, null=True)
+
+    class Meta:
+        db_table = 'service_reservations'
+        verbose_name = _('حجز مخزون')
+        verbose_name_plural = _('حجوزات المخزون')
+        indexes = [
+            models.Index(fields=['service', 'date']),
+        ]
+
+    def __str__(self):
+        return f"{self.booking_id} - {self.service_id} - {self.date} × {self.quantity}"
+
+class IdempotencyKey(models.Model):
+    """مفتاح Idempotency-Key لطلب كتابة: بصمة الطلب والرد المحفوظ لإعادته عند تكرار الطلب"""
+    STATUSES = (
+        ('processing', 'قيد المعالجة'),
+        ('completed', 'مكتمل'),
+    )
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='idempotency_keys', verbose_name=_('المستخدم'))
+    scope = models.CharField(_('العملية'), max_length=50)
+    key = models.CharField(_('المفتاح'), max_length=255)
+    fingerprint = models.CharField(_('بصمة الطلب'), max_length=64)
+    status = models.CharField(_('الحالة'), max_length=15, choices=STATUSES, default='processing')
+    response_status = models.PositiveSmallIntegerField(_('رمز الرد'), blank=True, null=True)
+    response_body = models.JSONField(_('الرد'), blank=True, null=True)
+    locked_at = models.DateTimeField(_('وقت بدء المعالجة'), default=timezone.now)
+    created_at = models.DateTimeField(_('تاريخ الإنشاء'), auto_now_add=True)
+    expires_at = models.DateTimeField(_('تاريخ الانتهاء'))
+
+    class Meta:
+        db_table = 'idempotency_keys'
+        verbose_name = _('مفتاح منع التكرار')
+        verbose_name_plural = _('مفاتيح منع التكرار')
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'scope', 'key'], name='unique_idempotency_key'),
+        ]
+        indexes = [
+            models.Index(fields=['expires_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.scope}:{self.key} ({self.status})"
+
+class NumberSequence(models.Model):
+    """عداد تسلسل مشترك تُحجز منه مجالات الأرقام (أرقام الحجوزات والدفعات)"""
+    name = models.CharField(_('الاسم'), max_length=50, unique=True)
+    next_value = models.PositiveBigIntegerField(_('القيمة التالية'), default=0)
+
+    class Meta:
+        db_table = 'number_sequences'
+        verbose_name = _('تسلسل أرقام')
+        verbose_name_plural = _('تسلسلات الأرقام')
+
+    def __str__(self):
+        return f"{self.name} ({self.next_value})"
\ No newline at end of file
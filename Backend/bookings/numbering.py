@@ -0,0 +1,171 @@
+"""أرقام الحجوزات والدفعات: تسلسل في قاعدة البيانات يُحجز على مجالات ويُبعثر بشبكة Feistel.
+
+حدود SQLite: داخل معاملة الطلب يُحجز رقم واحد في كل مرة على اتصال الطلب نفسه (انظر NumberAllocator._reserve).
+التفرد مضمون لأن SQLite يسمح بكاتب واحد: المعاملات المتزامنة تنتظر قفل الملف (مهلة الانشغال) ثم تقرأ
+القيمة بعد التحديث، وقاعدة الاختبار في الذاكرة ترفض الكاتب الثاني فوراً بخطأ "database table is locked"
+بدل الانتظار، لذا لا يُختبر التزامن الفعلي عليها. الأرقام متباعدة لأن القيم المتتالية تمر عبر permute،
+لكن حجز رقم واحد لكل حفظ يعني استعلام تحديث لكل حجز؛ أما المجالات الكاملة فتُحجز خارج المعاملات أو على قواعد البيانات الأخرى.
+"""
+import hashlib
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, close_old_connections, connections, transaction
+from django.db.models import F
+
+# ثمانية أرقام = نصفان من أربعة أرقام تتبادلهما شبكة Feistel
+HALF = 10_000
+DOMAIN = HALF * HALF
+ROUNDS = 4
+# الأرقام القديمة العشوائية قد تصادف رقماً جديداً؛ يُتخطى الرقم المحجوز ويُجرَّب التالي
+MAX_COLLISION_RETRIES = 5
+
+
+def _block_size():
+    return getattr(settings, 'NUMBERING_BLOCK_SIZE', 100)
+
+
+def _round_keys(sequence):
+    """مفاتيح الجولات مشتقة من المفتاح السري واسم التسلسل (ترتيب مختلف لكل تسلسل)"""
+    secret = getattr(settings, 'NUMBERING_KEY', '') or settings.SECRET_KEY
+    return [
+        hashlib.blake2b(f'{sequence}:{index}'.encode('utf-8'), key=secret.encode('utf-8')[:64], digest_size=16).digest()
+        for index in range(ROUNDS)
+    ]
+
+
+def _round(value, key):
+    digest = hashlib.blake2b(value.to_bytes(2, 'big'), key=key, digest_size=4).digest()
+    return int.from_bytes(digest, 'big') % HALF
+
+
+def permute(value, keys):
+    """تبديل تقابلي على [0, DOMAIN): قيم متتالية تعطي أرقاماً متباعدة لا يمكن تخمينها"""
+    left, right = divmod(value, HALF)
+    for key in keys:
+        left, right = right, (left + _round(right, key)) % HALF
+    return left * HALF + right
+
+
+def unpermute(value, keys):
+    """عكس permute (لاستخراج رقم التسلسل من رقم الحجز)"""
+    left, right = divmod(value, HALF)
+    for key in reversed(keys):
+        left, right = (right - _round(left, key)) % HALF, left
+    return left * HALF + right
+
+
+def encode(value, prefix, keys):
+    """رقم التسلسل ← البادئة + (الحقبة عند تجاوز DOMAIN) + ثمانية أرقام مبعثرة"""
+    epoch, offset = divmod(value, DOMAIN)
+    return f"{prefix}{epoch or ''}{permute(offset, keys):08d}"
+
+
+def _reserve_outside(sequence, size, using):
+    try:
+        return reserve_block(sequence, size, using)
+    finally:
+        close_old_connections()
+
+
+def reserve_block(sequence, size, using=DEFAULT_DB_ALIAS):
+    """حجز مجال [start, start + size) من التسلسل بتحديث ذري واحد؛ يعيد start"""
+    from .models import NumberSequence
+
+    sequences = NumberSequence.objects.using(using)
+    with transaction.atomic(using=using):
+        if not sequences.filter(name=sequence).update(next_value=F('next_value') + size):
+            try:
+                with transaction.atomic(using=using):
+                    sequences.create(name=sequence, next_value=size)
+                return 0
+            except IntegrityError:
+                # عامل آخر أنشأ التسلسل في الوقت نفسه
+                sequences.filter(name=sequence).update(next_value=F('next_value') + size)
+        end = sequences.values_list('next_value', flat=True).get(name=sequence)
+    return end - size
+
+
+class NumberAllocator:
+    """موزع أرقام لكل عملية: يحجز مجالاً من التسلسل ويوزعه من الذاكرة دون الرجوع لقاعدة البيانات.
+
+    المجال يُحجز دائماً في معاملة مستقلة تُثبَّت فوراً (لا داخل معاملة الطلب) فلا يبقى صف التسلسل مقفلاً
+    حتى نهاية الطلب، ولا يعود المجال لعامل آخر إن تراجع الطلب؛ الأرقام الضائعة عندها فجوات مقبولة.
+    """
+
+    def __init__(self, block_size=None):
+        self.block_size = block_size
+        self.reservations = 0
+        self._lock = threading.Lock()
+        self._blocks = {}
+        self._keys = {}
+        self._executor = None
+        self._pid = os.getpid()
+
+    def _reset_after_fork(self):
+        # العملية الابنة لا ترث المجالات حتى لا توزع العمليتان الأرقام نفسها، ولا ترث خيط الحجز
+        if self._pid != os.getpid():
+            self._blocks = {}
+            self._executor = None
+            self._pid = os.getpid()
+
+    def next_value(self, sequence, using=DEFAULT_DB_ALIAS):
+        """رقم التسلسل التالي (فريد بين كل العمليات والخيوط)"""
+        with self._lock:
+            self._reset_after_fork()
+            block = self._blocks.get((using, sequence))
+            if block and block[0] < block[1]:
+                block[0] += 1
+                return block[0] - 1
+
+        start, size = self._reserve(sequence, using)
+        with self._lock:
+            self.reservations += 1
+            if size > 1:
+                self._blocks[(using, sequence)] = [start + 1, start + size]
+        return start
+
+    def _reserve(self, sequence, using):
+        """حجز مجال جديد خارج معاملة الطلب؛ يعيد (start, size)"""
+        size = self.block_size or _block_size()
+        connection = connections[using]
+        if not connection.in_atomic_block:
+            return reserve_block(sequence, size, using), size
+        if connection.vendor == 'sqlite':
+            # SQLite يقفل الملف كله للكاتب: اتصال آخر سينتظر انتهاء هذه المعاملة نفسها.
+            # يُحجز رقم واحد فقط داخلها دون تخزين، فإن تراجعت تراجع معه الكائن الذي أخذه
+            return reserve_block(sequence, 1, using), 1
+        # اتصالات Django خاصة بكل خيط: خيط الحجز يكتب على اتصاله الخاص في وضع الإثبات التلقائي
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='numbering')
+            executor = self._executor
+        return executor.submit(_reserve_outside, sequence, size, using).result(), size
+
+    def next_number(self, sequence, prefix, using=DEFAULT_DB_ALIAS):
+        keys = self._keys.get(sequence)
+        if keys is None:
+            keys = self._keys[sequence] = _round_keys(sequence)
+        return encode(self.next_value(sequence, using), prefix, keys)
+
+
+allocator = NumberAllocator()
+
+
+def save_with_number(instance, field, sequence, prefix, save, *args, **kwargs):
+    """حفظ كائن جديد بعد منحه رقماً من التسلسل؛ يُعاد المحاولة فقط إن كان الرقم مستخدماً مسبقاً"""
+    using = kwargs.get('using') or DEFAULT_DB_ALIAS
+    model = type(instance)
+    for _ in range(MAX_COLLISION_RETRIES):
+        number = allocator.next_number(sequence, prefix, using)
+        setattr(instance, field, number)
+        try:
+            with transaction.atomic(using=using):
+                return save(*args, **kwargs)
+        except IntegrityError:
+            setattr(instance, field, '')
+            if not model._default_manager.using(using).filter(**{field: number}).exists():
+                raise
+    raise IntegrityError(f'{model._meta.label}.{field}: no free number after {MAX_COLLISION_RETRIES} attempts')
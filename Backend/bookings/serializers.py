@@ -33,7 +33,7 @@ class BookingSerializer(serializers.ModelSerializer):
     class Meta:
         model = Booking
         fields = '__all__'
-        read_only_fields = ('booking_number', 'user', 'booking_date', 'confirmation_date', 'cancellation_date')
+        read_only_fields = ('booking_number', 'user', 'departure', 'booking_date', 'confirmation_date', 'cancellation_date')
 
 class BookingCreateSerializer(serializers.ModelSerializer):
     class Meta:
@@ -53,10 +53,42 @@ class BookingCreateSerializer(serializers.ModelSerializer):
         if data['start_date'] >= data['end_date']:
             raise serializers.ValidationError("تاريخ البداية يجب أن يكون قبل تاريخ النهاية")
         
+        # الباقة ذات المواعيد المجدولة تُحجز في أحد مواعيد انطلاقها فقط
+        package = data.get('package')
+        if package:
+            departures = package.departures.filter(is_active=True)
+            if departures.exists() and not departures.filter(departure_date=data['start_date']).exists():
+                raise serializers.ValidationError("لا يوجد موعد انطلاق لهذه الباقة في تاريخ البداية المحدد")
+        
         return data
 
 class TravelerDetailSerializer(serializers.Serializer):
     full_name = serializers.CharField()
     date_of_birth = serializers.DateField()
     passport_number = serializers.CharField()
-    nationality = serializers.CharField()
\ No newline at end of file
+    nationality = serializers.CharField()
+
+
+class AvailabilityQuerySerializer(serializers.Serializer):
+    services = serializers.CharField()
+    start_date = serializers.DateField()
+    end_date = serializers.DateField()
+
+    MAX_SERVICES = 100
+    MAX_DAYS = 92
+
+    def validate_services(self, value):
+        try:
+            service_ids = sorted({int(item) for item in value.split(',') if item.strip()})
+        except ValueError:
+            raise serializers.ValidationError("معرفات الخدمات يجب أن تكون أرقاماً مفصولة بفواصل")
+        if not service_ids or len(service_ids) > self.MAX_SERVICES:
+            raise serializers.ValidationError(f"يجب تحديد من 1 إلى {self.MAX_SERVICES} خدمة")
+        return service_ids
+
+    def validate(self, data):
+        if data['start_date'] > data['end_date']:
+            raise serializers.ValidationError("تاريخ البداية يجب أن يكون قبل تاريخ النهاية")
+        if (data['end_date'] - data['start_date']).days >= self.MAX_DAYS:
+            raise serializers.ValidationError(f"المدى لا يتجاوز {self.MAX_DAYS} يوماً")
+        return data
@@ -1,3 +1,390 @@
-from django.test import TestCase
+from datetime import date, timedelta
+from unittest import mock
+from decimal import Decimal
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.utils import timezone
+
+from rest_framework.test import APIClient
+
+from packages.models import Destination, Package, PackageDeparture, PackageService, Service
+from . import idempotency, inventory, numbering
+from .models import (
+    Booking, CustomTrip, CustomTripDestination, CustomTripService, IdempotencyKey, NumberSequence,
+    ServiceAvailability, ServiceReservation
+)
+
+
+def create_user(username='traveler'):
+    return get_user_model().objects.create_user(username=username, password='secret', email=f'{username}@example.com')
+
+
+def create_package(title='باقة', **kwargs):
+    return Package.objects.create(
+        title=title, type='cultural', description='وصف', short_description='مختصر', duration_days=3,
+        base_price=kwargs.pop('base_price', Decimal('100')), daily_schedule={}, terms_conditions='-',
+        cancellation_policy='-', **kwargs
+    )
+
+
+def create_booking(user, package, **kwargs):
+    return Booking.objects.create(
+        user=user, booking_type='package', package=package, total_price=Decimal('100'),
+        start_date=kwargs.pop('start_date', date(2026, 12, 1)), end_date=kwargs.pop('end_date', date(2026, 12, 3)),
+        **kwargs
+    )
+
+
+class PermutationTests(SimpleTestCase):
+    """تبعثر أرقام التسلسل: تقابلي وقابل للعكس"""
+
+    def test_permute_is_a_bijection(self):
+        keys = numbering._round_keys('booking')
+        values = [numbering.permute(value, keys) for value in range(20000)]
+        self.assertEqual(len(set(values)), len(values))
+        self.assertTrue(all(0 <= value < numbering.DOMAIN for value in values))
+        self.assertEqual([numbering.unpermute(value, keys) for value in values[:500]], list(range(500)))
+
+    def test_encode_format(self):
+        keys = numbering._round_keys('booking')
+        number = numbering.encode(7, 'BK', keys)
+        self.assertRegex(number, r'^BK\d{8}$')
+        # بعد استنفاد ثمانية أرقام تُضاف الحقبة قبلها
+        self.assertRegex(numbering.encode(numbering.DOMAIN + 7, 'BK', keys), r'^BK1\d{8}$')
+        self.assertNotEqual(numbering.encode(7, 'BK', numbering._round_keys('payment')), number)
+
+
+class NumberAllocationTests(TestCase):
+    """توزيع الأرقام داخل معاملة الطلب"""
+
+    def setUp(self):
+        # مجال خزّنه اختبار سابق خارج معاملة يتجاوز قاعدة بيانات هذا الاختبار
+        numbering.allocator._blocks.clear()
+        self.user = create_user()
+        self.package = create_package()
+
+    def test_numbers_are_unique(self):
+        numbers = {create_booking(self.user, self.package).booking_number for _ in range(30)}
+        self.assertEqual(len(numbers), 30)
+
+    def test_sqlite_transaction_reserves_single_values(self):
+        # داخل معاملة على SQLite لا يُخزَّن مجال: التراجع يعيد القيمة مع الكائن الذي أخذها
+        allocator = numbering.NumberAllocator(block_size=50)
+        first = allocator.next_value('test')
+        second = allocator.next_value('test')
+        self.assertEqual((first, second), (0, 1))
+        self.assertEqual(NumberSequence.objects.get(name='test').next_value, 2)
+        self.assertEqual(allocator.reservations, 2)
+
+    def test_sqlite_transaction_numbers_are_not_sequential(self):
+        numbers = []
+        for _ in range(20):
+            with transaction.atomic():
+                numbers.append(create_booking(self.user, self.package).booking_number)
+        self.assertEqual(len(set(numbers)), 20)
+        # قيم التسلسل متتالية لكن الأرقام الظاهرة مبعثرة
+        values = sorted(int(number[2:]) for number in numbers)
+        self.assertFalse(any(second - first == 1 for first, second in zip(values, values[1:])))
+
+    def test_skips_numbers_taken_by_legacy_bookings(self):
+        keys = numbering._round_keys('booking')
+        booking = create_booking(self.user, self.package)
+        upcoming = NumberSequence.objects.get(name='booking').next_value
+        taken = numbering.encode(upcoming, 'BK', keys)
+        Booking.objects.filter(pk=booking.pk).update(booking_number=taken)
+        with transaction.atomic():
+            created = create_booking(self.user, self.package)
+        self.assertNotEqual(created.booking_number, taken)
+        self.assertEqual(created.booking_number, numbering.encode(upcoming + 1, 'BK', keys))
+
+
+class NumberBlockTests(TransactionTestCase):
+    """خارج المعاملات يُحجز مجال كامل ويوزع من الذاكرة"""
+
+    def test_block_served_from_memory(self):
+        allocator = numbering.NumberAllocator(block_size=10)
+        values = [allocator.next_value('block') for _ in range(25)]
+        self.assertEqual(values, list(range(25)))
+        self.assertEqual(allocator.reservations, 3)
+        self.assertEqual(NumberSequence.objects.get(name='block').next_value, 30)
+
+    def test_allocators_never_overlap(self):
+        first, second = numbering.NumberAllocator(block_size=4), numbering.NumberAllocator(block_size=4)
+        values = [allocator.next_value('shared') for _ in range(6) for allocator in (first, second)]
+        self.assertEqual(len(set(values)), len(values))
+
+
+class InventoryTests(TestCase):
+    """دفتر السعة اليومية: لا يُباع أكثر من سعة الخدمة، والإلغاء يعيد الكمية مرة واحدة"""
+
+    def setUp(self):
+        self.user = create_user()
+        destination = Destination.objects.create(
+            name='حلب', type='historical', description='-', governorate='حلب',
+            latitude=36.2, longitude=37.15, best_season='الربيع'
+        )
+        self.hotel = Service.objects.create(
+            name='فندق', type='hotel', description='-', destination=destination, address='-',
+            price_per_unit=Decimal('50'), unit_description='ليلة', capacity=4
+        )
+        self.tour = Service.objects.create(
+            name='جولة', type='activity', description='-', destination=destination, address='-',
+            price_per_unit=Decimal('10'), unit_description='شخص', capacity=None
+        )
+        self.package = create_package()
+        PackageService.objects.create(package=self.package, service=self.hotel, day_number=1, time_slot='evening')
+        PackageService.objects.create(package=self.package, service=self.hotel, day_number=2, time_slot='evening')
+        PackageService.objects.create(package=self.package, service=self.tour, day_number=1, time_slot='morning')
+
+    def reserved(self):
+        return dict(ServiceAvailability.objects.filter(service=self.hotel).values_list('date', 'reserved'))
+
+    def test_requirements_per_day(self):
+        booking = create_booking(self.user, self.package, number_of_travelers=3)
+        self.assertEqual(inventory.booking_requirements(booking), {
+            (self.hotel.id, date(2026, 12, 1)): 3,
+            (self.hotel.id, date(2026, 12, 2)): 3,
+            (self.tour.id, date(2026, 12, 1)): 3,
+        })
+
+    def test_reserve_and_release(self):
+        booking = create_booking(self.user, self.package, number_of_travelers=3)
+        inventory.reserve(booking)
+        self.assertEqual(self.reserved(), {date(2026, 12, 1): 3, date(2026, 12, 2): 3})
+        # الخدمة غير محدودة السعة لا تُسجل في الدفتر
+        self.assertFalse(ServiceAvailability.objects.filter(service=self.tour).exists())
+
+        with self.assertRaises(inventory.InsufficientCapacity) as raised:
+            inventory.reserve(create_booking(self.user, self.package, number_of_travelers=2))
+        self.assertEqual(raised.exception.remaining, 1)
+
+        self.assertEqual(inventory.release(booking), 2)
+        self.assertEqual(inventory.release(booking), 0)
+        self.assertEqual(self.reserved(), {date(2026, 12, 1): 0, date(2026, 12, 2): 0})
+
+    def test_rows_created_and_updated_in_key_order(self):
+        booking = create_booking(self.user, self.package, number_of_travelers=1)
+        requirements = dict(reversed(list(inventory.booking_requirements(booking).items())))
+        create = ServiceAvailability.objects.bulk_create
+        with mock.patch.object(inventory, 'booking_requirements', return_value=requirements), \
+                mock.patch.object(ServiceAvailability.objects, 'bulk_create', wraps=create) as bulk_create:
+            limited = inventory.reserve(booking)
+        ordered = [(self.hotel.id, date(2026, 12, 1)), (self.hotel.id, date(2026, 12, 2))]
+        self.assertEqual(list(limited), ordered)
+        self.assertEqual([(row.service_id, row.date) for row in bulk_create.call_args.args[0]], ordered)
+
+    def test_capacity_change_applies_to_existing_rows(self):
+        inventory.reserve(create_booking(self.user, self.package, number_of_travelers=4))
+        # تعديل السعة دون إشارات (الاستيراد) يسري على الأيام التي لها صفوف مسبقاً
+        Service.objects.filter(pk=self.hotel.pk).update(capacity=6)
+        inventory.reserve(create_booking(self.user, self.package, number_of_travelers=2))
+        self.assertEqual(set(ServiceAvailability.objects.values_list('capacity', 'reserved')), {(6, 6)})
+
+        Service.objects.filter(pk=self.hotel.pk).update(capacity=3)
+        with self.assertRaises(inventory.InsufficientCapacity) as raised:
+            inventory.reserve(create_booking(self.user, self.package, number_of_travelers=1))
+        self.assertEqual(raised.exception.remaining, 0)
+        availability = inventory.availability([self.hotel.id, self.tour.id], date(2026, 12, 1), date(2026, 12, 3))
+        self.assertEqual(availability[self.hotel.id][date(2026, 12, 1)], 0)
+        self.assertEqual(availability[self.hotel.id][date(2026, 12, 3)], 3)
+        self.assertIsNone(availability[self.tour.id][date(2026, 12, 1)])
+
+    def test_create_endpoint_returns_409_and_rolls_back(self):
+        client = APIClient(SERVER_NAME='localhost')
+        client.force_authenticate(self.user)
+        body = {
+            'booking_type': 'package', 'package': self.package.id, 'number_of_travelers': 3,
+            'start_date': '2026-12-01', 'end_date': '2026-12-03', 'traveler_details': [],
+        }
+        self.assertEqual(client.post('/api/bookings/create/', body, format='json').status_code, 201)
+        response = client.post('/api/bookings/create/', body, format='json')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual((response.data['service'], response.data['remaining']), (self.hotel.id, 1))
+        self.assertEqual(Booking.objects.count(), 1)
+        self.assertEqual(ServiceReservation.objects.count(), 2)
+
+
+class DepartureSeatsTests(TestCase):
+    """مقاعد مواعيد الانطلاق: الخصم عند الحجز والإرجاع عند الإلغاء وإزاحة المتبقي عند تعديل العدد"""
+
+    def setUp(self):
+        self.user = create_user()
+        self.client = APIClient(SERVER_NAME='localhost')
+        self.client.force_authenticate(self.user)
+        self.package = create_package()
+        self.departure = PackageDeparture.objects.create(package=self.package, departure_date=date(2026, 12, 1), seats=5)
+
+    def book(self, travelers, start_date='2026-12-01'):
+        return self.client.post('/api/bookings/create/', {
+            'booking_type': 'package', 'package': self.package.id, 'number_of_travelers': travelers,
+            'start_date': start_date, 'end_date': '2026-12-03', 'traveler_details': [],
+        }, format='json')
+
+    def test_booking_decrements_and_cancel_restores(self):
+        response = self.book(3)
+        self.assertEqual(response.status_code, 201)
+        self.departure.refresh_from_db()
+        self.assertEqual(self.departure.seats_remaining, 2)
+        booking = Booking.objects.get()
+        self.assertEqual(booking.departure_id, self.departure.id)
+
+        response = self.book(3)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['remaining'], 2)
+        self.assertEqual(Booking.objects.count(), 1)
+
+        self.assertEqual(self.client.post(f'/api/bookings/{booking.booking_number}/cancel/').status_code, 200)
+        self.assertEqual(self.client.post(f'/api/bookings/{booking.booking_number}/cancel/').status_code, 400)
+        self.departure.refresh_from_db()
+        self.assertEqual(self.departure.seats_remaining, 5)
+
+    def test_start_date_must_match_a_departure(self):
+        self.assertEqual(self.book(1, start_date='2026-12-02').status_code, 400)
+
+    def test_changing_seats_shifts_remaining(self):
+        self.assertEqual(self.book(3).status_code, 201)
+        # النسخة في الذاكرة لا تعرف خصم الحجز؛ الإزاحة تُحسب من القيمة المخزنة
+        self.departure.seats = 8
+        self.departure.save()
+        self.assertEqual((self.departure.seats, self.departure.seats_remaining), (8, 5))
+        self.departure.seats = 4
+        self.departure.save(update_fields=['seats'])
+        self.departure.refresh_from_db()
+        self.assertEqual((self.departure.seats, self.departure.seats_remaining), (4, 1))
+        self.departure.seats = 1
+        self.departure.save()
+        self.assertEqual(self.departure.seats_remaining, 0)
+
+
+class IdempotencyKeyTests(TestCase):
+    """ترويسة Idempotency-Key على إنشاء الحجز: إعادة الرد المحفوظ دون تنفيذ ثانٍ"""
+
+    def setUp(self):
+        self.user = create_user()
+        self.client = APIClient(SERVER_NAME='localhost')
+        self.client.force_authenticate(self.user)
+        self.body = {
+            'booking_type': 'package', 'package': create_package().id, 'number_of_travelers': 2,
+            'start_date': '2026-12-01', 'end_date': '2026-12-03', 'traveler_details': [],
+        }
+
+    def post(self, key, **changes):
+        return self.client.post('/api/bookings/create/', {**self.body, **changes}, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_replay_returns_stored_response(self):
+        first = self.post('k1')
+        second = self.post('k1')
+        self.assertEqual((first.status_code, second.status_code), (201, 201))
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(Booking.objects.count(), 1)
+        self.assertEqual(IdempotencyKey.objects.get().status, 'completed')
+
+    def test_same_key_different_body_is_422(self):
+        self.post('k1')
+        response = self.post('k1', number_of_travelers=3)
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_key_in_progress_is_409_with_code(self):
+        # صف حجزه طلب ما زال قيد التنفيذ (يُثبت قبل تنفيذ العرض)
+        request = mock.Mock(data=self.body, method='POST', path='/api/bookings/create/')
+        IdempotencyKey.objects.create(
+            user=self.user, scope='booking-create', key='k1', fingerprint=idempotency.fingerprint(request),
+            expires_at=timezone.now() + timedelta(hours=1)
+        )
+        response = self.post('k1')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['code'], idempotency.IN_PROGRESS_CODE)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertEqual(Booking.objects.count(), 0)
+
+    def test_capacity_conflict_is_not_stored(self):
+        conflict = inventory.InsufficientCapacity(1, date(2026, 12, 1), 2, 0)
+        with mock.patch.object(inventory, 'reserve', side_effect=conflict):
+            response = self.post('k1')
+        self.assertEqual(response.status_code, 409)
+        self.assertNotIn('code', response.data)
+        # التعارض مؤقت: إعادة المحاولة بنفس المفتاح تنفذ الحجز بعد توفر السعة
+        self.assertFalse(IdempotencyKey.objects.exists())
+        self.assertEqual(self.post('k1').status_code, 201)
+
+    def test_validation_error_is_replayed(self):
+        first = self.post('k1', end_date='2026-11-30')
+        second = self.post('k1', end_date='2026-11-30')
+        self.assertEqual((first.status_code, second.status_code), (400, 400))
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+
+    def test_exception_releases_key_with_writes(self):
+        with mock.patch.object(inventory, 'reserve', side_effect=RuntimeError('boom')):
+            with self.assertRaises(RuntimeError):
+                self.post('k1')
+        self.assertFalse(IdempotencyKey.objects.exists())
+        self.assertFalse(Booking.objects.exists())
+        self.assertEqual(self.post('k1').status_code, 201)
+
+    def test_expired_key_runs_again(self):
+        self.post('k1')
+        IdempotencyKey.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        response = self.post('k1')
+        self.assertEqual(response.status_code, 201)
+        self.assertFalse(response.has_header('Idempotent-Replayed'))
+        self.assertEqual(Booking.objects.count(), 2)
+
+    def test_requests_without_key_are_not_recorded(self):
+        self.client.post('/api/bookings/create/', self.body, format='json')
+        self.assertFalse(IdempotencyKey.objects.exists())
+        self.assertEqual(self.post('x' * 300).status_code, 400)
+
+    def test_purge_expired(self):
+        self.post('k1')
+        self.post('k2')
+        IdempotencyKey.objects.filter(key='k1').update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(idempotency.purge_expired(batch_size=1), 1)
+        self.assertEqual(list(IdempotencyKey.objects.values_list('key', flat=True)), ['k2'])
+
+
+class BookingListQueryTests(TestCase):
+    """قائمة الحجوزات بعدد ثابت من الاستعلامات مهما زاد عدد الحجوزات وعلاقاتها"""
+
+    def setUp(self):
+        self.user = create_user()
+        self.client = APIClient(SERVER_NAME='localhost')
+        self.client.force_authenticate(self.user)
+        self.destination = Destination.objects.create(
+            name='حلب', type='historical', description='-', governorate='حلب',
+            latitude=36.2, longitude=37.15, best_season='الربيع'
+        )
+        self.service = Service.objects.create(
+            name='فندق', type='hotel', description='-', destination=self.destination, address='-',
+            price_per_unit=Decimal('50'), unit_description='ليلة'
+        )
+
+    def add_bookings(self, count):
+        for _ in range(count):
+            package = create_package()
+            package.destinations.add(self.destination, through_defaults={'visit_order': 1, 'duration_hours': 2})
+            create_booking(self.user, package)
+
+            trip = CustomTrip.objects.create(user=self.user, title='رحلة', duration_days=2)
+            CustomTripDestination.objects.create(custom_trip=trip, destination=self.destination, visit_order=1, duration_hours=2)
+            CustomTripService.objects.create(custom_trip=trip, service=self.service, day_number=1, time_slot='morning')
+            Booking.objects.create(
+                user=self.user, booking_type='custom', custom_trip=trip, total_price=Decimal('100'),
+                start_date=date(2026, 12, 1), end_date=date(2026, 12, 3)
+            )
+
+    def assert_list_queries(self, expected_rows):
+        # العدّ + الحجوزات مع الباقة والرحلة والمستخدم + ستة استعلامات تحميل مسبق للعلاقات المتعددة
+        with self.assertNumQueries(8):
+            response = self.client.get('/api/bookings/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), expected_rows)
+
+    def test_query_count_is_constant(self):
+        self.add_bookings(1)
+        self.assert_list_queries(2)
+        self.add_bookings(4)
+        self.assert_list_queries(10)
@@ -4,8 +4,10 @@ from . import views
 urlpatterns = [
     path('', views.BookingListView.as_view(), name='booking-list'),
     path('create/', views.BookingCreateView.as_view(), name='booking-create'),
+    path('availability/', views.service_availability, name='service-availability'),
     path('<str:booking_number>/', views.BookingDetailView.as_view(), name='booking-detail'),
     path('<str:booking_number>/cancel/', views.cancel_booking, name='booking-cancel'),
     path('custom-trips/', views.CustomTripListView.as_view(), name='custom-trip-list'),
     path('custom-trips/<int:pk>/', views.CustomTripDetailView.as_view(), name='custom-trip-detail'),
+    path('custom-trips/<int:pk>/optimize/', views.optimize_custom_trip, name='custom-trip-optimize'),
 ]
\ No newline at end of file
@@ -3,21 +3,24 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from django.db import transaction
 from django.utils import timezone
-from .models import Booking, CustomTrip
-from .serializers import BookingSerializer, BookingCreateSerializer, CustomTripSerializer
+from django.utils.decorators import method_decorator
+from .models import Booking, CustomTrip, CustomTripDestination
+from .serializers import AvailabilityQuerySerializer, BookingSerializer, BookingCreateSerializer, CustomTripSerializer
+from . import inventory
+from .idempotency import idempotent
+from packages import distances
+from travel_core.mixins import EagerLoadingMixin
 
-class BookingListView(generics.ListAPIView):
+class BookingListView(EagerLoadingMixin, generics.ListAPIView):
     """قائمة حجوزات المستخدم"""
     serializer_class = BookingSerializer
     permission_classes = [permissions.IsAuthenticated]
     filter_fields = ['status', 'booking_type']
 
     def get_queryset(self):
-        return Booking.objects.filter(user=self.request.user).select_related(
-            'package', 'custom_trip'
-        ).order_by('-booking_date')
+        return Booking.objects.filter(user=self.request.user).order_by('-booking_date')
 
-class BookingDetailView(generics.RetrieveAPIView):
+class BookingDetailView(EagerLoadingMixin, generics.RetrieveAPIView):
     """تفاصيل حجز معين"""
     serializer_class = BookingSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -26,11 +29,31 @@ class BookingDetailView(generics.RetrieveAPIView):
     def get_queryset(self):
         return Booking.objects.filter(user=self.request.user)
 
+@method_decorator(idempotent('booking-create'), name='post')
 class BookingCreateView(generics.CreateAPIView):
     """إنشاء حجز جديد"""
     serializer_class = BookingCreateSerializer
     permission_classes = [permissions.IsAuthenticated]
 
+    def create(self, request, *args, **kwargs):
+        try:
+            return super().create(request, *args, **kwargs)
+        except inventory.InsufficientSeats as exc:
+            return Response({
+                'error': 'لا توجد مقاعد كافية في موعد الانطلاق المحدد',
+                'departure_date': exc.departure.departure_date,
+                'requested': exc.requested,
+                'remaining': exc.departure.seats_remaining
+            }, status=status.HTTP_409_CONFLICT)
+        except inventory.InsufficientCapacity as exc:
+            return Response({
+                'error': 'لا توجد أماكن كافية في إحدى خدمات الحجز',
+                'service': exc.service_id,
+                'date': exc.date,
+                'requested': exc.requested,
+                'remaining': exc.remaining
+            }, status=status.HTTP_409_CONFLICT)
+
     def perform_create(self, serializer):
         with transaction.atomic():
             # حساب السعر الإجمالي
@@ -47,6 +70,10 @@ class BookingCreateView(generics.CreateAPIView):
             # حفظ الحجز
             booking = serializer.save(user=self.request.user, total_price=total_price)
             
+            # خصم المقاعد والمخزون ضمن نفس المعاملة؛ أي نقص يلغي الحجز كاملاً
+            inventory.reserve_seats(booking)
+            inventory.reserve(booking)
+            
             # إذا كانت رحلة مخصصة، تحديث حالتها
             if booking_data['booking_type'] == 'custom' and booking_data['custom_trip']:
                 custom_trip = booking_data['custom_trip']
@@ -58,21 +85,24 @@ class BookingCreateView(generics.CreateAPIView):
 def cancel_booking(request, booking_number):
     """إلغاء الحجز"""
     try:
-        booking = Booking.objects.get(
-            booking_number=booking_number, 
-            user=request.user
-        )
-        
-        if booking.status not in ['pending', 'confirmed']:
-            return Response(
-                {'error': 'لا يمكن إلغاء هذا الحجز في حالته الحالية'},
-                status=status.HTTP_400_BAD_REQUEST
+        with transaction.atomic():
+            booking = Booking.objects.select_for_update().get(
+                booking_number=booking_number, 
+                user=request.user
             )
-        
-        booking.status = 'cancelled'
-        booking.cancellation_date = timezone.now()
-        booking.cancellation_reason = request.data.get('reason', '')
-        booking.save()
+            
+            if booking.status not in ['pending', 'confirmed']:
+                return Response(
+                    {'error': 'لا يمكن إلغاء هذا الحجز في حالته الحالية'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            
+            booking.status = 'cancelled'
+            booking.cancellation_date = timezone.now()
+            booking.cancellation_reason = request.data.get('reason', '')
+            booking.save()
+            inventory.release_seats(booking)
+            inventory.release(booking)
         
         return Response({'message': 'تم إلغاء الحجز بنجاح'})
     
@@ -82,7 +112,30 @@ def cancel_booking(request, booking_number):
             status=status.HTTP_404_NOT_FOUND
         )
 
-class CustomTripListView(generics.ListAPIView):
+@api_view(['GET'])
+@permission_classes([permissions.AllowAny])
+def service_availability(request):
+    """المتبقي من سعة عدة خدمات لكل يوم في مدى من التواريخ"""
+    serializer = AvailabilityQuerySerializer(data=request.query_params)
+    
+    if serializer.is_valid():
+        data = serializer.validated_data
+        remaining = inventory.availability(data['services'], data['start_date'], data['end_date'])
+        return Response({
+            'start_date': data['start_date'],
+            'end_date': data['end_date'],
+            'services': [
+                {
+                    'service': service_id,
+                    'days': [{'date': date, 'remaining': value} for date, value in days.items()]
+                }
+                for service_id, days in sorted(remaining.items())
+            ]
+        })
+    
+    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+class CustomTripListView(EagerLoadingMixin, generics.ListAPIView):
     """قائمة الرحلات المخصصة للمستخدم"""
     serializer_class = CustomTripSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -90,10 +143,58 @@ class CustomTripListView(generics.ListAPIView):
     def get_queryset(self):
         return CustomTrip.objects.filter(user=self.request.user).order_by('-created_at')
 
-class CustomTripDetailView(generics.RetrieveAPIView):
+class CustomTripDetailView(EagerLoadingMixin, generics.RetrieveAPIView):
     """تفاصيل رحلة مخصصة"""
     serializer_class = CustomTripSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return CustomTrip.objects.filter(user=self.request.user)
\ No newline at end of file
+        return CustomTrip.objects.filter(user=self.request.user)
+
+@api_view(['GET', 'POST'])
+@permission_classes([permissions.IsAuthenticated])
+def optimize_custom_trip(request, pk):
+    """اقتراح ترتيب زيارة يقلل مسافة التنقل للرحلة المخصصة (POST لتطبيقه)"""
+    try:
+        custom_trip = CustomTrip.objects.get(pk=pk, user=request.user)
+    except CustomTrip.DoesNotExist:
+        return Response(
+            {'error': 'الرحلة غير موجودة'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    
+    trip_destinations = list(custom_trip.customtripdestination_set.all())
+    if not trip_destinations:
+        return Response(
+            {'error': 'لا توجد وجهات في هذه الرحلة'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    matrix = distances.get_distance_matrix()
+    current_order = [item.destination_id for item in trip_destinations]
+    start_id = str(request.data.get('start_destination') or request.query_params.get('start_destination') or '')
+    proposed_order, proposed_distance = distances.optimize_visit_order(
+        current_order, start_id=int(start_id) if start_id.isdigit() else None, matrix=matrix
+    )
+    
+    by_destination = {item.destination_id: item for item in trip_destinations}
+    stops = [
+        (destination_id, by_destination[destination_id].duration_hours, by_destination[destination_id].visit_date)
+        for destination_id in proposed_order
+    ]
+    
+    applied = request.method == 'POST'
+    if applied:
+        with transaction.atomic():
+            for position, destination_id in enumerate(proposed_order, start=1):
+                by_destination[destination_id].visit_order = position
+            CustomTripDestination.objects.bulk_update(trip_destinations, ['visit_order'])
+    
+    return Response({
+        'current_order': current_order,
+        'current_distance_km': distances.route_distance(current_order, matrix),
+        'proposed_order': proposed_order,
+        'proposed_distance_km': proposed_distance,
+        'days': distances.plan_days(stops, custom_trip.duration_days, matrix),
+        'applied': applied
+    })
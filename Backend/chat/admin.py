@@ -1,5 +1,11 @@
 from django.contrib import admin
-from .models import ChatSession, TravelPreference, AIRecommendationLog
+from .models import ChatSession, ChatMessage, TravelPreference, AIRecommendationLog
+
+class ChatMessageInline(admin.TabularInline):
+    model = ChatMessage
+    extra = 0
+    can_delete = False
+    readonly_fields = ('sequence', 'role', 'message', 'action', 'created_at')
 
 @admin.register(ChatSession)
 class ChatSessionAdmin(admin.ModelAdmin):
@@ -7,7 +13,8 @@ class ChatSessionAdmin(admin.ModelAdmin):
     list_filter = ('status', 'created_at')
     search_fields = ('session_id', 'user__username')
     list_editable = ('status',)
-    readonly_fields = ('session_id', 'id')
+    readonly_fields = ('session_id', 'id', 'message_count')
+    inlines = [ChatMessageInline]
 
 @admin.register(TravelPreference)
 class TravelPreferenceAdmin(admin.ModelAdmin):
@@ -19,4 +26,5 @@ class TravelPreferenceAdmin(admin.ModelAdmin):
 class AIRecommendationLogAdmin(admin.ModelAdmin):
     list_display = ('user', 'recommendation_type', 'confidence_score', 'user_feedback', 'created_at')
     list_filter = ('recommendation_type', 'user_feedback')
-    search_fields = ('user__username',)
\ No newline at end of file
+    search_fields = ('user__username',)
+    readonly_fields = ('public_id',)
\ No newline at end of file
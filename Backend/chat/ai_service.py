@@ -1,8 +1,9 @@
-import openai
 import json
 from django.conf import settings
 from django.core.cache import cache
 from packages.models import Destination, Service, Package
+from packages import distances, snapshot
+from . import interest_index, planner
 
 class AITravelAssistant:
     def __init__(self):
@@ -84,35 +85,102 @@ class AITravelAssistant:
         # اقتراح وجهات بناءً على الاهتمامات
         interests = requirements.get("interests", [])
         if interests:
-            destinations = Destination.objects.filter(is_active=True)
+            # الفهرس المقلوب في الذاكرة: لا استعلامات على الكتالوج في كل رسالة
+            index = interest_index.get_index()
+            seen = set()
             for interest in interests:
-                matching_destinations = destinations.filter(description__icontains=interest)[:2]
-                for dest in matching_destinations:
-                    suggestions.append(f"اقتراح: {dest.name} - {dest.description[:100]}...")
+                for dest in index.search(str(interest), limit=2):
+                    if dest.id not in seen:
+                        seen.add(dest.id)
+                        suggestions.append(f"اقتراح: {dest.name} - {dest.description[:100]}...")
         
         return suggestions[:3]  # إرجاع 3 اقتراحات كحد أقصى
     
     def generate_travel_plan(self, requirements):
         """توليد خطة سفر مخصصة"""
-        budget = requirements.get("budget", {}).get("total", 1000)
+        plan, days = self.build_plan(requirements)
+        for key, day_plan in days:
+            plan["daily_plan"][key] = day_plan
+        return plan
+    
+    def build_plan(self, requirements):
+        """ملخص الخطة وأيامها: الخدمات تُختار مرة واحدة ضمن الميزانية، والأيام تُعاد واحداً تلو الآخر ليمكن بثها"""
         duration = requirements.get("duration_days", 3)
         travelers = requirements.get("number_of_travelers", 1)
         
-        # محاكاة توليد خطة سفر
+        # ترتيب الوجهات المختارة (أو المقترحة حسب الاهتمامات) جغرافياً لتقليل مسافة التنقل
+        destination_ids = requirements.get("destinations") or self._choose_destinations(requirements)
+        route = self._plan_route(destination_ids)
+        itinerary = planner.plan_itinerary(requirements, [item["id"] for item in route])
+        
         plan = {
             "summary": f"رحلة مخصصة لمدة {duration} أيام لمجموعة من {travelers} أشخاص",
-            "total_estimated_cost": budget,
+            "total_estimated_cost": itinerary["total_cost"],
+            "budget": itinerary["budget"],
+            "within_budget": itinerary["within_budget"],
+            "accommodation_level": itinerary["accommodation_level"],
             "daily_plan": {},
             "included_services": [],
             "recommended_destinations": []
         }
+        if route:
+            plan["recommended_destinations"] = route
+            plan["total_distance_km"] = distances.route_distance([item["id"] for item in route])
         
-        # توليد الخطة اليومية
+        names = {item["id"]: item["name"] for item in route}
+        seen = set()
+        for day in itinerary["days"].values():
+            for service in day["services"].values():
+                if service["id"] not in seen:
+                    seen.add(service["id"])
+                    plan["included_services"].append(service["id"])
+        return plan, self._iter_days(itinerary, names, duration)
+    
+    def _iter_days(self, itinerary, names, duration):
+        placeholders = {
+            "morning": "نشاط صباحي في اليوم {}",
+            "afternoon": "نشاط بعد الظهر في اليوم {}",
+            "evening": "نشاط مسائي في اليوم {}",
+        }
         for day in range(1, duration + 1):
-            plan["daily_plan"][f"day_{day}"] = {
-                "morning": f"نشاط صباحي في اليوم {day}",
-                "afternoon": f"نشاط بعد الظهر في اليوم {day}",
-                "evening": f"نشاط مسائي في اليوم {day}"
+            planned = itinerary["days"].get(day, {"destination_id": None, "services": {}})
+            services = planned["services"]
+            day_plan = {
+                slot: services.get(slot) or text.format(day) for slot, text in placeholders.items()
             }
-        
-        return plan
\ No newline at end of file
+            for slot in ("accommodation", "transport"):
+                if slot in services:
+                    day_plan[slot] = services[slot]
+            if planned["destination_id"] in names:
+                day_plan["destination"] = names[planned["destination_id"]]
+            day_plan["cost"] = round(sum(service["cost"] for service in services.values()), 2)
+            yield f"day_{day}", day_plan
+    
+    def _choose_destinations(self, requirements):
+        """وجهات مقترحة عند عدم تحديدها: حسب الاهتمامات ثم الأكثر شعبية، بمعدل وجهة لكل يومين"""
+        limit = min(max(1, requirements.get("duration_days", 3) // 2), 5)
+        index = interest_index.get_index()
+        chosen = []
+        for interest in requirements.get("interests", []):
+            for dest in index.search(str(interest), limit=limit):
+                if dest.id not in chosen:
+                    chosen.append(dest.id)
+        if len(chosen) < limit:
+            popular = sorted(index.catalog.destinations, key=lambda dest: -dest.popularity_score)
+            chosen.extend(dest.id for dest in popular if dest.id not in chosen)
+        return chosen[:limit]
+    
+    def _plan_route(self, destination_ids):
+        """ترتيب الوجهات المطلوبة بأقل مسافة تنقل"""
+        if not destination_ids:
+            return []
+        catalog = snapshot.get_snapshot()
+        names = {
+            destination_id: catalog.destination(destination_id).name
+            for destination_id in destination_ids if catalog.destination(destination_id) is not None
+        }
+        order, _ = distances.optimize_visit_order([destination_id for destination_id in destination_ids if destination_id in names])
+        return [
+            {"id": destination_id, "name": names[destination_id], "visit_order": position}
+            for position, destination_id in enumerate(order, start=1)
+        ]
\ No newline at end of file
@@ -0,0 +1,74 @@
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import ChatMessage, ChatSession
+
+# عدد الرسائل الأخيرة التي تُمرر للمساعد كسياق
+CONTEXT_MESSAGES = 20
+
+
+def append_messages(session, entries):
+    """إضافة رسائل إلى نهاية المحادثة: حجز أرقام التسلسل بتحديث ذري للعداد ثم إدراج فقط"""
+    now = timezone.now()
+    with transaction.atomic():
+        # التحديث يقفل صف الجلسة حتى نهاية المعاملة فلا تتداخل أرقام الرسائل المتزامنة
+        ChatSession.objects.filter(pk=session.pk).update(
+            message_count=F('message_count') + len(entries), updated_at=now
+        )
+        last = ChatSession.objects.filter(pk=session.pk).values_list('message_count', flat=True).get()
+        first = last - len(entries) + 1
+        messages = ChatMessage.objects.bulk_create([
+            ChatMessage(session=session, sequence=first + offset, created_at=now, **entry)
+            for offset, entry in enumerate(entries)
+        ])
+    session.message_count = last
+    session.updated_at = now
+    return messages
+
+
+def message_to_dict(message):
+    """تمثيل الرسالة بنفس شكل عناصر سجل المحادثة السابق"""
+    entry = {
+        'sequence': message.sequence,
+        'role': message.role,
+        'message': message.message,
+        'timestamp': message.created_at.isoformat(),
+    }
+    if message.action:
+        entry['action'] = message.action
+    return entry
+
+
+def recent_messages(session, limit=CONTEXT_MESSAGES):
+    """آخر الرسائل بالترتيب الزمني (قراءة مقيدة على الفهرس (session, sequence))"""
+    messages = ChatMessage.objects.filter(session=session).order_by('-sequence')[:limit]
+    return [message_to_dict(message) for message in reversed(messages)]
+
+
+def messages_page(session, after=None, before=None, limit=CONTEXT_MESSAGES):
+    """صفحة من الرسائل بمؤشر التسلسل: بعد after تصاعدياً، أو آخر الرسائل قبل before"""
+    queryset = ChatMessage.objects.filter(session=session)
+    if after is not None:
+        queryset = queryset.filter(sequence__gt=after)
+    if before is not None:
+        queryset = queryset.filter(sequence__lt=before)
+
+    # جلب رسالة إضافية لمعرفة وجود المزيد
+    if after is not None:
+        messages = list(queryset.order_by('sequence')[:limit + 1])
+        has_more = len(messages) > limit
+        messages = messages[:limit]
+    else:
+        messages = list(queryset.order_by('-sequence')[:limit + 1])
+        has_more = len(messages) > limit
+        messages = list(reversed(messages[:limit]))
+    return [message_to_dict(message) for message in messages], has_more
+
+
+async def arecent_messages(session, limit=CONTEXT_MESSAGES):
+    """نسخة غير متزامنة من recent_messages لواجهات البث"""
+    messages = [
+        message async for message in ChatMessage.objects.filter(session=session).order_by('-sequence')[:limit]
+    ]
+    return [message_to_dict(message) for message in reversed(messages)]
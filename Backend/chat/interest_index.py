@@ -0,0 +1,115 @@
+import math
+import threading
+from collections import Counter, defaultdict
+
+from packages import snapshot
+from packages.search import tokenize
+
+_PREFIXES = ('وال', 'بال', 'كال', 'فال', 'لل', 'ال')
+_SUFFIXES = ('يات', 'يين', 'يون', 'ات', 'ين', 'ون', 'يه', 'ه', 'ي')
+
+# وسوم الاهتمامات التي يذكرها المستخدم مربوطة بأنواع الوجهات
+INTEREST_TAGS = {
+    'تاريخ': ('historical',),
+    'آثار': ('historical',),
+    'ثقافة': ('historical', 'city'),
+    'طبيعة': ('natural',),
+    'جبل': ('natural',),
+    'جبال': ('natural',),
+    'بحر': ('coastal',),
+    'شاطئ': ('coastal',),
+    'شواطئ': ('coastal',),
+    'ساحل': ('coastal',),
+    'مدينة': ('city',),
+    'تسوق': ('city',),
+    'ترفيه': ('city', 'coastal'),
+}
+
+# أوزان الحقول: وسم النوع أقوى دلالة من ذكر الكلمة في الوصف
+TYPE_WEIGHT = 3.0
+SEASON_WEIGHT = 2.0
+DESCRIPTION_WEIGHT = 1.0
+
+
+def stem(token):
+    """تجذيع خفيف: حذف أداة التعريف واللواحق الشائعة (تاريخية، التاريخي -> تاريخ)"""
+    for prefix in _PREFIXES:
+        if token.startswith(prefix) and len(token) - len(prefix) >= 3:
+            token = token[len(prefix):]
+            break
+    for suffix in _SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= 3:
+            return token[:-len(suffix)]
+    return token
+
+
+def keywords(text):
+    return [stem(token) for token in tokenize(text)]
+
+
+# الوسوم بنفس توحيد وتجذيع كلمات المستخدم
+_TAG_STEMS = {keywords(tag)[0]: destination_types for tag, destination_types in INTEREST_TAGS.items()}
+
+
+class InterestIndex:
+    """فهرس مقلوب: كلمة/وسم موحد -> الوجهات مع وزن التطابق"""
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        postings = defaultdict(Counter)
+        destinations = catalog.destinations
+        for record in destinations:
+            for keyword, count in Counter(keywords(record.description)).items():
+                postings[keyword][record] += DESCRIPTION_WEIGHT * (1.0 + math.log(count))
+            for keyword in set(keywords(record.best_season)):
+                postings[keyword][record] += SEASON_WEIGHT
+            postings[f'type:{record.type}'][record] += TYPE_WEIGHT
+
+        # الكلمات النادرة أكثر تمييزاً (idf)
+        total = max(len(destinations), 1)
+        self.postings = {}
+        for keyword, matches in postings.items():
+            idf = 1.0 if keyword.startswith('type:') else math.log(1 + total / len(matches))
+            self.postings[keyword] = tuple(
+                sorted(((record, weight * idf) for record, weight in matches.items()),
+                       key=lambda item: (-item[1], -item[0].popularity_score))
+            )
+
+    def interest_keys(self, interest):
+        """مفاتيح البحث لاهتمام واحد: كلماته المجذّعة ووسوم الأنواع المرتبطة بها"""
+        keys = []
+        for keyword in keywords(interest):
+            keys.append(keyword)
+            for tag, destination_types in _TAG_STEMS.items():
+                if keyword.startswith(tag):
+                    keys.extend(f'type:{destination_type}' for destination_type in destination_types)
+        return list(dict.fromkeys(keys))
+
+    def search(self, interest, limit=2):
+        """أفضل الوجهات لاهتمام واحد مرتبة حسب مجموع أوزان المطابقة ثم الشعبية"""
+        keys = self.interest_keys(interest)
+        if len(keys) == 1:
+            return [record for record, _ in self.postings.get(keys[0], ())[:limit]]
+        scores = Counter()
+        for key in keys:
+            for record, weight in self.postings.get(key, ()):
+                scores[record] += weight
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], -item[0].popularity_score))
+        return [record for record, _ in ranked[:limit]]
+
+
+_lock = threading.Lock()
+_state = {'index': None}
+
+
+def get_index():
+    """الفهرس الحالي، يُعاد بناؤه عند تغيّر لقطة الكتالوج (أي عند تعديل الوجهات)"""
+    catalog = snapshot.get_snapshot()
+    index = _state['index']
+    if index is not None and index.catalog is catalog:
+        return index
+    with _lock:
+        index = _state['index']
+        if index is None or index.catalog is not catalog:
+            index = _state['index'] = InterestIndex(catalog)
+        return index
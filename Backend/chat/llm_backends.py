@@ -0,0 +1,358 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+
+import openai
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from .ai_service import AITravelAssistant
+
+logger = logging.getLogger(__name__)
+
+# عدد الكلمات في كل مقطع يُبث من نص الرد
+CHUNK_WORDS = 4
+
+SYSTEM_PROMPT = (
+    "أنت مساعد سفر لمنصة رحلات سورية. أجب بالعربية بإيجاز وودّ. "
+    "استخدم التوجيه المرفق لتعرف ما الذي تسأل عنه أو تؤكده، ولا تخترع أسعاراً أو وجهات."
+)
+
+
+def split_chunks(text, size=CHUNK_WORDS):
+    """تقسيم النص إلى مقاطع من عدة كلمات مع الحفاظ على المسافات وفواصل الأسطر"""
+    words = text.split(' ')
+    for start in range(0, len(words), size):
+        chunk = ' '.join(words[start:start + size])
+        yield chunk if start + size >= len(words) else chunk + ' '
+
+
+class BackendUnavailable(Exception):
+    """النموذج غير متاح حالياً (قاطع الدائرة مفتوح، أو لا مكان في حد التزامن، أو فشلت المحاولات)"""
+
+
+class CircuitBreaker:
+    """قاطع دائرة: يفتح بعد عدد من الإخفاقات المتتالية ويسمح بطلب تجريبي واحد بعد مهلة"""
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half_open'
+        return 'open'
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half_open' and not self.probing:
+                self.probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.probing or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self.probing = False
+
+
+# مشترك على مستوى العملية بدل إنشاء مساعد جديد في كل طلب
+_assistant = AITravelAssistant()
+
+
+class RuleBasedBackend:
+    """المساعد الحالي القائم على القواعد، يُبث رده على مقاطع"""
+    name = 'rules'
+    # هل يعتمد الرد على نص المحادثة أم على المتطلبات فقط (يدخل في مفتاح الذاكرة)
+    uses_history = False
+
+    def __init__(self):
+        self.assistant = _assistant
+
+    def generate_response(self, conversation_history, user_requirements):
+        return self.assistant.generate_response(conversation_history, user_requirements)
+
+    def generate_travel_plan(self, requirements):
+        return self.assistant.generate_travel_plan(requirements)
+
+    async def stream_response(self, conversation_history, user_requirements):
+        """أحداث الرد: {'type': 'delta', 'text'} لكل مقطع ثم {'type': 'done', 'response'}"""
+        # الرد يقرأ فهرس الكتالوج (ملفات وذاكرة مؤقتة) فيُنفذ في خيط منفصل
+        response = await sync_to_async(self.generate_response)(conversation_history, user_requirements)
+        for chunk in split_chunks(response['message']):
+            yield {'type': 'delta', 'text': chunk}
+        yield {'type': 'done', 'response': response}
+
+    async def stream_travel_plan(self, requirements):
+        """أحداث الخطة: {'type': 'outline', 'plan'} ثم {'type': 'day'} لكل يوم ثم {'type': 'done', 'plan'}"""
+        plan, days = await sync_to_async(self.assistant.build_plan)(requirements)
+        yield {'type': 'outline', 'plan': dict(plan)}
+        for key, day_plan in days:
+            plan['daily_plan'][key] = day_plan
+            yield {'type': 'day', 'day': key, 'plan': day_plan}
+        yield {'type': 'done', 'plan': plan}
+
+
+class FakeBackend:
+    """نموذج وهمي داخل العملية للاختبارات: رد ثابت يُبث كلمة بكلمة بتأخير اختياري ودون قاعدة بيانات"""
+    name = 'fake'
+    uses_history = True
+
+    def __init__(self, delay=None):
+        self.delay = getattr(settings, 'AI_FAKE_BACKEND_DELAY', 0.0) if delay is None else delay
+
+    async def _pause(self):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+
+    def generate_response(self, conversation_history, user_requirements):
+        last_message = conversation_history[-1]['message'] if conversation_history else ''
+        return {
+            'message': f"رد تجريبي على: {last_message}",
+            'action': 'continue',
+            'missing_info': [],
+            'suggestions': [],
+        }
+
+    def build_plan(self, requirements):
+        duration = requirements.get('duration_days', 3)
+        plan = {
+            'summary': f"خطة تجريبية لمدة {duration} أيام",
+            'total_estimated_cost': requirements.get('budget', {}).get('total', 0),
+            'daily_plan': {},
+            'included_services': [],
+            'recommended_destinations': [],
+        }
+        days = ((f'day_{day}', {'morning': f"نشاط تجريبي في اليوم {day}"}) for day in range(1, duration + 1))
+        return plan, days
+
+    def generate_travel_plan(self, requirements):
+        plan, days = self.build_plan(requirements)
+        plan['daily_plan'].update(days)
+        return plan
+
+    async def stream_response(self, conversation_history, user_requirements):
+        response = self.generate_response(conversation_history, user_requirements)
+        for chunk in split_chunks(response['message'], size=1):
+            await self._pause()
+            yield {'type': 'delta', 'text': chunk}
+        yield {'type': 'done', 'response': response}
+
+    async def stream_travel_plan(self, requirements):
+        plan, days = self.build_plan(requirements)
+        yield {'type': 'outline', 'plan': dict(plan)}
+        for key, day_plan in days:
+            await self._pause()
+            plan['daily_plan'][key] = day_plan
+            yield {'type': 'day', 'day': key, 'plan': day_plan}
+        yield {'type': 'done', 'plan': plan}
+
+
+class OpenAICompatibleBackend:
+    """نموذج عبر واجهة OpenAI المتوافقة (أو خادم run_llm_stub المحلي) مع الرجوع إلى القواعد عند التعذر"""
+    name = 'openai'
+    uses_history = True
+    # أخطاء مؤقتة تستحق إعادة المحاولة؛ أخطاء 4xx الأخرى تعني أن الطلب نفسه خاطئ
+    retryable_errors = (openai.APIConnectionError, openai.RateLimitError, openai.InternalServerError)
+
+    def __init__(self):
+        self.fallback = RuleBasedBackend()
+        self.model_name = getattr(settings, 'AI_MODEL_NAME', 'travel-assistant')
+        self.timeout = getattr(settings, 'AI_REQUEST_TIMEOUT', 10.0)
+        self.max_retries = getattr(settings, 'AI_MAX_RETRIES', 2)
+        self.retry_backoff = getattr(settings, 'AI_RETRY_BACKOFF', 0.25)
+        self.queue_timeout = getattr(settings, 'AI_QUEUE_TIMEOUT', 1.0)
+        self.max_concurrency = getattr(settings, 'AI_MAX_CONCURRENCY', 8)
+        self.breaker = CircuitBreaker(
+            getattr(settings, 'AI_CIRCUIT_FAILURE_THRESHOLD', 5),
+            getattr(settings, 'AI_CIRCUIT_RESET_TIMEOUT', 30.0),
+        )
+        self.semaphore = threading.BoundedSemaphore(self.max_concurrency)
+        self._async_semaphore = None
+        # عميل واحد لكل عملية يعيد استخدام اتصالات HTTP، وإعادة المحاولة تُدار هنا لا في المكتبة
+        client_options = {
+            'api_key': getattr(settings, 'AI_API_KEY', '') or 'not-needed',
+            'base_url': getattr(settings, 'AI_API_BASE', None),
+            'timeout': self.timeout,
+            'max_retries': 0,
+        }
+        self.client = openai.OpenAI(**client_options)
+        self.async_client = openai.AsyncOpenAI(**client_options)
+
+    @property
+    def async_semaphore(self):
+        # يُنشأ عند أول استخدام داخل حلقة الأحداث
+        if self._async_semaphore is None:
+            self._async_semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._async_semaphore
+
+    def build_messages(self, conversation_history, guidance):
+        messages = [{'role': 'system', 'content': SYSTEM_PROMPT}]
+        messages.extend(
+            {'role': entry['role'], 'content': entry['message']}
+            for entry in conversation_history if entry.get('role') in ('user', 'assistant')
+        )
+        messages.append({'role': 'system', 'content': f"توجيه للرد التالي: {guidance['message']}"})
+        return messages
+
+    def retry_delay(self, attempt):
+        """تأخير أُسّي مع تشويش كامل حتى لا تعيد العمليات المحاولة في نفس اللحظة"""
+        return random.uniform(0, self.retry_backoff * (2 ** attempt))
+
+    def complete(self, messages):
+        """نص رد النموذج مع حد التزامن وإعادة المحاولة وقاطع الدائرة"""
+        if self.breaker.state == 'open':
+            raise BackendUnavailable('circuit open')
+        # انتظار محدود لمكان في حد التزامن بدل حجز خيوط العامل خلف نموذج بطيء
+        if not self.semaphore.acquire(timeout=self.queue_timeout):
+            raise BackendUnavailable('concurrency limit')
+        try:
+            if not self.breaker.allow():
+                raise BackendUnavailable('circuit open')
+            for attempt in range(self.max_retries + 1):
+                try:
+                    completion = self.client.chat.completions.create(model=self.model_name, messages=messages)
+                    text = completion.choices[0].message.content or ''
+                    self.breaker.record_success()
+                    return text
+                except self.retryable_errors as exc:
+                    logger.warning('LLM request failed (attempt %s): %s', attempt + 1, exc)
+                    if attempt < self.max_retries:
+                        time.sleep(self.retry_delay(attempt))
+                except openai.APIError as exc:
+                    logger.warning('LLM request rejected: %s', exc)
+                    break
+            self.breaker.record_failure()
+            raise BackendUnavailable('request failed')
+        finally:
+            self.semaphore.release()
+
+    def generate_response(self, conversation_history, user_requirements):
+        # الإجراء والاقتراحات من القواعد، والنموذج يصوغ نص الرسالة فقط
+        response = self.fallback.generate_response(conversation_history, user_requirements)
+        try:
+            text = self.complete(self.build_messages(conversation_history, response))
+        except BackendUnavailable:
+            return response
+        if text.strip():
+            response['message'] = text
+        return response
+
+    def generate_travel_plan(self, requirements):
+        return self.fallback.generate_travel_plan(requirements)
+
+    async def open_stream(self, messages):
+        """فتح بث النموذج مع إعادة المحاولة (قبل وصول أي مقطع فقط)"""
+        for attempt in range(self.max_retries + 1):
+            try:
+                return await self.async_client.chat.completions.create(
+                    model=self.model_name, messages=messages, stream=True
+                )
+            except self.retryable_errors as exc:
+                logger.warning('LLM stream failed (attempt %s): %s', attempt + 1, exc)
+                if attempt < self.max_retries:
+                    await asyncio.sleep(self.retry_delay(attempt))
+            except openai.APIError as exc:
+                logger.warning('LLM stream rejected: %s', exc)
+                break
+        raise BackendUnavailable('request failed')
+
+    async def stream_response(self, conversation_history, user_requirements):
+        response = await sync_to_async(self.fallback.generate_response)(conversation_history, user_requirements)
+        messages = self.build_messages(conversation_history, response)
+
+        stream = None
+        if self.breaker.state != 'open':
+            try:
+                await asyncio.wait_for(self.async_semaphore.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                pass
+            else:
+                try:
+                    if self.breaker.allow():
+                        stream = await self.open_stream(messages)
+                except BackendUnavailable:
+                    self.breaker.record_failure()
+                finally:
+                    if stream is None:
+                        self.async_semaphore.release()
+
+        if stream is None:
+            async for event in self._stream_fallback(response):
+                yield event
+            return
+
+        parts = []
+        try:
+            async for chunk in stream:
+                text = chunk.choices[0].delta.content if chunk.choices else None
+                if text:
+                    parts.append(text)
+                    yield {'type': 'delta', 'text': text}
+            self.breaker.record_success()
+        except (openai.APIError, asyncio.TimeoutError) as exc:
+            # انقطاع أثناء البث: يُكتفى بما وصل، أو برد القواعد إن لم يصل شيء
+            logger.warning('LLM stream interrupted: %s', exc)
+            self.breaker.record_failure()
+        finally:
+            # يُغلق الاتصال أيضاً عند انقطاع العميل قبل اكتمال البث
+            await stream.close()
+            self.async_semaphore.release()
+
+        if parts:
+            response['message'] = ''.join(parts)
+            yield {'type': 'done', 'response': response}
+        else:
+            async for event in self._stream_fallback(response):
+                yield event
+
+    async def _stream_fallback(self, response):
+        for chunk in split_chunks(response['message']):
+            yield {'type': 'delta', 'text': chunk}
+        yield {'type': 'done', 'response': response}
+
+    async def stream_travel_plan(self, requirements):
+        async for event in self.fallback.stream_travel_plan(requirements):
+            yield event
+
+
+BACKENDS = {
+    RuleBasedBackend.name: RuleBasedBackend,
+    FakeBackend.name: FakeBackend,
+    OpenAICompatibleBackend.name: OpenAICompatibleBackend,
+}
+
+_lock = threading.Lock()
+_instances = {}
+
+
+def get_backend(name=None):
+    """الواجهة المحددة في الإعداد AI_BACKEND (rules افتراضياً)، نسخة واحدة لكل عملية"""
+    name = name or getattr(settings, 'AI_BACKEND', RuleBasedBackend.name)
+    backend = _instances.get(name)
+    if backend is None:
+        with _lock:
+            backend = _instances.get(name)
+            if backend is None:
+                backend = _instances[name] = BACKENDS[name]()
+    return backend
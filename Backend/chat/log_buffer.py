@@ -0,0 +1,164 @@
+import atexit
+import json
+import logging
+import threading
+import uuid
+from collections import deque
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DatabaseError, IntegrityError, close_old_connections, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_wakeup = threading.Event()
+_buffer = deque()
+# يُنبَّه المنتجون المنتظرون عند خروج سجلات من المخزن
+_space = threading.Condition(_lock)
+_state = {'worker': None, 'atexit_registered': False, 'dropped': 0, 'written': 0, 'failing': False}
+# تفريغ واحد في كل مرة داخل العملية (الخيط الخلفي أو عند الخروج)
+_flush_lock = threading.Lock()
+
+
+def _max_size():
+    return getattr(settings, 'AI_LOG_BUFFER_SIZE', 1000)
+
+
+def _batch_size():
+    return getattr(settings, 'AI_LOG_BATCH_SIZE', 100)
+
+
+def _flush_interval():
+    return getattr(settings, 'AI_LOG_FLUSH_INTERVAL', 2.0)
+
+
+def _overflow_policy():
+    # wait: إيقاظ الخيط الخلفي وانتظار مكان لمدة قصيرة (ضغط عكسي) ثم رفض السجل، drop: رفض السجل فوراً
+    return getattr(settings, 'AI_LOG_OVERFLOW', 'wait')
+
+
+def _overflow_wait():
+    return getattr(settings, 'AI_LOG_OVERFLOW_WAIT', 0.1)
+
+
+def _json_safe(value):
+    """تحويل القيم (Decimal، التواريخ) إلى شكل يقبله JSONField"""
+    return json.loads(json.dumps(value, cls=DjangoJSONEncoder))
+
+
+def enqueue(user_id, recommendation_type, input_parameters, output_recommendations,
+            confidence_score=0.0, session_id=None):
+    """إضافة سجل توصية إلى المخزن المؤقت وإرجاع معرفه العام فوراً قبل الكتابة (لا تكتب ولا ترفع استثناء).
+
+    عند امتلاء المخزن يُرفض السجل الجديد ويُعاد None: السجلات الموجودة سُلّمت معرفاتها للعملاء فلا تُسقط.
+    """
+    public_id = uuid.uuid4()
+    record = {
+        'public_id': public_id,
+        'user_id': user_id,
+        'session_id': session_id,
+        'recommendation_type': recommendation_type,
+        'input_parameters': _json_safe(input_parameters),
+        'output_recommendations': _json_safe(output_recommendations),
+        'confidence_score': confidence_score,
+        'created_at': timezone.now(),
+    }
+
+    with _lock:
+        _ensure_worker()
+        if len(_buffer) >= _max_size():
+            _wakeup.set()
+            # الانتظار لا يفيد إن كانت آخر كتابة فشلت (قاعدة البيانات غير متاحة)
+            if _overflow_policy() != 'drop' and not _state['failing']:
+                _space.wait_for(lambda: len(_buffer) < _max_size(), timeout=_overflow_wait())
+            if len(_buffer) >= _max_size():
+                # الكاتب متأخر أو قاعدة البيانات غير متاحة: لا يُسجل هذا السجل ولا يُعطى معرفاً بدل إيقاف الطلب
+                _state['dropped'] += 1
+                return None
+        _buffer.append(record)
+        pending = len(_buffer)
+
+    if pending >= _batch_size():
+        _wakeup.set()
+    return public_id
+
+
+def _ensure_worker():
+    if _state['worker'] is None or not _state['worker'].is_alive():
+        worker = threading.Thread(target=_run, name='ai-log-buffer', daemon=True)
+        _state['worker'] = worker
+        worker.start()
+        if not _state['atexit_registered']:
+            atexit.register(flush)
+            _state['atexit_registered'] = True
+
+
+def _run():
+    while True:
+        _wakeup.wait(_flush_interval())
+        _wakeup.clear()
+        try:
+            flush()
+            _state['failing'] = False
+        except Exception:
+            _state['failing'] = True
+            logger.exception('AI log buffer flush failed')
+        finally:
+            close_old_connections()
+
+
+def _take(limit):
+    with _lock:
+        records = [_buffer.popleft() for _ in range(min(limit, len(_buffer)))]
+        _space.notify_all()
+        return records
+
+
+def _write(records):
+    from .models import AIRecommendationLog
+
+    objects = [AIRecommendationLog(**record) for record in records]
+    try:
+        with transaction.atomic():
+            AIRecommendationLog.objects.bulk_create(objects)
+        return len(objects)
+    except IntegrityError:
+        # سجل يشير إلى جلسة أو مستخدم حُذف بعد إضافته: يُكتب الباقي سجلاً سجلاً
+        written = 0
+        for obj in objects:
+            try:
+                with transaction.atomic():
+                    obj.save(force_insert=True)
+                written += 1
+            except IntegrityError:
+                logger.warning('Dropping AI recommendation log %s: integrity error', obj.public_id)
+        return written
+
+
+def flush():
+    """كتابة كل السجلات المعلقة على دفعات باستخدام bulk_create وإرجاع عدد المكتوب"""
+    written = 0
+    with _flush_lock:
+        while True:
+            records = _take(_batch_size())
+            if not records:
+                break
+            try:
+                written += _write(records)
+            except DatabaseError:
+                # قاعدة البيانات غير متاحة: تعود الدفعة كاملة إلى بداية المخزن لتُكتب في المحاولة التالية
+                # (قد يتجاوز المخزن حده بدفعة واحدة، والإضافات الجديدة تُرفض حتى ينزل تحته)
+                with _lock:
+                    _buffer.extendleft(reversed(records))
+                raise
+    with _lock:
+        _state['written'] += written
+    return written
+
+
+def stats():
+    """عدد السجلات المعلقة والمكتوبة والمرفوضة (لم يُعطَ لها معرف) في هذه العملية"""
+    with _lock:
+        return {'pending': len(_buffer), 'written': _state['written'], 'dropped': _state['dropped']}
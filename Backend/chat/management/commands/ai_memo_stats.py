@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from chat import memo
+
+
+class Command(BaseCommand):
+    help = 'عرض إحصائيات ذاكرة ردود المساعد وخطط السفر (الإصابات والإخفاقات والإزاحات)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='تصفير العدادات بعد العرض')
+
+    def handle(self, *args, **options):
+        stats = memo.get_stats()
+        self.stdout.write(' '.join(f'{name}={value}' for name, value in stats.items()))
+        if options['reset']:
+            memo.reset_stats()
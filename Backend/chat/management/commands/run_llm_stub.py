@@ -0,0 +1,104 @@
+import json
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.core.management.base import BaseCommand
+
+
+def stub_reply(messages):
+    """رد حتمي: نفس المدخلات تعطي نفس الرد دائماً"""
+    user_messages = [message['content'] for message in messages if message.get('role') == 'user']
+    last_message = user_messages[-1] if user_messages else ''
+    return f"رد النموذج المحلي على: {last_message}"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """واجهة /v1/chat/completions المتوافقة مع OpenAI (عادية وبث SSE)"""
+    protocol_version = 'HTTP/1.1'
+    delay = 0.0
+    status = 200
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        if self.path.rstrip('/') not in ('/v1/chat/completions', '/chat/completions'):
+            self.send_json(404, {'error': {'message': 'not found'}})
+            return
+        length = int(self.headers.get('Content-Length') or 0)
+        request = json.loads(self.rfile.read(length) or b'{}')
+        if self.status != 200:
+            self.send_json(self.status, {'error': {'message': 'stub failure', 'type': 'server_error'}})
+            return
+
+        reply = stub_reply(request.get('messages', []))
+        model = request.get('model', 'stub')
+        if not request.get('stream'):
+            time.sleep(self.delay)
+            self.send_json(200, {
+                'id': 'chatcmpl-stub',
+                'object': 'chat.completion',
+                'created': int(time.time()),
+                'model': model,
+                'choices': [{
+                    'index': 0,
+                    'message': {'role': 'assistant', 'content': reply},
+                    'finish_reason': 'stop',
+                }],
+            })
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        words = reply.split(' ')
+        for position, word in enumerate(words):
+            time.sleep(self.delay)
+            chunk = {
+                'id': 'chatcmpl-stub',
+                'object': 'chat.completion.chunk',
+                'created': int(time.time()),
+                'model': model,
+                'choices': [{
+                    'index': 0,
+                    'delta': {'content': word if position == len(words) - 1 else word + ' '},
+                    'finish_reason': None,
+                }],
+            }
+            self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode('utf-8'))
+            self.wfile.flush()
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+        self.close_connection = True
+
+
+class Command(BaseCommand):
+    help = 'تشغيل خادم نموذج محلي حتمي متوافق مع OpenAI للتطوير والاختبار (AI_BACKEND=openai)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8089)
+        parser.add_argument('--delay', type=float, default=0.0, help='تأخير بالثواني قبل الرد أو قبل كل كلمة في البث')
+        parser.add_argument('--status', type=int, default=200, help='رمز حالة ثابت لمحاكاة أعطال النموذج')
+
+    def handle(self, *args, **options):
+        handler = type('Handler', (StubHandler,), {'delay': options['delay'], 'status': options['status']})
+        server = ThreadingHTTPServer((options['host'], options['port']), handler)
+        self.stdout.write(self.style.SUCCESS(
+            f"خادم النموذج المحلي على http://{options['host']}:{options['port']}/v1"
+        ))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,42 @@
+import time
+
+from django.core.management.base import BaseCommand
+from chat import sweeper
+
+
+class Command(BaseCommand):
+    help = 'حذف جلسات المحادثة المنتهية مع رسائلها وسجلات توصياتها على دفعات صغيرة'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='عدد الجلسات في كل دفعة')
+        parser.add_argument('--sleep', type=float, default=0.0, help='مهلة بالثواني بين الدفعات')
+        parser.add_argument('--max-batches', type=int, default=None, help='أقصى عدد من الدفعات في هذا التشغيل')
+        parser.add_argument('--archive', default=None, help='ملف JSONL تُضاف إليه الجلسات قبل حذفها')
+        parser.add_argument('--dry-run', action='store_true', help='عرض ما سيُحذف دون حذف')
+        parser.add_argument('--every', type=float, default=None, help='التشغيل الدوري كل عدد من الثواني بدل مرة واحدة')
+
+    def handle(self, *args, **options):
+        while True:
+            self.sweep(options)
+            if not options['every']:
+                break
+            time.sleep(options['every'])
+
+    def sweep(self, options):
+        archive = open(options['archive'], 'a', encoding='utf-8') if options['archive'] else None
+        try:
+            stats = sweeper.sweep_expired_sessions(
+                batch_size=options['batch_size'],
+                dry_run=options['dry_run'],
+                archive=archive,
+                pause=options['sleep'],
+                max_batches=options['max_batches'],
+            )
+        finally:
+            if archive is not None:
+                archive.close()
+        prefix = 'سيُحذف' if options['dry_run'] else 'حُذف'
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix} {stats['sessions']} جلسة و{stats['messages']} رسالة و{stats['recommendations']} توصية "
+            f"(~{stats['bytes'] / 1024:.1f} KB) في {stats['batches']} دفعة خلال {stats['seconds']:.2f} ثانية"
+        ))
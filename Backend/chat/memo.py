@@ -0,0 +1,133 @@
+import copy
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+
+from packages.catalog_cache import get_generations, incr
+
+STATS_KEY = 'ai:memo:stats:{}'
+STAT_NAMES = ('hits', 'misses', 'evictions', 'expirations')
+# الردود والخطط تقرأ الوجهات والخدمات والباقات، فيتغير المفتاح عند تعديل أي منها
+CATALOG_MODELS = ('destination', 'service', 'package')
+
+
+def canonical(value):
+    """شكل موحد للمتطلبات: مفاتيح مرتبة، أرقام بصيغة واحدة (500 = 500.00)، نصوص دون مسافات زائدة، وحذف القيم الفارغة"""
+    if isinstance(value, dict):
+        return {
+            str(key): canonical(item) for key, item in sorted(value.items(), key=lambda pair: str(pair[0]))
+            if item not in (None, '', [], {})
+        }
+    if isinstance(value, (list, tuple)):
+        return [canonical(item) for item in value]
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float, Decimal)):
+        number = Decimal(str(value)).normalize()
+        return format(number, 'f')
+    if isinstance(value, str):
+        return ' '.join(value.split())
+    return str(value)
+
+
+def build_key(kind, requirements, extra=None):
+    """بصمة sha1 للنوع والمتطلبات الموحدة وأجيال الكتالوج الحالية"""
+    generations = get_generations(CATALOG_MODELS)
+    raw = json.dumps(
+        [kind, canonical(requirements), sorted(generations.items()), extra],
+        sort_keys=True, ensure_ascii=False, separators=(',', ':'), default=str,
+    )
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+class MemoCache:
+    """ذاكرة LRU محدودة الحجم مع مدة صلاحية لكل عنصر، محلية لكل عملية"""
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """(موجود، القيمة)؛ العنصر المقروء يصبح الأحدث استخداماً"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                _count('expirations')
+                return False, None
+            self._entries.move_to_end(key)
+            return True, value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                _count('evictions')
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def _count(name):
+    # العدادات في الكاش المشترك لتجمع كل العمليات كما في إحصائيات كاش الكتالوج
+    incr(STATS_KEY.format(name))
+
+
+_memo = MemoCache(
+    getattr(settings, 'AI_MEMO_MAX_ENTRIES', 1024),
+    getattr(settings, 'AI_MEMO_TTL', 600),
+)
+
+
+def memoize(kind, requirements, compute, extra=None):
+    """قيمة محفوظة لنفس المتطلبات والكتالوج، أو حسابها وحفظها؛ يعيد (القيمة، إصابة؟)"""
+    key = build_key(kind, requirements, extra)
+    found, value = _memo.get(key)
+    _count('hits' if found else 'misses')
+    if not found:
+        value = compute()
+        _memo.set(key, value)
+    # نسخة مستقلة حتى لا يعدّل المستدعي القيمة المحفوظة
+    return copy.deepcopy(value), found
+
+
+def lookup(key):
+    return _memo.get(key)
+
+
+def store(key, value):
+    _memo.set(key, value)
+
+
+def get_stats():
+    """الإصابات والإخفاقات والإزاحات والانتهاءات ونسبة الإصابة"""
+    values = cache.get_many([STATS_KEY.format(name) for name in STAT_NAMES])
+    stats = {name: values.get(STATS_KEY.format(name), 0) for name in STAT_NAMES}
+    total = stats['hits'] + stats['misses']
+    stats['hit_rate'] = round(stats['hits'] / total, 4) if total else 0.0
+    return stats
+
+
+def reset_stats():
+    cache.delete_many([STATS_KEY.format(name) for name in STAT_NAMES])
+
+
+def clear():
+    _memo.clear()
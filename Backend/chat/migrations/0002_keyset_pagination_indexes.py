@@ -0,0 +1,19 @@
+# Generated by Django 5.2.7 on 2026-10-17 17:42
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='chatsession',
+            index=models.Index(fields=['user', 'created_at', 'id'], name='chat_sessio_user_id_76913b_idx'),
+        ),
+    ]
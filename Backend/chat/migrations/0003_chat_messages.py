@@ -0,0 +1,39 @@
+# Generated by Django 5.2.7 on 2026-10-17 18:03
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0002_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatsession',
+            name='message_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='عدد الرسائل'),
+        ),
+        migrations.CreateModel(
+            name='ChatMessage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sequence', models.PositiveIntegerField(verbose_name='التسلسل')),
+                ('role', models.CharField(choices=[('user', 'المستخدم'), ('assistant', 'المساعد')], max_length=10, verbose_name='المرسل')),
+                ('message', models.TextField(verbose_name='الرسالة')),
+                ('action', models.CharField(blank=True, default='', max_length=30, verbose_name='الإجراء')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='تاريخ الإرسال')),
+                ('session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='messages', to='chat.chatsession', verbose_name='جلسة المحادثة')),
+            ],
+            options={
+                'verbose_name': 'رسالة محادثة',
+                'verbose_name_plural': 'رسائل المحادثة',
+                'db_table': 'chat_messages',
+                'ordering': ['session', 'sequence'],
+                'constraints': [models.UniqueConstraint(fields=('session', 'sequence'), name='unique_chat_message_sequence')],
+            },
+        ),
+    ]
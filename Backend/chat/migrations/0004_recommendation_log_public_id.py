@@ -0,0 +1,41 @@
+# Generated by Django 5.2.7 on 2026-10-17 18:40
+
+import uuid
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def fill_public_ids(apps, schema_editor):
+    """معرف عام مختلف لكل سجل موجود قبل إضافة قيد التفرد"""
+    AIRecommendationLog = apps.get_model('chat', 'AIRecommendationLog')
+    logs = list(AIRecommendationLog.objects.filter(public_id__isnull=True).only('id'))
+    for log in logs:
+        log.public_id = uuid.uuid4()
+    AIRecommendationLog.objects.bulk_update(logs, ['public_id'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0003_chat_messages'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='airecommendationlog',
+            name='public_id',
+            field=models.UUIDField(editable=False, null=True, verbose_name='المعرف العام'),
+        ),
+        migrations.RunPython(fill_public_ids, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='airecommendationlog',
+            name='public_id',
+            field=models.UUIDField(default=uuid.uuid4, editable=False, unique=True, verbose_name='المعرف العام'),
+        ),
+        migrations.AlterField(
+            model_name='airecommendationlog',
+            name='session',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='recommendations', to='chat.chatsession', verbose_name='جلسة المحادثة'),
+        ),
+    ]
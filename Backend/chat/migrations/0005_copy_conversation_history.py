@@ -0,0 +1,60 @@
+# Generated by Django 5.2.7 on 2026-10-17 18:50
+
+from django.db import migrations
+from django.utils.dateparse import parse_datetime
+
+
+def _parse_timestamp(value):
+    try:
+        return parse_datetime(value or '')
+    except ValueError:
+        return None
+
+
+def copy_history_to_messages(apps, schema_editor):
+    """نقل سجل المحادثة من حقل JSON إلى جدول الرسائل"""
+    ChatSession = apps.get_model('chat', 'ChatSession')
+    ChatMessage = apps.get_model('chat', 'ChatMessage')
+    sessions = ChatSession.objects.only('id', 'conversation_history', 'created_at')
+    for session in sessions.iterator(chunk_size=200):
+        messages = []
+        for entry in session.conversation_history or []:
+            if not isinstance(entry, dict):
+                continue
+            messages.append(ChatMessage(
+                session_id=session.id,
+                sequence=len(messages) + 1,
+                role=entry.get('role') if entry.get('role') in ('user', 'assistant') else 'user',
+                message=str(entry.get('message', '')),
+                action=str(entry.get('action') or '')[:30],
+                created_at=_parse_timestamp(entry.get('timestamp')) or session.created_at,
+            ))
+        ChatMessage.objects.bulk_create(messages, batch_size=500)
+        ChatSession.objects.filter(id=session.id).update(message_count=len(messages))
+
+
+def copy_messages_to_history(apps, schema_editor):
+    """إعادة الرسائل إلى حقل JSON (التراجع عن النقل)"""
+    ChatSession = apps.get_model('chat', 'ChatSession')
+    ChatMessage = apps.get_model('chat', 'ChatMessage')
+    for session in ChatSession.objects.only('id').iterator(chunk_size=200):
+        history = []
+        for message in ChatMessage.objects.filter(session_id=session.id).order_by('sequence'):
+            entry = {'role': message.role, 'message': message.message, 'timestamp': message.created_at.isoformat()}
+            if message.action:
+                entry['action'] = message.action
+            history.append(entry)
+        ChatSession.objects.filter(id=session.id).update(conversation_history=history, message_count=0)
+    # حذف الرسائل المنسوخة حتى لا يكرر إعادة تطبيق النقل تسلسلاتها
+    ChatMessage.objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0004_recommendation_log_public_id'),
+    ]
+
+    operations = [
+        migrations.RunPython(copy_history_to_messages, copy_messages_to_history),
+    ]
@@ -0,0 +1,16 @@
+# Generated by Django 5.2.7 on 2026-10-17 18:50
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('chat', '0005_copy_conversation_history'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='chatsession',
+            name='conversation_history',
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 import uuid
 
@@ -16,7 +17,7 @@ class ChatSession(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='chat_sessions', verbose_name=_('المستخدم'))
     session_id = models.CharField(_('معرف الجلسة'), max_length=100, unique=True)
     initial_requirements = models.JSONField(_('المتطلبات الأولية'), default=dict)
-    conversation_history = models.JSONField(_('سجل المحادثة'), default=list)
+    message_count = models.PositiveIntegerField(_('عدد الرسائل'), default=0)
     extracted_preferences = models.JSONField(_('التفضيلات المستخلصة'), default=dict)
     generated_plan = models.JSONField(_('الخطة المولدة'), default=dict)
     budget_range = models.JSONField(_('نطاق الميزانية'), default=dict)
@@ -36,6 +37,7 @@ class ChatSession(models.Model):
             models.Index(fields=['user', 'status']),
             models.Index(fields=['expires_at']),
             models.Index(fields=['session_id']),
+            models.Index(fields=['user', 'created_at', 'id']),
         ]
 
     def __str__(self):
@@ -46,6 +48,31 @@ class ChatSession(models.Model):
             self.session_id = str(uuid.uuid4())
         super().save(*args, **kwargs)
 
+class ChatMessage(models.Model):
+    ROLES = (
+        ('user', 'المستخدم'),
+        ('assistant', 'المساعد'),
+    )
+    
+    session = models.ForeignKey(ChatSession, on_delete=models.CASCADE, related_name='messages', verbose_name=_('جلسة المحادثة'))
+    sequence = models.PositiveIntegerField(_('التسلسل'))
+    role = models.CharField(_('المرسل'), max_length=10, choices=ROLES)
+    message = models.TextField(_('الرسالة'))
+    action = models.CharField(_('الإجراء'), max_length=30, blank=True, default='')
+    created_at = models.DateTimeField(_('تاريخ الإرسال'), default=timezone.now)
+
+    class Meta:
+        db_table = 'chat_messages'
+        verbose_name = _('رسالة محادثة')
+        verbose_name_plural = _('رسائل المحادثة')
+        ordering = ['session', 'sequence']
+        constraints = [
+            models.UniqueConstraint(fields=['session', 'sequence'], name='unique_chat_message_sequence'),
+        ]
+
+    def __str__(self):
+        return f"{self.session_id} #{self.sequence} ({self.role})"
+
 class TravelPreference(models.Model):
     PREFERENCE_TYPES = (
         ('accommodation', 'الإقامة'),
@@ -84,8 +111,10 @@ class AIRecommendationLog(models.Model):
         ('custom_plan', 'خطة مخصصة'),
     )
     
+    # المعرف العام يُعطى للعميل قبل كتابة السجل (الكتابة مؤجلة على دفعات)
+    public_id = models.UUIDField(_('المعرف العام'), default=uuid.uuid4, unique=True, editable=False)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, verbose_name=_('المستخدم'))
-    session = models.ForeignKey(ChatSession, on_delete=models.CASCADE, related_name='recommendations', verbose_name=_('جلسة المحادثة'))
+    session = models.ForeignKey(ChatSession, on_delete=models.CASCADE, related_name='recommendations', verbose_name=_('جلسة المحادثة'), blank=True, null=True)
     recommendation_type = models.CharField(_('نوع التوصية'), max_length=20, choices=RECOMMENDATION_TYPES)
     input_parameters = models.JSONField(_('معاملات الإدخال'), default=dict)
     output_recommendations = models.JSONField(_('التوصيات المخرجة'), default=list)
@@ -0,0 +1,329 @@
+import math
+import threading
+
+import numpy as np
+
+from packages import snapshot
+
+LEVELS = ('economy', 'standard', 'premium', 'luxury')
+# المستوى كما يكتبه المستخدم بالعربية أو بالإنجليزية
+LEVEL_ALIASES = {
+    'economy': 'economy', 'اقتصادي': 'economy',
+    'standard': 'standard', 'قياسي': 'standard',
+    'premium': 'premium', 'متميز': 'premium',
+    'luxury': 'luxury', 'فاخر': 'luxury',
+}
+DEFAULT_LEVEL = 'standard'
+
+# فترات اليوم وأنواع الخدمات المناسبة لكل منها
+TIME_SLOTS = (
+    ('morning', ('activity', 'guide')),
+    ('afternoon', ('activity', 'guide')),
+    ('evening', ('restaurant',)),
+)
+# أهمية كل خانة في الخطة: الإقامة أهم من النشاط، والنشاط أهم من المطعم
+SLOT_WEIGHTS = {'accommodation': 1.0, 'transport': 0.3, 'morning': 0.8, 'afternoon': 0.8, 'evening': 0.5}
+# الخانات التي لا تكتمل الخطة بدونها (تُحذف الأنشطة والمطاعم قبلها عند ضيق الميزانية)
+REQUIRED_SLOTS = ('accommodation', 'transport')
+# خانات الأنشطة التي لا تتكرر خدمتها في نفس الرحلة
+UNIQUE_SLOTS = ('morning', 'afternoon')
+
+
+class PriceTable:
+    """جدول أسعار الخدمات كمصفوفات NumPy فوق أعمدة لقطة الكتالوج، مجمّع حسب (الوجهة، النوع)"""
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        columns = catalog.services.columns
+        self.ids = np.asarray(columns['id'], dtype=np.int64)
+        self.prices = np.asarray(columns['price_per_unit'], dtype=np.float64)
+        # السعة اليومية بالأشخاص (-1 = غير محدودة) وحجم الوحدة المسعّرة (-1 = السعر للشخص)
+        self.capacities = np.asarray(columns['capacity'], dtype=np.int64)
+        self.unit_sizes = np.asarray(columns['persons_per_unit'], dtype=np.int64)
+        self.ratings = np.asarray(columns['rating'], dtype=np.float64)
+        type_positions = np.asarray(columns['type'])
+        level_positions = np.asarray(columns['level'])
+
+        # الأعمدة النصية أرقام في جدول النصوص الموحد، فتُحوّل القيم المختلفة فقط
+        types = {int(position): catalog.string(int(position)) for position in np.unique(type_positions)}
+        self.levels = np.full(len(self.ids), LEVELS.index(DEFAULT_LEVEL), dtype=np.int64)
+        for position in np.unique(level_positions):
+            level = catalog.string(int(position))
+            if level in LEVELS:
+                self.levels[level_positions == position] = LEVELS.index(level)
+
+        destination_ids = np.asarray(columns['destination_id'], dtype=np.int64)
+        order = np.lexsort((type_positions, destination_ids))
+        keys = np.stack([destination_ids[order], type_positions[order]], axis=1)
+        boundaries = np.flatnonzero(np.any(keys[1:] != keys[:-1], axis=1)) + 1
+        self.groups = {}
+        for rows in np.split(order, boundaries):
+            if len(rows):
+                self.groups[(int(destination_ids[rows[0]]), types[int(type_positions[rows[0]])])] = rows
+
+    def rows(self, destination_id, service_types):
+        groups = [self.groups.get((destination_id, service_type)) for service_type in service_types]
+        groups = [rows for rows in groups if rows is not None]
+        if not groups:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate(groups)
+
+    def fits(self, rows, travelers):
+        """الخدمات التي تتسع سعتها اليومية للمجموعة كلها (كما يتحقق دفتر السعة عند الحجز)"""
+        capacities = self.capacities[rows]
+        return rows[(capacities < 0) | (capacities >= travelers)]
+
+    def units(self, rows, travelers):
+        """عدد الوحدات لكل خدمة: ceil(المسافرين / حجم الوحدة)، وبدون حجم وحدة السعر للشخص"""
+        sizes = self.unit_sizes[rows]
+        return np.where(sizes > 0, np.ceil(travelers / np.maximum(sizes, 1)), travelers)
+
+    def describe(self, row, units, quantity=1):
+        record = self.catalog.service(int(self.ids[row]))
+        return {
+            'id': record.id,
+            'name': record.name,
+            'type': record.type,
+            'level': record.level,
+            'price_per_unit': round(float(self.prices[row]), 2),
+            'units': int(units),
+            'quantity': quantity,
+            'cost': round(float(self.prices[row] * units * quantity), 2),
+        }
+
+
+_lock = threading.Lock()
+_state = {'table': None}
+
+
+def get_price_table():
+    """جدول الأسعار الحالي، يُعاد بناؤه عند تغيّر لقطة الكتالوج"""
+    catalog = snapshot.get_snapshot()
+    table = _state['table']
+    if table is not None and table.catalog is catalog:
+        return table
+    with _lock:
+        table = _state['table']
+        if table is None or table.catalog is not catalog:
+            table = _state['table'] = PriceTable(catalog)
+        return table
+
+
+def _upper_hull(costs, values):
+    """الحد الأعلى المحدب لنقاط (التكلفة، القيمة) المرتبة: الخطوات عليه متناقصة العائد فيكون الجشع مثالياً لمسألة الحقيبة المرخاة"""
+    hull = []
+    for position in range(len(costs)):
+        while len(hull) >= 2:
+            first, second = hull[-2], hull[-1]
+            cross = (
+                (costs[second] - costs[first]) * (values[position] - values[first]) -
+                (values[second] - values[first]) * (costs[position] - costs[first])
+            )
+            if cross < 0:
+                break
+            hull.pop()
+        hull.append(position)
+    return np.asarray(hull, dtype=np.int64)
+
+
+class Slot:
+    """خانة في الخطة مع خياراتها المرتبة على الحد الأعلى (تكلفة تصاعدية وقيمة تصاعدية)"""
+
+    def __init__(self, name, day, destination_id, rows, costs, values, units, quantity, required):
+        self.name = name
+        self.day = day
+        self.destination_id = destination_id
+        self.required = required
+        self.quantity = quantity
+
+        # خيارات باريتو: بعد الترتيب حسب التكلفة تبقى الخيارات الأعلى قيمة من كل ما هو أرخص
+        order = np.lexsort((-values, costs))
+        costs, values, rows, units = costs[order], values[order], rows[order], units[order]
+        best_so_far = np.maximum.accumulate(values)
+        keep = np.concatenate([[True], values[1:] > best_so_far[:-1]]) if len(values) else np.empty(0, dtype=bool)
+        self.all_rows, self.all_costs, self.all_values, self.all_units = rows, costs, values, units
+        costs, values, rows, units = costs[keep], values[keep], rows[keep], units[keep]
+        if not required:
+            # الخانة الاختيارية يمكن تركها فارغة بتكلفة صفر
+            costs = np.concatenate([[0.0], costs])
+            values = np.concatenate([[0.0], values])
+            rows = np.concatenate([[-1], rows])
+            units = np.concatenate([[0.0], units])
+        self.frontier_costs, self.frontier_values = costs, values
+        self.frontier_rows, self.frontier_units = rows, units
+        hull = _upper_hull(costs, values) if len(costs) else np.empty(0, dtype=np.int64)
+        self.hull = hull
+        self.costs, self.values, self.rows, self.units = costs[hull], values[hull], rows[hull], units[hull]
+
+
+def _build_slot(table, name, day, destination_id, service_types, travelers, level, quantity=1):
+    rows = table.fits(table.rows(destination_id, service_types), travelers)
+    if not len(rows):
+        return None
+    if name == 'accommodation':
+        # الإقامة بالمستوى المطلوب إن وُجد في الوجهة
+        matching = rows[table.levels[rows] == level]
+        if len(matching):
+            rows = matching
+    units = table.units(rows, travelers)
+    costs = table.prices[rows] * units * quantity
+    level_factor = 1.0 - 0.25 * np.abs(table.levels[rows] - level)
+    values = SLOT_WEIGHTS[name] * quantity * (0.5 + table.ratings[rows] / 10.0) * level_factor
+    return Slot(name, day, destination_id, rows, costs, values, units, quantity, name in REQUIRED_SLOTS)
+
+
+def build_slots(table, day_destinations, travelers, level):
+    """خانات الرحلة: إقامة لكل مجموعة ليالٍ متتالية في وجهة، تنقل عند الوصول لوجهة جديدة، ونشاط لكل فترة"""
+    slots = []
+    nights = len(day_destinations) - 1
+    night = 0
+    while night < nights:
+        # الليالي المتتالية في نفس الوجهة إقامة واحدة في فندق واحد
+        stay_end = night
+        while stay_end + 1 < nights and day_destinations[stay_end + 1] == day_destinations[night]:
+            stay_end += 1
+        slot = _build_slot(
+            table, 'accommodation', night + 1, day_destinations[night], ('hotel',), travelers, level,
+            quantity=stay_end - night + 1,
+        )
+        if slot is not None:
+            slots.append(slot)
+        night = stay_end + 1
+
+    previous = None
+    for day, destination_id in enumerate(day_destinations, start=1):
+        if destination_id != previous:
+            slot = _build_slot(table, 'transport', day, destination_id, ('transport',), travelers, level)
+            if slot is not None:
+                slots.append(slot)
+            previous = destination_id
+        for name, service_types in TIME_SLOTS:
+            slot = _build_slot(table, name, day, destination_id, service_types, travelers, level)
+            if slot is not None:
+                slots.append(slot)
+    return slots
+
+
+def _padded(slots, attribute, fill):
+    sizes = np.array([len(getattr(slot, attribute)) for slot in slots], dtype=np.int64)
+    matrix = np.full((len(slots), int(sizes.max()) if len(slots) else 0), fill)
+    for position, slot in enumerate(slots):
+        matrix[position, :sizes[position]] = getattr(slot, attribute)
+    return matrix, sizes
+
+
+def solve(slots, budget):
+    """اختيار خيار لكل خانة: البدء بالأفضل قيمة، ثم الإصلاح بالتخفيض الأقل خسارة لكل وحدة توفير حتى الدخول في الميزانية، ثم ملء المتبقي"""
+    costs, sizes = _padded(slots, 'costs', np.inf)
+    values, _ = _padded(slots, 'values', 0.0)
+    index = np.arange(len(slots))
+    choice = sizes - 1
+    total = float(costs[index, choice].sum()) if len(slots) else 0.0
+
+    # الإصلاح: كل خطوة تنزل بخانة واحدة على حدّها الأعلى حيث تكون خسارة القيمة لكل وحدة توفير أقل ما يمكن
+    while total > budget:
+        lower = np.maximum(choice - 1, 0)
+        saving = costs[index, choice] - costs[index, lower]
+        loss = values[index, choice] - values[index, lower]
+        ratio = np.where(choice > 0, loss / np.maximum(saving, 1e-9), np.inf)
+        position = int(np.argmin(ratio))
+        if not np.isfinite(ratio[position]):
+            break
+        total -= saving[position]
+        choice[position] -= 1
+
+    # الملء: الترقية الأعلى عائداً لكل وحدة تكلفة مما يتسع له المتبقي من الميزانية
+    while True:
+        upper = np.minimum(choice + 1, sizes - 1)
+        extra = costs[index, upper] - costs[index, choice]
+        gain = values[index, upper] - values[index, choice]
+        fits = (choice < sizes - 1) & (extra <= budget - total + 1e-9)
+        if not fits.any():
+            break
+        ratio = np.where(fits, gain / np.maximum(extra, 1e-9), -np.inf)
+        position = int(np.argmax(ratio))
+        total += extra[position]
+        choice[position] += 1
+
+    # خطوات الحد الأعلى قد تكون أكبر من المتبقي، فيُملأ الباقي بخيارات باريتو الواقعة بين نقاطه
+    frontier_costs, _ = _padded(slots, 'frontier_costs', np.inf)
+    frontier_values, _ = _padded(slots, 'frontier_values', -np.inf)
+    selected = np.array([slot.hull[position] for slot, position in zip(slots, choice)], dtype=np.int64)
+    while len(slots):
+        extra = frontier_costs - frontier_costs[index, selected][:, np.newaxis]
+        gain = frontier_values - frontier_values[index, selected][:, np.newaxis]
+        gain = np.where((gain > 0) & (extra <= budget - total + 1e-9), gain, 0.0)
+        position, option = np.unravel_index(int(np.argmax(gain)), gain.shape)
+        if gain[position, option] <= 0:
+            break
+        total += extra[position, option]
+        selected[position] = option
+    return selected, total
+
+
+def _deduplicate(slots, choice, slack):
+    """الإصلاح الأخير: نشاط تكرر في الرحلة يُستبدل بأفضل بديل لم يُستخدم ضمن المتبقي من الميزانية، أو تُترك الخانة"""
+    used = set()
+    selections = []
+    for slot, position in zip(slots, choice):
+        row = int(slot.frontier_rows[position])
+        units, cost = slot.frontier_units[position], slot.frontier_costs[position]
+        if row >= 0 and slot.name in UNIQUE_SLOTS and row in used:
+            alternatives = [
+                candidate for candidate in np.flatnonzero(slot.all_costs <= cost + slack)
+                if int(slot.all_rows[candidate]) not in used
+            ]
+            if alternatives:
+                best = max(alternatives, key=lambda candidate: slot.all_values[candidate])
+                slack -= slot.all_costs[best] - cost
+                row, units, cost = int(slot.all_rows[best]), slot.all_units[best], slot.all_costs[best]
+            else:
+                slack += cost
+                row, units, cost = -1, 0, 0.0
+        if row >= 0 and slot.name in UNIQUE_SLOTS:
+            used.add(row)
+        selections.append((row, units, cost))
+    return selections
+
+
+def _day_destinations(route_ids, duration):
+    # توزيع الوجهات بالتتابع على أيام الرحلة
+    if not route_ids:
+        return []
+    return [route_ids[(day - 1) * len(route_ids) // duration] for day in range(1, duration + 1)]
+
+
+def plan_itinerary(requirements, route_ids, table=None):
+    """خطة بخدمات فعلية ضمن ميزانية (الميزانية للشخص × عدد المسافرين) مع احترام المستوى والسعة"""
+    table = table or get_price_table()
+    duration = requirements.get('duration_days', 3)
+    travelers = requirements.get('number_of_travelers', 1)
+    per_person = requirements.get('budget', {}).get('total')
+    budget = float(per_person) * travelers if per_person else math.inf
+    level_name = LEVEL_ALIASES.get(
+        str(requirements.get('preferences', {}).get('accommodation_level', '')).strip().lower(), DEFAULT_LEVEL
+    )
+    level = LEVELS.index(level_name)
+
+    day_destinations = _day_destinations(route_ids, duration)
+    slots = build_slots(table, day_destinations, travelers, level)
+    choice, total = solve(slots, budget)
+    selections = _deduplicate(slots, choice, max(budget - total, 0.0))
+
+    days = {
+        day: {'destination_id': destination_id, 'services': {}}
+        for day, destination_id in enumerate(day_destinations, start=1)
+    }
+    total = 0.0
+    for slot, (row, units, cost) in zip(slots, selections):
+        if row < 0:
+            continue
+        total += cost
+        days[slot.day]['services'][slot.name] = table.describe(row, units, slot.quantity)
+    return {
+        'days': days,
+        'total_cost': round(float(total), 2),
+        'budget': None if math.isinf(budget) else round(budget, 2),
+        'within_budget': bool(total <= budget + 1e-6),
+        'accommodation_level': level_name,
+    }
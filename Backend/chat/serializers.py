@@ -26,4 +26,6 @@ class TravelRequirementsSerializer(serializers.Serializer):
     budget = serializers.DictField(child=serializers.DecimalField(max_digits=10, decimal_places=2))
     preferences = serializers.DictField(required=False)
     interests = serializers.ListField(child=serializers.CharField(), required=False)
-    constraints = serializers.ListField(child=serializers.CharField(), required=False)
\ No newline at end of file
+    constraints = serializers.ListField(child=serializers.CharField(), required=False)
+    destinations = serializers.ListField(child=serializers.IntegerField(), required=False)
+    session_id = serializers.CharField(required=False)
\ No newline at end of file
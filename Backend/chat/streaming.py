@@ -0,0 +1,157 @@
+import json
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from . import history, llm_backends, log_buffer
+from .models import ChatSession
+from .serializers import ChatMessageSerializer, TravelRequirementsSerializer
+from .views import _extract_requirements_from_message
+
+
+def sse_event(event, data):
+    """حدث Server-Sent Events بصيغة النص المعتمدة"""
+    payload = json.dumps(data, cls=DjangoJSONEncoder, ensure_ascii=False)
+    return f"event: {event}\ndata: {payload}\n\n"
+
+
+def sse_response(events):
+    response = StreamingHttpResponse(events, content_type='text/event-stream; charset=utf-8')
+    response['Cache-Control'] = 'no-cache'
+    # منع تجميع الاستجابة في الوكيل العكسي (nginx) حتى تصل الأحداث فوراً
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+async def _authenticate(request):
+    """المستخدم من رمز JWT (واجهات البث خارج DRF فتُصادق بنفس آلية الإعدادات)"""
+    try:
+        result = await sync_to_async(JWTAuthentication().authenticate)(request)
+    except AuthenticationFailed:
+        return None
+    return result[0] if result else None
+
+
+def _read_json(request):
+    try:
+        return json.loads(request.body or b'{}')
+    except ValueError:
+        return None
+
+
+@csrf_exempt
+@require_POST
+async def stream_chat_message(request):
+    """إرسال رسالة إلى المساعد واستقبال الرد مبثوثاً كأحداث SSE"""
+    user = await _authenticate(request)
+    if user is None:
+        return JsonResponse({'error': 'يجب تسجيل الدخول'}, status=401)
+    data = _read_json(request)
+    if data is None:
+        return JsonResponse({'error': 'صيغة JSON غير صالحة'}, status=400)
+    serializer = ChatMessageSerializer(data=data)
+    if not serializer.is_valid():
+        return JsonResponse(serializer.errors, status=400)
+
+    message = serializer.validated_data['message']
+    session_id = serializer.validated_data.get('session_id')
+    if session_id:
+        try:
+            chat_session = await ChatSession.objects.only(
+                'id', 'session_id', 'user_id', 'initial_requirements', 'message_count'
+            ).aget(session_id=session_id, user=user)
+        except ChatSession.DoesNotExist:
+            return JsonResponse({'error': 'الجلسة غير موجودة'}, status=404)
+    else:
+        chat_session = await ChatSession.objects.acreate(
+            user=user,
+            expires_at=timezone.now() + timedelta(hours=24)
+        )
+
+    requirements = dict(chat_session.initial_requirements)
+    _extract_requirements_from_message(message, requirements)
+    conversation_history = await history.arecent_messages(chat_session)
+    conversation_history.append({'role': 'user', 'message': message})
+    backend = llm_backends.get_backend()
+
+    async def events():
+        yield sse_event('session', {'session_id': chat_session.session_id})
+        response = None
+        async for event in backend.stream_response(conversation_history, requirements):
+            if event['type'] == 'delta':
+                yield sse_event('delta', {'text': event['text']})
+            else:
+                response = event['response']
+
+        # تُحفظ الرسالتان بعد اكتمال الرد فقط؛ انقطاع الاتصال قبلها لا يترك رداً ناقصاً في السجل
+        new_messages = await sync_to_async(history.append_messages)(chat_session, [
+            {'role': 'user', 'message': message},
+            {'role': 'assistant', 'message': response['message'], 'action': response['action']},
+        ])
+        if requirements != chat_session.initial_requirements:
+            chat_session.initial_requirements = requirements
+            await chat_session.asave(update_fields=['initial_requirements'])
+
+        yield sse_event('done', {
+            'response': response,
+            'messages': [history.message_to_dict(item) for item in new_messages],
+            'cursor': chat_session.message_count,
+        })
+
+    return sse_response(events())
+
+
+@csrf_exempt
+@require_POST
+async def stream_travel_plan(request):
+    """توليد خطة سفر مع بث كل يوم فور إعداده"""
+    user = await _authenticate(request)
+    if user is None:
+        return JsonResponse({'error': 'يجب تسجيل الدخول'}, status=401)
+    data = _read_json(request)
+    if data is None:
+        return JsonResponse({'error': 'صيغة JSON غير صالحة'}, status=400)
+    serializer = TravelRequirementsSerializer(data=data)
+    if not serializer.is_valid():
+        return JsonResponse(serializer.errors, status=400)
+
+    requirements = dict(serializer.validated_data)
+    session_id = requirements.pop('session_id', None)
+    chat_session = None
+    if session_id:
+        chat_session = await ChatSession.objects.only('id').filter(
+            session_id=session_id, user=user
+        ).afirst()
+        if chat_session is None:
+            return JsonResponse({'error': 'الجلسة غير موجودة'}, status=404)
+    backend = llm_backends.get_backend()
+
+    async def events():
+        plan = None
+        async for event in backend.stream_travel_plan(requirements):
+            if event['type'] == 'outline':
+                yield sse_event('outline', event['plan'])
+            elif event['type'] == 'day':
+                yield sse_event('day', {'day': event['day'], 'plan': event['plan']})
+            else:
+                plan = event['plan']
+
+        # الإضافة إلى المخزن في خيط منفصل لأن سياسة الامتلاء قد تنتظر مكاناً لمدة قصيرة
+        recommendation_id = await sync_to_async(log_buffer.enqueue)(
+            user_id=user.pk,
+            session_id=chat_session.pk if chat_session is not None else None,
+            recommendation_type='custom_plan',
+            input_parameters=requirements,
+            output_recommendations=plan,
+            confidence_score=0.85
+        )
+        yield sse_event('done', {'plan': plan, 'recommendation_id': recommendation_id})
+
+    return sse_response(events())
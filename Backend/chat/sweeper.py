@@ -0,0 +1,98 @@
+import json
+import time
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Func, IntegerField, Q, Sum, TextField, Value
+from django.db.models.functions import Cast, Coalesce
+from django.utils import timezone
+
+from .models import AIRecommendationLog, ChatMessage, ChatSession
+
+SESSION_JSON_FIELDS = ('initial_requirements', 'extracted_preferences', 'generated_plan', 'budget_range')
+LOG_JSON_FIELDS = ('input_parameters', 'output_recommendations')
+
+
+class OctetLength(Func):
+    """طول القيمة بالبايت (SQLite لا يدعم OCTET_LENGTH قبل 3.43 فيُحسب طول النص كـ BLOB)"""
+    function = 'OCTET_LENGTH'
+    output_field = IntegerField()
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, template='LENGTH(CAST(%(expressions)s AS BLOB))', **extra_context)
+
+
+def _bytes(queryset, fields, json_fields=()):
+    """مجموع أحجام الأعمدة الكبيرة في الاستعلام (تقدير المساحة المستعادة)"""
+    expressions = [OctetLength(field) for field in fields]
+    expressions += [OctetLength(Cast(field, TextField())) for field in json_fields]
+    total = Value(0)
+    for expression in expressions:
+        total = total + Coalesce(expression, 0)
+    return queryset.aggregate(size=Sum(total))['size'] or 0
+
+
+def _archive(handle, session_ids):
+    """كتابة الجلسات مع رسائلها وسجلات توصياتها كسطور JSON قبل حذفها"""
+    messages = {}
+    for message in ChatMessage.objects.filter(session_id__in=session_ids).order_by('session_id', 'sequence').values(
+        'session_id', 'sequence', 'role', 'message', 'action', 'created_at'
+    ):
+        messages.setdefault(message.pop('session_id'), []).append(message)
+    logs = {}
+    for log in AIRecommendationLog.objects.filter(session_id__in=session_ids).values():
+        logs.setdefault(log['session_id'], []).append(log)
+    for session in ChatSession.objects.filter(id__in=session_ids).values():
+        session['messages'] = messages.get(session['id'], [])
+        session['recommendations'] = logs.get(session['id'], [])
+        handle.write(json.dumps(session, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n')
+
+
+def sweep_expired_sessions(batch_size=500, now=None, dry_run=False, archive=None, pause=0.0, max_batches=None):
+    """حذف الجلسات المنتهية على دفعات صغيرة، كل دفعة في معاملة قصيرة؛ يعيد إحصائيات المحذوف والمساحة"""
+    now = now or timezone.now()
+    stats = {'batches': 0, 'sessions': 0, 'messages': 0, 'recommendations': 0, 'bytes': 0}
+    started = time.perf_counter()
+    # المفتاح (expires_at, id) يمسح فهرس expires_at بالترتيب دون تكرار الصفوف المقروءة
+    cursor = None
+    while max_batches is None or stats['batches'] < max_batches:
+        expired = ChatSession.objects.filter(expires_at__lt=now)
+        if cursor is not None:
+            expired = expired.filter(Q(expires_at__gt=cursor[0]) | Q(expires_at=cursor[0], id__gt=cursor[1]))
+        batch = list(expired.order_by('expires_at', 'id').values_list('expires_at', 'id')[:batch_size])
+        if not batch:
+            break
+        cursor = batch[-1]
+        session_ids = [session_id for _, session_id in batch]
+
+        sessions = ChatSession.objects.filter(id__in=session_ids)
+        messages = ChatMessage.objects.filter(session_id__in=session_ids)
+        logs = AIRecommendationLog.objects.filter(session_id__in=session_ids)
+        stats['bytes'] += (
+            _bytes(sessions, (), SESSION_JSON_FIELDS) +
+            _bytes(messages, ('message',)) +
+            _bytes(logs, (), LOG_JSON_FIELDS)
+        )
+        stats['batches'] += 1
+
+        if dry_run:
+            stats['sessions'] += len(session_ids)
+            stats['messages'] += messages.count()
+            stats['recommendations'] += logs.count()
+            continue
+
+        if archive is not None:
+            _archive(archive, session_ids)
+        with transaction.atomic():
+            # لا إشارات على هذه النماذج: الأبناء يُحذفون باستعلام واحد لكل جدول دون تحميل صفوفهم،
+            # وتُقرأ معرفات الجلسات فقط (only) لا محتواها
+            deleted = sessions.only('id').delete()[1]
+            stats['messages'] += deleted.get(ChatMessage._meta.label, 0)
+            stats['recommendations'] += deleted.get(AIRecommendationLog._meta.label, 0)
+            stats['sessions'] += deleted.get(ChatSession._meta.label, 0)
+        if pause:
+            # مهلة بين الدفعات ليتقدم الكتّاب الآخرون (قفل الكتابة في SQLite على مستوى الملف)
+            time.sleep(pause)
+
+    stats['seconds'] = round(time.perf_counter() - started, 3)
+    return stats
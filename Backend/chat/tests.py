@@ -1,3 +1,697 @@
-from django.test import TestCase
+import io
+import json
+import os
+import tempfile
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+import httpx
+import openai
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import AsyncClient, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from packages import catalog_cache, snapshot
+from packages.models import Destination, Service
+from . import history, interest_index, llm_backends, log_buffer, memo, planner, sweeper
+from .ai_service import AITravelAssistant
+from .models import AIRecommendationLog, ChatMessage, ChatSession
+
+
+def create_user(username='traveler'):
+    return get_user_model().objects.create_user(username=username, password='secret', email=f'{username}@example.com')
+
+
+def create_destination(name='حلب', **kwargs):
+    return Destination.objects.create(
+        name=name, type=kwargs.pop('type', 'historical'), description=kwargs.pop('description', '-'),
+        governorate='حلب', latitude=36.2, longitude=37.15, best_season=kwargs.pop('best_season', 'الربيع'), **kwargs
+    )
+
+
+def create_service(destination, name, service_type, price, **kwargs):
+    return Service.objects.create(
+        name=name, type=service_type, description='-', destination=destination, address='-',
+        price_per_unit=Decimal(price), unit_description=kwargs.pop('unit_description', 'ليلة'), **kwargs
+    )
+
+
+def load_catalog(test_case):
+    """بناء لقطة الكتالوج في مجلد مؤقت خاص بالاختبار وتحميلها"""
+    directory = tempfile.TemporaryDirectory()
+    test_case.addCleanup(directory.cleanup)
+    path = os.path.join(directory.name, 'catalog.snapshot')
+    snapshot.build_snapshot(path)
+    return snapshot.CatalogSnapshot(path)
+
+
+class PlannerCapacityTests(TestCase):
+    """المخطط يفهم السعة كما يفهمها دفتر السعة: أشخاص في اليوم، وحجم الوحدة حقل مستقل"""
+
+    def setUp(self):
+        self.destination = create_destination()
+        self.too_small = create_service(self.destination, 'نزل صغير', 'hotel', '10', capacity=2)
+        self.rooms = create_service(self.destination, 'فندق', 'hotel', '60', capacity=20, persons_per_unit=2)
+        self.bus = create_service(self.destination, 'حافلة', 'transport', '5', unit_description='شخص')
+
+    def plan(self, travelers):
+        table = planner.PriceTable(load_catalog(self))
+        return planner.plan_itinerary(
+            {'duration_days': 2, 'number_of_travelers': travelers}, [self.destination.id], table
+        )
+
+    def test_service_below_group_size_is_skipped(self):
+        accommodation = self.plan(3)['days'][1]['services']['accommodation']
+        self.assertEqual(accommodation['id'], self.rooms.id)
+        # ثلاثة مسافرين في غرف لشخصين = غرفتان
+        self.assertEqual((accommodation['units'], accommodation['cost']), (2, 120.0))
+
+    def test_small_group_fits_limited_service(self):
+        accommodation = self.plan(2)['days'][1]['services']['accommodation']
+        self.assertEqual(accommodation['id'], self.too_small.id)
+        # بلا حجم وحدة السعر للشخص
+        self.assertEqual(accommodation['units'], 2)
+
+    def test_transport_priced_per_person(self):
+        transport = self.plan(3)['days'][1]['services']['transport']
+        self.assertEqual((transport['id'], transport['units']), (self.bus.id, 3))
+
+
+class InterestIndexTests(TestCase):
+    """فهرس الاهتمامات: الوسوم تُربط بأنواع الوجهات، والكلمات المجذّعة تطابق الوصف، ولا استعلامات في كل رسالة"""
+
+    def setUp(self):
+        self.citadel = create_destination('قلعة حلب', description='قلعة من العصور الوسطى', popularity_score=9)
+        self.museum = create_destination('المتحف الوطني', type='city', description='آثار ومعروضات تاريخية')
+        self.beach = create_destination('شاطئ اللاذقية', type='coastal', description='رمال وبحر', best_season='الصيف')
+        self.forest = create_destination('صلنفة', type='natural', description='غابات وجبال خضراء')
+        self.catalog = load_catalog(self)
+        patcher = mock.patch.object(snapshot, 'get_snapshot', return_value=self.catalog)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        interest_index._state['index'] = None
+        self.addCleanup(interest_index._state.update, index=None)
+
+    def names(self, interest, limit=2):
+        return [record.name for record in interest_index.get_index().search(interest, limit=limit)]
+
+    def test_keywords_are_normalized_and_stemmed(self):
+        self.assertEqual(interest_index.keywords('التاريخية والغابات'), ['تاريخ', 'غاب'])
+
+    def test_tag_and_description_matches(self):
+        # الوسم يربط "تاريخية" بالوجهات التاريخية، والوصف يضيف المتحف الذي يذكرها
+        self.assertEqual(self.names('تاريخية'), ['قلعة حلب', 'المتحف الوطني'])
+        self.assertEqual(self.names('شواطئ'), ['شاطئ اللاذقية'])
+        self.assertEqual(self.names('الغابات'), ['صلنفة'])
+        self.assertEqual(self.names('الصيف'), ['شاطئ اللاذقية'])
+        self.assertEqual(self.names('تزلج'), [])
+
+    def test_index_rebuilt_with_snapshot(self):
+        index = interest_index.get_index()
+        self.assertIs(interest_index.get_index(), index)
+        create_destination('طرطوس', type='coastal', description='بحر')
+        snapshot.get_snapshot.return_value = load_catalog(self)
+        self.assertIsNot(interest_index.get_index(), index)
+        self.assertIn('طرطوس', self.names('بحر', limit=3))
+
+    def test_suggestions_without_queries(self):
+        interest_index.get_index()
+        with self.assertNumQueries(0):
+            suggestions = AITravelAssistant()._generate_suggestions({'interests': ['تاريخ', 'طبيعة', 'بحر']})
+        self.assertEqual(len(suggestions), 3)
+        self.assertTrue(suggestions[0].startswith('اقتراح: قلعة حلب'))
+
+
+@override_settings(AI_LOG_BUFFER_SIZE=5, AI_LOG_BATCH_SIZE=3, AI_LOG_OVERFLOW='drop')
+class LogBufferTests(TestCase):
+    """مخزن سجلات التوصيات: كتابة على دفعات، رفض الجديد عند الامتلاء، وإعادة الدفعة عند فشل القاعدة"""
+
+    def setUp(self):
+        self.user = create_user()
+        # التفريغ يُستدعى مباشرة في الاختبار لا من الخيط الخلفي
+        patcher = mock.patch.object(log_buffer, '_ensure_worker')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.reset()
+        self.addCleanup(self.reset)
+
+    def reset(self):
+        log_buffer._buffer.clear()
+        log_buffer._state.update(dropped=0, written=0, failing=False)
+
+    def enqueue(self, count):
+        return [
+            log_buffer.enqueue(self.user.pk, 'custom_plan', {'index': index}, {'days': []})
+            for index in range(count)
+        ]
+
+    def test_flush_writes_in_batches(self):
+        ids = self.enqueue(5)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(log_buffer.flush(), 5)
+        inserts = [query for query in queries if query['sql'].startswith('INSERT')]
+        self.assertEqual(len(inserts), 2)
+        self.assertEqual(set(AIRecommendationLog.objects.values_list('public_id', flat=True)), set(ids))
+        self.assertEqual(log_buffer.stats(), {'pending': 0, 'written': 5, 'dropped': 0})
+
+    def test_full_buffer_rejects_new_record(self):
+        ids = self.enqueue(6)
+        # السجلات التي أُعطيت معرفاتها تبقى، والسجل الزائد لا يحصل على معرف
+        self.assertIsNone(ids[-1])
+        self.assertTrue(all(ids[:5]))
+        self.assertEqual(log_buffer.stats()['dropped'], 1)
+        log_buffer.flush()
+        self.assertEqual(set(AIRecommendationLog.objects.values_list('public_id', flat=True)), set(ids[:5]))
+
+    @override_settings(AI_LOG_OVERFLOW='wait', AI_LOG_OVERFLOW_WAIT=0.01)
+    def test_wait_policy_rejects_after_timeout(self):
+        self.enqueue(5)
+        self.assertIsNone(log_buffer.enqueue(self.user.pk, 'custom_plan', {}, {}))
+        self.assertEqual(log_buffer.stats()['pending'], 5)
+
+    def test_database_error_requeues_batch(self):
+        ids = self.enqueue(4)
+        with mock.patch.object(log_buffer, '_write', side_effect=DatabaseError('down')):
+            with self.assertRaises(DatabaseError):
+                log_buffer.flush()
+        self.assertEqual([record['public_id'] for record in log_buffer._buffer], ids)
+
+        self.assertEqual(log_buffer.flush(), 4)
+        self.assertEqual(AIRecommendationLog.objects.count(), 4)
+
+
+class FakeLLMClient:
+    """عميل نموذج وهمي بواجهة client.chat.completions.create ينفذ نتائج مبرمجة مسبقاً بالترتيب"""
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=self)
+
+    def create(self, **kwargs):
+        self.calls += 1
+        outcome = self.outcomes.pop(0) if self.outcomes else connection_error()
+        if callable(outcome):
+            outcome = outcome()
+        if isinstance(outcome, Exception):
+            raise outcome
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=outcome))])
+
+
+def connection_error():
+    return openai.APIConnectionError(request=httpx.Request('POST', 'http://llm.test/v1/chat/completions'))
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    """قاطع الدائرة: يفتح بعد الإخفاقات المتتالية، ويسمح بطلب تجريبي واحد بعد المهلة، ويُغلق عند نجاحه"""
+
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch.object(llm_backends.time, 'monotonic', side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = llm_backends.CircuitBreaker(failure_threshold=2, reset_timeout=30)
+
+    def test_opens_after_threshold(self):
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, 'closed')
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, 'open')
+        self.assertFalse(self.breaker.allow())
+
+    def test_half_open_allows_single_probe(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.now += 30
+        self.assertEqual(self.breaker.state, 'half_open')
+        self.assertTrue(self.breaker.allow())
+        # الطلبات الأخرى تُرفض ما دام الطلب التجريبي جارياً
+        self.assertFalse(self.breaker.allow())
+
+    def test_failed_probe_reopens(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.now += 30
+        self.breaker.allow()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, 'open')
+        self.now += 29
+        self.assertFalse(self.breaker.allow())
+
+    def test_successful_probe_closes(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.now += 30
+        self.breaker.allow()
+        self.breaker.record_success()
+        self.assertEqual((self.breaker.state, self.breaker.failures), ('closed', 0))
+        # عداد الإخفاقات بدأ من جديد: إخفاق واحد لا يفتح القاطع
+        self.breaker.record_failure()
+        self.assertTrue(self.breaker.allow())
+
+
+@override_settings(
+    AI_MAX_RETRIES=2, AI_RETRY_BACKOFF=0.5, AI_QUEUE_TIMEOUT=0.05, AI_MAX_CONCURRENCY=1,
+    AI_CIRCUIT_FAILURE_THRESHOLD=2, AI_CIRCUIT_RESET_TIMEOUT=30,
+)
+class OpenAICompatibleBackendTests(SimpleTestCase):
+    """استدعاء النموذج: إعادة المحاولة بتأخير مشوّش، فتح القاطع بعد الإخفاقات، وحد التزامن"""
+
+    messages = [{'role': 'user', 'content': 'مرحبا'}]
+
+    def setUp(self):
+        self.backend = llm_backends.OpenAICompatibleBackend()
+        patcher = mock.patch.object(llm_backends.time, 'sleep')
+        self.sleep = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_retries_with_jittered_backoff(self):
+        self.backend.client = FakeLLMClient(connection_error, connection_error, 'أهلاً')
+        with mock.patch.object(llm_backends.random, 'uniform', side_effect=lambda low, high: high / 2) as uniform:
+            self.assertEqual(self.backend.complete(self.messages), 'أهلاً')
+        # التأخير عشوائي بين الصفر وحد يتضاعف مع كل محاولة
+        self.assertEqual([call.args for call in uniform.call_args_list], [(0, 0.5), (0, 1.0)])
+        self.assertEqual([call.args[0] for call in self.sleep.call_args_list], [0.25, 0.5])
+        self.assertEqual(self.backend.breaker.failures, 0)
+
+    def test_retry_delay_stays_within_bound(self):
+        delays = [self.backend.retry_delay(2) for _ in range(50)]
+        self.assertTrue(all(0 <= delay <= 2.0 for delay in delays))
+        self.assertGreater(len(set(delays)), 1)
+
+    def test_exhausted_retries_open_breaker(self):
+        self.backend.client = FakeLLMClient()
+        for _ in range(2):
+            with self.assertRaises(llm_backends.BackendUnavailable):
+                self.backend.complete(self.messages)
+        self.assertEqual(self.backend.client.calls, 6)
+        self.assertEqual(self.backend.breaker.state, 'open')
+
+        # القاطع المفتوح يرفض فوراً دون الاتصال بالنموذج
+        with self.assertRaisesMessage(llm_backends.BackendUnavailable, 'circuit open'):
+            self.backend.complete(self.messages)
+        self.assertEqual(self.backend.client.calls, 6)
+
+    def test_rejected_request_is_not_retried(self):
+        rejected = openai.BadRequestError(
+            'bad request', response=httpx.Response(400, request=httpx.Request('POST', 'http://llm.test')), body=None
+        )
+        self.backend.client = FakeLLMClient(rejected)
+        with self.assertRaises(llm_backends.BackendUnavailable):
+            self.backend.complete(self.messages)
+        self.assertEqual(self.backend.client.calls, 1)
+        self.sleep.assert_not_called()
+
+    def test_concurrency_limit(self):
+        started, release = threading.Event(), threading.Event()
+
+        def slow():
+            started.set()
+            release.wait(5)
+            return 'بطيء'
+
+        self.backend.client = FakeLLMClient(slow)
+        worker = threading.Thread(target=self.backend.complete, args=(self.messages,))
+        worker.start()
+        self.assertTrue(started.wait(5))
+        try:
+            # المكان الوحيد في حد التزامن محجوز: الطلب الثاني لا يصل إلى النموذج
+            with self.assertRaisesMessage(llm_backends.BackendUnavailable, 'concurrency limit'):
+                self.backend.complete(self.messages)
+            self.assertEqual(self.backend.client.calls, 1)
+        finally:
+            release.set()
+            worker.join()
+
+        self.backend.client.outcomes.append('متاح')
+        self.assertEqual(self.backend.complete(self.messages), 'متاح')
+
+
+def parse_events(body):
+    """تحويل جسم SSE إلى قائمة (اسم الحدث، البيانات)"""
+    events = []
+    for block in body.decode('utf-8').split('\n\n'):
+        if not block:
+            continue
+        name, data = block.split('\n')
+        assert name.startswith('event: ') and data.startswith('data: '), block
+        events.append((name[len('event: '):], json.loads(data[len('data: '):])))
+    return events
+
+
+@override_settings(AI_BACKEND='fake')
+class StreamingTests(TestCase):
+    """واجهات البث: صيغة أحداث SSE، رفض الرموز غير الصالحة، وحفظ الرسائل بعد اكتمال الرد فقط"""
+
+    def setUp(self):
+        self.user = create_user()
+        self.client = AsyncClient(SERVER_NAME='localhost')
+        self.auth = {'Authorization': f'Bearer {RefreshToken.for_user(self.user).access_token}'}
+
+    async def post(self, path, data, headers=None):
+        return await self.client.post(
+            path, data, content_type='application/json', headers=self.auth if headers is None else headers
+        )
+
+    async def read(self, response):
+        return parse_events(b''.join([chunk async for chunk in response.streaming_content]))
+
+    async def test_message_stream_events(self):
+        response = await self.post('/api/chat/stream/message/', {'message': 'مرحبا بكم'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream; charset=utf-8')
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+        events = await self.read(response)
+
+        names = [name for name, _ in events]
+        self.assertEqual((names[0], names[-1]), ('session', 'done'))
+        self.assertEqual(set(names[1:-1]), {'delta'})
+        text = ''.join(data['text'] for name, data in events if name == 'delta')
+        done = events[-1][1]
+        self.assertEqual(text, 'رد تجريبي على: مرحبا بكم')
+        self.assertEqual(done['response']['message'], text)
+        self.assertEqual([message['role'] for message in done['messages']], ['user', 'assistant'])
+        self.assertEqual(done['cursor'], 2)
+
+        # الرسالتان محفوظتان في الجلسة نفسها بتسلسل متصل
+        session = await ChatSession.objects.aget(session_id=events[0][1]['session_id'])
+        saved = [
+            (message.sequence, message.role, message.message)
+            async for message in ChatMessage.objects.filter(session=session).order_by('sequence')
+        ]
+        self.assertEqual(saved, [(1, 'user', 'مرحبا بكم'), (2, 'assistant', text)])
+
+    async def test_follow_up_sees_history(self):
+        first = await self.read(await self.post('/api/chat/stream/message/', {'message': 'أولى'}))
+        session_id = first[0][1]['session_id']
+        events = await self.read(await self.post(
+            '/api/chat/stream/message/', {'message': 'ثانية', 'session_id': session_id}
+        ))
+        self.assertEqual(events[0][1]['session_id'], session_id)
+        self.assertEqual(events[-1][1]['cursor'], 4)
+
+    async def test_invalid_token_rejected(self):
+        for headers in ({}, {'Authorization': 'Bearer not-a-token'}):
+            response = await self.post('/api/chat/stream/message/', {'message': 'مرحبا'}, headers=headers)
+            self.assertEqual(response.status_code, 401)
+            self.assertIn('error', json.loads(response.content))
+        self.assertFalse(await ChatSession.objects.aexists())
+
+    async def test_disconnect_mid_stream_saves_nothing(self):
+        response = await self.post('/api/chat/stream/message/', {'message': 'مرحبا بكم'})
+        stream = response.streaming_content
+        self.assertTrue((await anext(stream)).startswith(b'event: session'))
+        self.assertTrue((await anext(stream)).startswith(b'event: delta'))
+        # انقطاع العميل يُغلق المولد قبل اكتمال الرد
+        await stream.aclose()
+        self.assertFalse(await ChatMessage.objects.aexists())
+
+    async def test_plan_stream_events(self):
+        self.addCleanup(log_buffer._buffer.clear)
+        with mock.patch.object(log_buffer, '_ensure_worker'):
+            response = await self.post('/api/chat/stream/generate-plan/', {
+                'duration_days': 2, 'number_of_travelers': 2, 'budget': {'total': '500'}
+            })
+            events = await self.read(response)
+        self.assertEqual([name for name, _ in events], ['outline', 'day', 'day', 'done'])
+        self.assertEqual([data['day'] for name, data in events if name == 'day'], ['day_1', 'day_2'])
+        done = events[-1][1]
+        self.assertEqual(set(done['plan']['daily_plan']), {'day_1', 'day_2'})
+        self.assertEqual(str(log_buffer._buffer[-1]['public_id']), done['recommendation_id'])
+
+
+class ChatHistoryTests(TestCase):
+    """جدول الرسائل: أرقام تسلسل متصلة لكل جلسة، وقراءة آخر الرسائل وصفحاتها بمؤشر التسلسل"""
+
+    def setUp(self):
+        self.user = create_user()
+        self.session = ChatSession.objects.create(user=self.user, expires_at=timezone.now())
+        for index in range(1, 8):
+            history.append_messages(self.session, [{'role': 'user', 'message': f'رسالة {index}'}])
+
+    def sequences(self, messages):
+        return [message['sequence'] for message in messages]
+
+    def test_sequences_are_contiguous_per_session(self):
+        added = history.append_messages(self.session, [
+            {'role': 'user', 'message': 'سؤال'},
+            {'role': 'assistant', 'message': 'جواب', 'action': 'continue'},
+        ])
+        self.assertEqual([message.sequence for message in added], [8, 9])
+        self.assertEqual(self.session.message_count, 9)
+        self.assertEqual(ChatSession.objects.get(pk=self.session.pk).message_count, 9)
+
+        other = ChatSession.objects.create(user=self.user, expires_at=timezone.now())
+        self.assertEqual([message.sequence for message in history.append_messages(other, [{'role': 'user', 'message': '-'}])], [1])
+
+    def test_append_inserts_without_rewriting(self):
+        with CaptureQueriesContext(connection) as queries:
+            history.append_messages(self.session, [{'role': 'user', 'message': 'جديدة'}])
+        statements = [query['sql'].split()[0] for query in queries if not query['sql'].startswith(('SAVEPOINT', 'RELEASE'))]
+        self.assertEqual(statements, ['UPDATE', 'SELECT', 'INSERT'])
+
+    def test_recent_messages_in_order(self):
+        recent = history.recent_messages(self.session, limit=3)
+        self.assertEqual(self.sequences(recent), [5, 6, 7])
+        self.assertEqual(recent[-1]['message'], 'رسالة 7')
+
+    def test_pages_by_sequence_cursor(self):
+        page, has_more = history.messages_page(self.session, after=2, limit=3)
+        self.assertEqual((self.sequences(page), has_more), ([3, 4, 5], True))
+        page, has_more = history.messages_page(self.session, after=5, limit=3)
+        self.assertEqual((self.sequences(page), has_more), ([6, 7], False))
+
+        page, has_more = history.messages_page(self.session, before=4, limit=2)
+        self.assertEqual((self.sequences(page), has_more), ([2, 3], True))
+        page, has_more = history.messages_page(self.session, limit=10)
+        self.assertEqual((self.sequences(page), has_more), (list(range(1, 8)), False))
+
+
+@override_settings(AI_BACKEND='fake')
+class ChatDeltaResponseTests(TestCase):
+    """رد الرسالة يحمل رسائل الدور الجديد فقط مع المؤشر، والسجل الكامل من نقطة نهاية الرسائل"""
+
+    def setUp(self):
+        self.user = create_user()
+        self.client = APIClient(SERVER_NAME='localhost')
+        self.client.force_authenticate(self.user)
+
+    def send(self, message, session_id=None):
+        data = {'message': message}
+        if session_id:
+            data['session_id'] = session_id
+        response = self.client.post('/api/chat/message/', data, format='json')
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_response_carries_only_new_turn(self):
+        session_id = self.send('مرحبا').data['session_id']
+        responses = [self.send(f'رسالة {index}', session_id) for index in range(5)]
+        last = responses[-1]
+        self.assertEqual(
+            [(message['sequence'], message['role']) for message in last.data['messages']],
+            [(11, 'user'), (12, 'assistant')]
+        )
+        self.assertEqual(last.data['cursor'], 12)
+        self.assertNotIn('conversation_history', last.data)
+        # حجم الرد لا ينمو مع طول المحادثة: الفرق أرقام التسلسل والطوابع الزمنية فقط
+        self.assertLess(abs(len(last.content) - len(responses[0].content)), 10)
+
+    def test_messages_endpoint_pages_with_cursor(self):
+        session_id = self.send('مرحبا').data['session_id']
+        for index in range(3):
+            self.send(f'رسالة {index}', session_id)
+        url = f'/api/chat/sessions/{session_id}/messages/'
+
+        response = self.client.get(url, {'after': 2, 'limit': 3})
+        self.assertEqual([message['sequence'] for message in response.data['messages']], [3, 4, 5])
+        self.assertEqual((response.data['has_more'], response.data['cursor']), (True, 5))
+        response = self.client.get(url, {'after': response.data['cursor'], 'limit': 3})
+        self.assertEqual([message['sequence'] for message in response.data['messages']], [6, 7, 8])
+        self.assertEqual((response.data['has_more'], response.data['message_count']), (False, 8))
+
+        # لا رسائل جديدة: المؤشر يبقى كما هو
+        response = self.client.get(url, {'after': 8})
+        self.assertEqual((response.data['messages'], response.data['cursor']), ([], 8))
+
+    def test_messages_endpoint_rejects_bad_requests(self):
+        session_id = self.send('مرحبا').data['session_id']
+        url = f'/api/chat/sessions/{session_id}/messages/'
+        self.assertEqual(self.client.get(url, {'after': 'x'}).status_code, 400)
+
+        other = APIClient(SERVER_NAME='localhost')
+        other.force_authenticate(create_user('other'))
+        self.assertEqual(other.get(url).status_code, 404)
+
+
+class MemoTests(TestCase):
+    """ذاكرة الردود: إزاحة الأقدم استخداماً، انتهاء الصلاحية، ومفتاح موحد يتغير مع أجيال الكتالوج"""
+
+    def setUp(self):
+        cache.clear()
+        memo.clear()
+        self.addCleanup(memo.clear)
+        self.now = 100.0
+        patcher = mock.patch.object(memo.time, 'monotonic', side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(snapshot, 'schedule_rebuild')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_least_recently_used_is_evicted(self):
+        entries = memo.MemoCache(max_entries=2, ttl=60)
+        entries.set('a', 1)
+        entries.set('b', 2)
+        entries.get('a')
+        entries.set('c', 3)
+        self.assertEqual([entries.get(key)[0] for key in ('a', 'b', 'c')], [True, False, True])
+        self.assertEqual(memo.get_stats()['evictions'], 1)
+
+    def test_entries_expire(self):
+        entries = memo.MemoCache(max_entries=2, ttl=60)
+        entries.set('a', 1)
+        self.now += 59
+        self.assertEqual(entries.get('a'), (True, 1))
+        self.now += 1
+        self.assertEqual(entries.get('a'), (False, None))
+        self.assertEqual((len(entries), memo.get_stats()['expirations']), (0, 1))
+
+    def test_equivalent_requirements_share_key(self):
+        first = {'budget': {'total': 500}, 'interests': ['تاريخ'], 'notes': '', 'city': ' حلب  القديمة'}
+        second = {'city': 'حلب القديمة', 'interests': ['تاريخ'], 'budget': {'total': Decimal('500.00')}}
+        self.assertEqual(memo.build_key('response', first), memo.build_key('response', second))
+        self.assertNotEqual(memo.build_key('response', first), memo.build_key('plan', first))
+        self.assertNotEqual(memo.build_key('response', first), memo.build_key('response', {**first, 'budget': {'total': 600}}))
+
+    def test_memoize_computes_once_per_catalog_generation(self):
+        compute = mock.Mock(return_value={'days': ['اليوم الأول']})
+        value, hit = memo.memoize('plan', {'duration_days': 1}, compute)
+        value['days'].append('تعديل المستدعي')
+        again, hit_again = memo.memoize('plan', {'duration_days': 1}, compute)
+        self.assertEqual((hit, hit_again, compute.call_count), (False, True, 1))
+        # القيمة المحفوظة مستقلة عن نسخة المستدعي
+        self.assertEqual(again, {'days': ['اليوم الأول']})
+
+        catalog_cache.bump_generation('service')
+        memo.memoize('plan', {'duration_days': 1}, compute)
+        self.assertEqual(compute.call_count, 2)
+        self.assertEqual({name: memo.get_stats()[name] for name in ('hits', 'misses')}, {'hits': 1, 'misses': 2})
+
+
+class SweeperTests(TestCase):
+    """حذف الجلسات المنتهية على دفعات: كل دفعة استعلام حذف واحد لكل جدول، والجلسات النشطة تبقى"""
+
+    def setUp(self):
+        self.user = create_user()
+        now = timezone.now()
+        # جلستان بنفس وقت الانتهاء حتى يعبر المؤشر (expires_at, id) حدود الدفعة بينهما
+        expiries = [now - timedelta(days=3), now - timedelta(days=2), now - timedelta(days=2), now - timedelta(hours=1),
+                    now - timedelta(minutes=1), now + timedelta(hours=1), now + timedelta(days=1)]
+        self.sessions = [self.create_session(index, expires_at) for index, expires_at in enumerate(expiries)]
+        self.active = self.sessions[5:]
+
+    def create_session(self, index, expires_at):
+        session = ChatSession.objects.create(
+            user=self.user, session_id=f'session-{index}', expires_at=expires_at, generated_plan={'days': ['-'] * 10}
+        )
+        history.append_messages(session, [
+            {'role': 'user', 'message': 'مرحبا'}, {'role': 'assistant', 'message': 'أهلاً وسهلاً'},
+        ])
+        AIRecommendationLog.objects.create(user=self.user, session=session, recommendation_type='custom_plan')
+        return session
+
+    def assert_only_active_left(self):
+        self.assertEqual(set(ChatSession.objects.values_list('pk', flat=True)), {session.pk for session in self.active})
+        self.assertEqual(ChatMessage.objects.count(), 4)
+        self.assertEqual(AIRecommendationLog.objects.count(), 2)
+
+    def test_sweeps_in_batches(self):
+        with CaptureQueriesContext(connection) as queries:
+            stats = sweeper.sweep_expired_sessions(batch_size=2)
+        self.assertEqual(
+            {name: stats[name] for name in ('batches', 'sessions', 'messages', 'recommendations')},
+            {'batches': 3, 'sessions': 5, 'messages': 10, 'recommendations': 5}
+        )
+        self.assertGreater(stats['bytes'], 0)
+        self.assert_only_active_left()
+        # ثلاث عبارات حذف لكل دفعة (الرسائل، السجلات، الجلسات) دون تحميل صفوف الأبناء
+        deletes = [query['sql'] for query in queries if query['sql'].startswith('DELETE')]
+        self.assertEqual(len(deletes), 9)
+        self.assertFalse([query for query in queries if query['sql'].startswith('SELECT "chat_messages"."id"')])
+
+    def test_dry_run_and_max_batches(self):
+        stats = sweeper.sweep_expired_sessions(batch_size=2, dry_run=True)
+        self.assertEqual((stats['sessions'], stats['messages']), (5, 10))
+        self.assertEqual(ChatSession.objects.count(), 7)
+
+        stats = sweeper.sweep_expired_sessions(batch_size=2, max_batches=1)
+        self.assertEqual((stats['batches'], stats['sessions']), (1, 2))
+        self.assertEqual(ChatSession.objects.count(), 5)
+
+    def test_archive_before_delete(self):
+        archive = io.StringIO()
+        sweeper.sweep_expired_sessions(batch_size=10, archive=archive)
+        records = [json.loads(line) for line in archive.getvalue().splitlines()]
+        self.assertEqual(sorted(record['session_id'] for record in records), [f'session-{index}' for index in range(5)])
+        self.assertEqual([message['sequence'] for message in records[0]['messages']], [1, 2])
+        self.assertEqual(len(records[0]['recommendations']), 1)
+        self.assert_only_active_left()
+
+    def test_command(self):
+        out = io.StringIO()
+        call_command('sweep_chat_sessions', '--batch-size', '3', stdout=out)
+        self.assertIn('حُذف 5 جلسة و10 رسالة و5 توصية', out.getvalue())
+        self.assert_only_active_left()
+
+
+class ChatMessageMigrationTests(TransactionTestCase):
+    """نقل سجل المحادثة إلى جدول الرسائل في ترحيل بيانات مستقل يمكن التراجع عنه قبل حذف الحقل"""
+
+    before = [('chat', '0004_recommendation_log_public_id')]
+    after = [('chat', '0005_copy_conversation_history')]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        self.migrate(MigrationExecutor(connection).loader.graph.leaf_nodes())
+
+    def test_history_copied_and_restored(self):
+        apps = self.migrate(self.before)
+        user = apps.get_model('users', 'User').objects.create(username='traveler', email='traveler@example.com')
+        history = [
+            {'role': 'user', 'message': 'مرحبا', 'timestamp': '2026-10-01T10:00:00+00:00'},
+            {'role': 'assistant', 'message': 'أهلاً', 'action': 'ask_duration', 'timestamp': '2026-10-01T10:00:05+00:00'},
+        ]
+        session = apps.get_model('chat', 'ChatSession').objects.create(
+            user_id=user.pk, session_id='s1', conversation_history=history, expires_at=timezone.now()
+        )
+
+        apps = self.migrate(self.after)
+        messages = apps.get_model('chat', 'ChatMessage').objects.filter(session_id=session.pk).order_by('sequence')
+        self.assertEqual(
+            [(message.sequence, message.role, message.message, message.action) for message in messages],
+            [(1, 'user', 'مرحبا', ''), (2, 'assistant', 'أهلاً', 'ask_duration')]
+        )
+        self.assertEqual(apps.get_model('chat', 'ChatSession').objects.get(pk=session.pk).message_count, 2)
+
+        apps = self.migrate(self.before)
+        restored = apps.get_model('chat', 'ChatSession').objects.get(pk=session.pk)
+        self.assertEqual([(entry['role'], entry['message']) for entry in restored.conversation_history],
+                         [('user', 'مرحبا'), ('assistant', 'أهلاً')])
+        self.assertFalse(apps.get_model('chat', 'ChatMessage').objects.exists())
@@ -1,9 +1,12 @@
 from django.urls import path
-from . import views
+from . import streaming, views
 
 urlpatterns = [
     path('sessions/', views.ChatSessionListView.as_view(), name='chat-sessions'),
+    path('sessions/<str:session_id>/messages/', views.session_messages, name='chat-session-messages'),
     path('message/', views.chat_message, name='chat-message'),
     path('generate-plan/', views.generate_travel_plan, name='generate-plan'),
+    path('stream/message/', streaming.stream_chat_message, name='chat-stream-message'),
+    path('stream/generate-plan/', streaming.stream_travel_plan, name='stream-generate-plan'),
     path('preferences/', views.TravelPreferenceView.as_view(), name='travel-preferences'),
 ]
\ No newline at end of file
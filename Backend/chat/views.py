@@ -3,12 +3,12 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from django.utils import timezone
 from datetime import timedelta
-from .models import ChatSession, TravelPreference, AIRecommendationLog
+from .models import ChatSession, TravelPreference
 from .serializers import (
     ChatMessageSerializer, ChatSessionSerializer, 
     TravelPreferenceSerializer, TravelRequirementsSerializer
 )
-from .ai_service import AITravelAssistant
+from . import history, llm_backends, log_buffer, memo
 
 class ChatSessionListView(generics.ListCreateAPIView):
     """قائمة جلسات المحادثة للمستخدم"""
@@ -34,10 +34,10 @@ def chat_message(request):
         # الحصول على الجلسة أو إنشاء جديدة
         if session_id:
             try:
-                chat_session = ChatSession.objects.get(
-                    session_id=session_id, 
-                    user=request.user
-                )
+                # قراءة الأعمدة اللازمة فقط دون أعمدة JSON الأخرى
+                chat_session = ChatSession.objects.only(
+                    'id', 'session_id', 'user_id', 'initial_requirements', 'message_count'
+                ).get(session_id=session_id, user=request.user)
             except ChatSession.DoesNotExist:
                 return Response(
                     {'error': 'الجلسة غير موجودة'}, 
@@ -49,43 +49,76 @@ def chat_message(request):
                 expires_at=timezone.now() + timedelta(hours=24)
             )
         
-        # تحديث سجل المحادثة
-        conversation_history = chat_session.conversation_history
-        conversation_history.append({
-            'role': 'user',
-            'message': message,
-            'timestamp': timezone.now().isoformat()
-        })
-        
-        # استخراج المتطلبات من المحادثة
-        requirements = chat_session.initial_requirements
-        request._extract_requirements_from_message(message, requirements)
+        # استخراج المتطلبات من الرسالة
+        requirements = dict(chat_session.initial_requirements)
+        _extract_requirements_from_message(message, requirements)
         
-        # الحصول على رد الذكاء الاصطناعي
-        ai_assistant = AITravelAssistant()
-        ai_response = ai_assistant.generate_response(conversation_history, requirements)
+        # الحصول على رد الذكاء الاصطناعي بسياق آخر الرسائل فقط
+        conversation_history = history.recent_messages(chat_session)
+        conversation_history.append({'role': 'user', 'message': message})
+        backend = llm_backends.get_backend()
+        context = [(entry['role'], entry['message']) for entry in conversation_history] if backend.uses_history else None
+        ai_response, _ = memo.memoize(
+            'response', requirements,
+            lambda: backend.generate_response(conversation_history, requirements),
+            extra=[backend.name, context],
+        )
         
-        # إضافة رد الذكاء الاصطناعي إلى سجل المحادثة
-        conversation_history.append({
-            'role': 'assistant',
-            'message': ai_response['message'],
-            'action': ai_response['action'],
-            'timestamp': timezone.now().isoformat()
-        })
+        # إضافة الرسالتين إلى نهاية المحادثة (إدراج فقط دون إعادة كتابة السجل)
+        new_messages = history.append_messages(chat_session, [
+            {'role': 'user', 'message': message},
+            {'role': 'assistant', 'message': ai_response['message'], 'action': ai_response['action']},
+        ])
         
-        # حفظ التحديثات
-        chat_session.conversation_history = conversation_history
-        chat_session.initial_requirements = requirements
-        chat_session.save()
+        # حفظ المتطلبات فقط عند تغيّرها
+        if requirements != chat_session.initial_requirements:
+            chat_session.initial_requirements = requirements
+            chat_session.save(update_fields=['initial_requirements'])
         
+        # الرسائل الجديدة فقط مع مؤشر آخر تسلسل؛ السجل الكامل من نقطة نهاية الرسائل
         return Response({
             'session_id': chat_session.session_id,
             'response': ai_response,
-            'conversation_history': conversation_history
+            'messages': [history.message_to_dict(item) for item in new_messages],
+            'cursor': chat_session.message_count,
         })
     
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def session_messages(request, session_id):
+    """رسائل جلسة محادثة مقسمة بمؤشر التسلسل (?after= أو ?before= مع ?limit=)"""
+    chat_session = ChatSession.objects.filter(
+        session_id=session_id, user=request.user
+    ).only('id', 'session_id', 'message_count').first()
+    if chat_session is None:
+        return Response(
+            {'error': 'الجلسة غير موجودة'}, 
+            status=status.HTTP_404_NOT_FOUND
+        )
+    
+    try:
+        after = request.query_params.get('after')
+        after = int(after) if after not in (None, '') else None
+        before = request.query_params.get('before')
+        before = int(before) if before not in (None, '') else None
+        limit = min(max(int(request.query_params.get('limit', history.CONTEXT_MESSAGES)), 1), 100)
+    except ValueError:
+        return Response(
+            {'error': 'قيم after و before و limit يجب أن تكون أرقاماً صحيحة'}, 
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    messages, has_more = history.messages_page(chat_session, after=after, before=before, limit=limit)
+    return Response({
+        'session_id': chat_session.session_id,
+        'messages': messages,
+        'has_more': has_more,
+        'cursor': messages[-1]['sequence'] if messages else after,
+        'message_count': chat_session.message_count,
+    })
+
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
 def generate_travel_plan(request):
@@ -93,29 +126,53 @@ def generate_travel_plan(request):
     serializer = TravelRequirementsSerializer(data=request.data)
     
     if serializer.is_valid():
-        requirements = serializer.validated_data
+        requirements = dict(serializer.validated_data)
+        session_id = requirements.pop('session_id', None)
+        chat_session_pk = None
+        if session_id:
+            chat_session_pk = ChatSession.objects.filter(
+                session_id=session_id, user=request.user
+            ).values_list('pk', flat=True).first()
+            if chat_session_pk is None:
+                return Response(
+                    {'error': 'الجلسة غير موجودة'}, 
+                    status=status.HTTP_404_NOT_FOUND
+                )
         
         # توليد الخطة باستخدام الذكاء الاصطناعي
-        ai_assistant = AITravelAssistant()
-        travel_plan = ai_assistant.generate_travel_plan(requirements)
-        
-        # إنشاء سجل للتوصية
-        recommendation_log = AIRecommendationLog.objects.create(
-            user=request.user,
-            recommendation_type='custom_plan',
-            input_parameters=requirements,
-            output_recommendations=travel_plan,
-            confidence_score=0.85  # محاكاة لدرجة الثقة
+        # الخطة محفوظة لنفس المتطلبات ما لم يتغير الكتالوج
+        backend = llm_backends.get_backend()
+        travel_plan, _ = memo.memoize(
+            'travel_plan', requirements,
+            lambda: backend.generate_travel_plan(requirements),
+            extra=backend.name,
         )
         
+        # سجل واحد للتوصية لكل مستخدم ومتطلبات بدل سجل جديد عند تكرار نفس الطلب
+        log_key = memo.build_key('recommendation_log', requirements, [request.user.pk, chat_session_pk, backend.name])
+        found, recommendation_id = memo.lookup(log_key)
+        if not found:
+            # الكتابة مؤجلة على دفعات، والمعرف العام ثابت من لحظة الإضافة
+            recommendation_id = log_buffer.enqueue(
+                user_id=request.user.pk,
+                session_id=chat_session_pk,
+                recommendation_type='custom_plan',
+                input_parameters=requirements,
+                output_recommendations=travel_plan,
+                confidence_score=0.85  # محاكاة لدرجة الثقة
+            )
+            if recommendation_id is not None:
+                # المخزن ممتلئ: لا يُحفظ غياب المعرف حتى يُسجل الطلب التالي
+                memo.store(log_key, recommendation_id)
+        
         return Response({
             'plan': travel_plan,
-            'recommendation_id': recommendation_log.id
+            'recommendation_id': recommendation_id
         })
     
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-def _extract_requirements_from_message(self, message, requirements):
+def _extract_requirements_from_message(message, requirements):
     """استخراج المتطلبات من رسالة المستخدم (محاكاة)"""
     # في الإصدار الحقيقي، سيستخدم هذا معالجة اللغة الطبيعية
     message_lower = message.lower()
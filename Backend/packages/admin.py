@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Destination, Service, Package, PackageDestination, PackageService
+from .models import Destination, Service, Package, PackageDestination, PackageService, PackageDeparture
+from . import catalog_cache, distances
 
 @admin.register(Destination)
 class DestinationAdmin(admin.ModelAdmin):
@@ -23,10 +24,35 @@ class PackageServiceInline(admin.TabularInline):
     model = PackageService
     extra = 1
 
+class PackageDepartureInline(admin.TabularInline):
+    model = PackageDeparture
+    extra = 1
+    fields = ('departure_date', 'seats', 'seats_remaining', 'is_active')
+    # المتبقي تديره الحجوزات وتعديل عدد المقاعد (PackageDeparture.save)
+    readonly_fields = ('seats_remaining',)
+
 @admin.register(Package)
 class PackageAdmin(admin.ModelAdmin):
     list_display = ('title', 'type', 'duration_days', 'base_price', 'discount_price', 'is_featured', 'is_active', 'created_at')
     list_filter = ('type', 'is_featured', 'is_active')
     search_fields = ('title', 'description')
     list_editable = ('is_featured', 'is_active', 'base_price', 'discount_price')
-    inlines = [PackageDestinationInline, PackageServiceInline]
\ No newline at end of file
+    inlines = [PackageDestinationInline, PackageServiceInline, PackageDepartureInline]
+    actions = ['optimize_visit_order']
+
+    def optimize_visit_order(self, request, queryset):
+        """إعادة ترتيب وجهات الباقات المحددة لتقليل مسافة التنقل"""
+        matrix = distances.get_distance_matrix()
+        updated = 0
+        for package in queryset:
+            package_destinations = list(package.packagedestination_set.all())
+            by_destination = {item.destination_id: item for item in package_destinations}
+            order, _ = distances.optimize_visit_order(list(by_destination), matrix=matrix)
+            for position, destination_id in enumerate(order, start=1):
+                by_destination[destination_id].visit_order = position
+            PackageDestination.objects.bulk_update(package_destinations, ['visit_order'])
+            updated += 1
+        # bulk_update لا يطلق الإشارات، لذا نبطل كاش الكتالوج يدوياً
+        catalog_cache.bump_generation('package')
+        self.message_user(request, f'تم تحسين ترتيب الزيارة في {updated} باقة')
+    optimize_visit_order.short_description = "تحسين ترتيب زيارة الوجهات"
\ No newline at end of file
@@ -0,0 +1,136 @@
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from rest_framework.response import Response
+
+STATS_KEY = 'catalog:stats:{}'
+RESPONSE_KEY = 'catalog:response:{}'
+
+
+def incr(key, delta=1):
+    """زيادة ذرية لقيمة في الكاش مع إنشائها عند عدم وجودها"""
+    try:
+        return cache.incr(key, delta)
+    except ValueError:
+        if cache.add(key, delta, timeout=None):
+            return delta
+        return cache.incr(key, delta)
+
+
+def get_generations(model_names):
+    """أرقام الأجيال الحالية لمجموعة من النماذج (استعلام واحد).
+
+    الأجيال في قاعدة البيانات لا في الكاش: الكاش المحلي (LocMemCache) خاص بكل عملية،
+    فلو حُفظت فيه لما رأت العمليات الأخرى رفع الجيل ولاستمرت في خدمة أسعار قديمة.
+    """
+    from .models import CatalogGeneration
+
+    model_names = list(model_names)
+    values = dict(CatalogGeneration.objects.filter(name__in=model_names).values_list('name', 'value'))
+    return {name: values.get(name, 0) for name in model_names}
+
+
+def bump_generation(*model_names):
+    """إبطال كل النسخ المخزنة المعتمدة على النماذج المحددة (تحديث ذري واحد لكل نموذج)"""
+    from .models import CatalogGeneration
+
+    generations = CatalogGeneration.objects
+    for name in model_names:
+        if generations.filter(name=name).update(value=F('value') + 1):
+            continue
+        try:
+            with transaction.atomic():
+                generations.create(name=name, value=1)
+        except IntegrityError:
+            # عملية أخرى أنشأت الصف في الوقت نفسه
+            generations.filter(name=name).update(value=F('value') + 1)
+
+    from . import snapshot
+    if set(model_names) & set(snapshot.GENERATION_MODELS):
+        # هذه العملية هي من عدّلت الكتالوج فتعيد بناء اللقطة المشتركة في الخلفية
+        snapshot.schedule_rebuild()
+
+
+def bump_generation_on_commit(*model_names):
+    """رفع رقم الجيل بعد نجاح المعاملة حتى لا تُخزَّن بيانات قديمة بالجيل الجديد"""
+    transaction.on_commit(lambda: bump_generation(*model_names))
+
+
+def normalize_params(query_params):
+    """تحويل معاملات الاستعلام إلى شكل ثابت بغض النظر عن ترتيبها"""
+    return sorted(
+        (key, sorted(values))
+        for key, values in query_params.lists()
+        if any(value != '' for value in values)
+    )
+
+
+def build_key(namespace, generations, params=(), extra=None):
+    """مفتاح الكاش = اسم العرض + المعاملات الموحدة + أجيال النماذج"""
+    raw = json.dumps([namespace, sorted(generations.items()), params, extra], default=str)
+    return RESPONSE_KEY.format(hashlib.sha1(raw.encode('utf-8')).hexdigest())
+
+
+def get_cached(key):
+    """قراءة من الكاش مع تحديث عدادات الإصابة والإخفاق"""
+    value = cache.get(key)
+    incr(STATS_KEY.format('hits' if value is not None else 'misses'))
+    return value
+
+
+def set_cached(key, value):
+    cache.set(key, value, getattr(settings, 'CATALOG_CACHE_TIMEOUT', 300))
+
+
+def get_stats():
+    """إحصائيات الكاش: عدد الإصابات والإخفاقات ونسبة الإصابة"""
+    values = cache.get_many([STATS_KEY.format('hits'), STATS_KEY.format('misses')])
+    hits = values.get(STATS_KEY.format('hits'), 0)
+    misses = values.get(STATS_KEY.format('misses'), 0)
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': round(hits / total, 4) if total else 0.0,
+    }
+
+
+def reset_stats():
+    cache.delete_many([STATS_KEY.format('hits'), STATS_KEY.format('misses')])
+
+
+class CatalogCacheMixin:
+    """تخزين ردود عروض الكتالوج مؤقتاً بمفاتيح تعتمد على معاملات الطلب وأجيال النماذج"""
+    cache_models = ()
+
+    def get_cache_models(self, request):
+        return self.cache_models
+
+    def get_cache_key(self, request, *args, **kwargs):
+        namespace = f'{self.__class__.__name__}:{request.get_host()}'
+        generations = get_generations(self.get_cache_models(request))
+        return build_key(namespace, generations, normalize_params(request.query_params), kwargs)
+
+    def cached_response(self, request, handler, *args, **kwargs):
+        key = self.get_cache_key(request, *args, **kwargs)
+        data = get_cached(key)
+        if data is not None:
+            response = Response(data)
+            response['X-Cache'] = 'HIT'
+            return response
+
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            set_cached(key, response.data)
+            response['X-Cache'] = 'MISS'
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(request, self.uncached_list, *args, **kwargs)
+
+    def uncached_list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
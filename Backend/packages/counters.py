@@ -0,0 +1,168 @@
+import atexit
+import logging
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from .catalog_cache import bump_generation
+
+logger = logging.getLogger(__name__)
+
+# المشاهدات المعلقة في كاش مستقل لا يُقص (انظر CACHES في الإعدادات): لو شاركت كاش الردود لطردها ضغطه وضاعت
+COUNTERS_CACHE = 'counters'
+DELTA_KEY = 'popularity:delta:{}'
+PENDING_KEY = 'popularity:pending'
+FLUSH_LOCK_KEY = 'popularity:flush-lock'
+FLUSH_LOCK_TIMEOUT = 60
+CHUNK_SIZE = 500
+
+
+_lock = threading.Lock()
+_wakeup = threading.Event()
+_state = {'worker': None, 'atexit_registered': False}
+
+
+def _cache():
+    return caches[COUNTERS_CACHE]
+
+
+def _incr(key, delta=1):
+    counters_cache = _cache()
+    try:
+        return counters_cache.incr(key, delta)
+    except ValueError:
+        if counters_cache.add(key, delta, timeout=None):
+            return delta
+        return counters_cache.incr(key, delta)
+
+
+def _decr(key, delta):
+    try:
+        return _cache().decr(key, delta)
+    except ValueError:
+        return 0
+
+
+def _flush_threshold():
+    return getattr(settings, 'POPULARITY_FLUSH_THRESHOLD', 100)
+
+
+def _flush_interval():
+    return getattr(settings, 'POPULARITY_FLUSH_INTERVAL', 60)
+
+
+def is_shared_cache():
+    """العدادات في كاش مشترك بين العمليات (Redis أو قاعدة البيانات) لا في ذاكرة كل عملية"""
+    return not isinstance(_cache(), (LocMemCache, DummyCache))
+
+
+def record_view(package_id):
+    """تسجيل مشاهدة باقة في المخزن المؤقت وإرجاع عدد مشاهداتها المعلقة (زيادة في الكاش فقط، دون كتابة)"""
+    package_pending = _incr(DELTA_KEY.format(package_id))
+    pending = _incr(PENDING_KEY)
+
+    with _lock:
+        _ensure_worker()
+    if pending >= _flush_threshold():
+        _wakeup.set()
+    return package_pending
+
+
+def _ensure_worker():
+    if _state['worker'] is None or not _state['worker'].is_alive():
+        worker = threading.Thread(target=_run, name='popularity-counters', daemon=True)
+        _state['worker'] = worker
+        worker.start()
+        if not _state['atexit_registered']:
+            atexit.register(flush)
+            _state['atexit_registered'] = True
+
+
+def _run():
+    while True:
+        _wakeup.wait(_flush_interval())
+        _wakeup.clear()
+        try:
+            flush()
+        except Exception:
+            logger.exception('Popularity counters flush failed')
+        finally:
+            close_old_connections()
+
+
+def pending_views(package_ids):
+    """المشاهدات المعلقة التي لم تُكتب بعد لكل باقة"""
+    package_ids = list(package_ids)
+    pending = {}
+    for start in range(0, len(package_ids), CHUNK_SIZE):
+        chunk = package_ids[start:start + CHUNK_SIZE]
+        values = _cache().get_many([DELTA_KEY.format(package_id) for package_id in chunk])
+        for package_id in chunk:
+            delta = values.get(DELTA_KEY.format(package_id))
+            if delta:
+                pending[package_id] = delta
+    return pending
+
+
+def get_popularity_count(package):
+    """عدد المشاهدات الحالي = القيمة المخزنة + المشاهدات المعلقة"""
+    return package.popularity_count + pending_views([package.pk]).get(package.pk, 0)
+
+
+def current_count(package_id):
+    """عدد المشاهدات الحالي من قاعدة البيانات مباشرة (لا من رد مخزن قد يسبق آخر تفريغ)"""
+    from .models import Package
+
+    stored = Package.objects.filter(pk=package_id).values_list('popularity_count', flat=True).first() or 0
+    return stored + pending_views([package_id]).get(package_id, 0)
+
+
+def flush():
+    """كتابة المشاهدات المعلقة دفعة واحدة باستخدام F() وإرجاع عدد المشاهدات المكتوبة.
+
+    يُستدعى من الخيط الخلفي أو أمر flush_popularity_counters، ويمر على عدادات كل الباقات
+    فلا يعتمد على قائمة تغييرات قد ينقصها عنصر.
+    """
+    from .models import Package
+
+    counters_cache = _cache()
+    # منع عدة عمليات تفريغ متزامنة
+    if not counters_cache.add(FLUSH_LOCK_KEY, 1, timeout=FLUSH_LOCK_TIMEOUT):
+        return 0
+
+    try:
+        # لا اتصال بقاعدة البيانات حين لا توجد مشاهدات معلقة (التفريغ الدوري وعند الخروج)
+        if not counters_cache.get(PENDING_KEY):
+            return 0
+        pending = pending_views(Package.objects.values_list('id', flat=True))
+
+        # تجميع الباقات حسب قيمة الزيادة لتقليل عدد استعلامات UPDATE
+        by_delta = defaultdict(list)
+        for package_id, delta in pending.items():
+            by_delta[delta].append(package_id)
+
+        if by_delta:
+            with transaction.atomic():
+                for delta, delta_ids in by_delta.items():
+                    for start in range(0, len(delta_ids), CHUNK_SIZE):
+                        Package.objects.filter(id__in=delta_ids[start:start + CHUNK_SIZE]).update(
+                            popularity_count=F('popularity_count') + delta
+                        )
+
+        # الطرح بدلاً من الحذف حتى لا تضيع المشاهدات التي وصلت أثناء التفريغ
+        for package_id, delta in pending.items():
+            _decr(DELTA_KEY.format(package_id), delta)
+
+        flushed = sum(pending.values())
+        if flushed:
+            _decr(PENDING_KEY, flushed)
+            # الترتيب حسب عدد المشاهدات وحده يتغير؛ بقية الردود المخزنة تبقى صالحة
+            bump_generation('popularity')
+        return flushed
+    finally:
+        counters_cache.delete(FLUSH_LOCK_KEY)
@@ -0,0 +1,230 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from django.conf import settings
+
+from .catalog_cache import get_generations
+from .geo import EARTH_RADIUS_KM
+
+
+def haversine_matrix(lat_a, lng_a, lat_b, lng_b):
+    """مصفوفة المسافات (كم) بين مجموعتي نقاط بالراديان باستخدام البث في NumPy"""
+    dlat = lat_b[np.newaxis, :] - lat_a[:, np.newaxis]
+    dlng = lng_b[np.newaxis, :] - lng_a[:, np.newaxis]
+    a = (
+        np.sin(dlat / 2) ** 2 +
+        np.cos(lat_a)[:, np.newaxis] * np.cos(lat_b)[np.newaxis, :] * np.sin(dlng / 2) ** 2
+    )
+    return (2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))).astype(np.float32)
+
+
+class DistanceMatrix:
+    """مصفوفة مسافات محسوبة مسبقاً بين كل الوجهات النشطة"""
+
+    def __init__(self, ids, coords, matrix):
+        self.ids = ids
+        self.coords = coords
+        self.matrix = matrix
+        self.index = {int(destination_id): position for position, destination_id in enumerate(ids)}
+
+    @classmethod
+    def build(cls, rows):
+        """بناء المصفوفة كاملة من صفوف (المعرف، خط العرض، خط الطول)"""
+        ids = np.array([row[0] for row in rows], dtype=np.int64)
+        coords = np.radians(np.array([row[1:] for row in rows], dtype=np.float64).reshape(-1, 2))
+        matrix = haversine_matrix(coords[:, 0], coords[:, 1], coords[:, 0], coords[:, 1])
+        return cls(ids, coords, matrix)
+
+    def updated(self, rows):
+        """مصفوفة جديدة تعيد حساب صفوف الوجهات المضافة أو المعدلة فقط"""
+        ids = np.array([row[0] for row in rows], dtype=np.int64)
+        coords = np.radians(np.array([row[1:] for row in rows], dtype=np.float64).reshape(-1, 2))
+        size = len(ids)
+        matrix = np.empty((size, size), dtype=np.float32)
+
+        # نقل الأجزاء التي لم تتغير من المصفوفة السابقة
+        old_positions = np.array([self.index.get(int(destination_id), -1) for destination_id in ids], dtype=np.int64)
+        kept = old_positions >= 0
+        kept[kept] = np.all(self.coords[old_positions[kept]] == coords[kept], axis=1)
+        kept_new = np.flatnonzero(kept)
+        if len(kept_new):
+            kept_old = old_positions[kept_new]
+            matrix[np.ix_(kept_new, kept_new)] = self.matrix[np.ix_(kept_old, kept_old)]
+
+        changed = np.flatnonzero(~kept)
+        if len(changed):
+            block = haversine_matrix(coords[changed, 0], coords[changed, 1], coords[:, 0], coords[:, 1])
+            matrix[changed, :] = block
+            matrix[:, changed] = block.T
+        return DistanceMatrix(ids, coords, matrix)
+
+    def distance(self, origin_id, target_id):
+        return float(self.matrix[self.index[origin_id], self.index[target_id]])
+
+    def submatrix(self, destination_ids):
+        positions = [self.index[destination_id] for destination_id in destination_ids]
+        return self.matrix[np.ix_(positions, positions)]
+
+
+_lock = threading.Lock()
+_state = {'generation': None, 'matrix': None}
+
+
+def get_distance_matrix():
+    """المصفوفة الحالية، يُعاد حسابها جزئياً عند تغيّر جيل الوجهات فقط"""
+    from .models import Destination
+
+    generation = get_generations(['destination'])['destination']
+    with _lock:
+        if _state['matrix'] is not None and _state['generation'] == generation:
+            return _state['matrix']
+
+        rows = list(
+            Destination.objects.filter(is_active=True).order_by('id').values_list('id', 'latitude', 'longitude')
+        )
+        if _state['matrix'] is None:
+            matrix = DistanceMatrix.build(rows)
+        else:
+            matrix = _state['matrix'].updated(rows)
+        _state['matrix'] = matrix
+        _state['generation'] = generation
+        return matrix
+
+
+def _path_length(distances, order):
+    return float(distances[order[:-1], order[1:]].sum()) if len(order) > 1 else 0.0
+
+
+def _nearest_neighbour(distances, start):
+    size = len(distances)
+    visited = np.zeros(size, dtype=bool)
+    order = [start]
+    visited[start] = True
+    for _ in range(size - 1):
+        row = np.where(visited, np.inf, distances[order[-1]])
+        nxt = int(np.argmin(row))
+        order.append(nxt)
+        visited[nxt] = True
+    return np.array(order)
+
+
+def _two_opt(distances, order, fixed_start):
+    """تحسين 2-opt لمسار مفتوح (بدون العودة إلى نقطة البداية)"""
+    order = order.copy()
+    size = len(order)
+    first = 1 if fixed_start else 0
+    improved = True
+    while improved:
+        improved = False
+        for i in range(first, size - 1):
+            # عكس المقطع order[i..j] لكل j دفعة واحدة
+            j = np.arange(i + 1, size)
+            before = distances[order[i - 1], order[i]] if i > 0 else 0.0
+            prev_cost = before + np.where(
+                j + 1 < size, distances[order[j], order[np.minimum(j + 1, size - 1)]], 0.0
+            )
+            new_before = distances[order[i - 1], order[j]] if i > 0 else np.zeros(len(j))
+            new_cost = new_before + np.where(
+                j + 1 < size, distances[order[i], order[np.minimum(j + 1, size - 1)]], 0.0
+            )
+            gains = prev_cost - new_cost
+            best = int(np.argmax(gains))
+            if gains[best] > 1e-6:
+                k = int(j[best])
+                order[i:k + 1] = order[i:k + 1][::-1]
+                improved = True
+    return order
+
+
+def optimize_visit_order(destination_ids, start_id=None, matrix=None):
+    """ترتيب زيارة يقلل مسافة التنقل: أقرب جار ثم تحسين 2-opt، ويعيد (الترتيب، المسافة بالكم)"""
+    matrix = matrix or get_distance_matrix()
+    destination_ids = list(dict.fromkeys(destination_ids))
+    # الوجهات غير الموجودة في المصفوفة (غير النشطة) تبقى في نهاية الترتيب
+    unknown = [destination_id for destination_id in destination_ids if destination_id not in matrix.index]
+    destination_ids = [destination_id for destination_id in destination_ids if destination_id in matrix.index]
+    if start_id not in matrix.index:
+        start_id = None
+    if len(destination_ids) < 3:
+        if start_id is not None:
+            destination_ids.sort(key=lambda destination_id: destination_id != start_id)
+        return destination_ids + unknown, route_distance(destination_ids, matrix)
+
+    distances = matrix.submatrix(destination_ids).astype(np.float64)
+
+    if start_id is not None:
+        starts = [destination_ids.index(start_id)]
+    else:
+        starts = range(len(destination_ids))
+
+    best_order, best_length = None, np.inf
+    for start in starts:
+        order = _two_opt(distances, _nearest_neighbour(distances, start), start_id is not None)
+        length = _path_length(distances, order)
+        if length < best_length:
+            best_order, best_length = order, length
+    return [destination_ids[position] for position in best_order] + unknown, round(best_length, 2)
+
+
+def route_distance(destination_ids, matrix=None):
+    """طول المسار بالكيلومتر بالترتيب المعطى (مع تجاهل الوجهات غير المعروفة)"""
+    matrix = matrix or get_distance_matrix()
+    destination_ids = [destination_id for destination_id in destination_ids if destination_id in matrix.index]
+    return round(sum(
+        matrix.distance(origin, target) for origin, target in zip(destination_ids, destination_ids[1:])
+    ), 2)
+
+
+def travel_hours(distance_km):
+    """تقدير زمن التنقل بالساعات من المسافة المباشرة"""
+    road_factor = getattr(settings, 'ITINERARY_ROAD_FACTOR', 1.3)
+    speed = getattr(settings, 'ITINERARY_AVERAGE_SPEED_KMH', 60)
+    return distance_km * road_factor / speed
+
+
+def _leg_hours(matrix, origin_id, target_id):
+    if origin_id is None or origin_id not in matrix.index or target_id not in matrix.index:
+        return 0.0
+    return travel_hours(matrix.distance(origin_id, target_id))
+
+
+def plan_days(stops, duration_days=None, matrix=None):
+    """توزيع المحطات (الوجهة، ساعات الزيارة، التاريخ) على الأيام وتحديد الأيام التي لا تتسع للزيارة مع التنقل"""
+    # إذا كانت لكل المحطات تواريخ تُجمع حسبها، وإلا تُوزع بالتتابع دون تجاوز ساعات اليوم
+    matrix = matrix or get_distance_matrix()
+    max_hours = getattr(settings, 'ITINERARY_MAX_DAY_HOURS', 10)
+
+    groups = OrderedDict()
+    if stops and all(visit_date for _, _, visit_date in stops):
+        for stop in sorted(stops, key=lambda stop: stop[2]):
+            groups.setdefault(stop[2], []).append(stop)
+    else:
+        day, hours, previous = 1, 0.0, None
+        for stop in stops:
+            leg = _leg_hours(matrix, previous, stop[0])
+            # زمن التنقل إلى أول محطة في اليوم يُحسب على ذلك اليوم
+            if groups and hours + leg + stop[1] > max_hours:
+                day, hours = day + 1, 0.0
+            groups.setdefault(day, []).append(stop)
+            hours += leg + stop[1]
+            previous = stop[0]
+
+    days = []
+    previous = None
+    for number, (key, day_stops) in enumerate(groups.items(), start=1):
+        visit = float(sum(stop[1] for stop in day_stops))
+        travel = 0.0
+        for stop in day_stops:
+            travel += _leg_hours(matrix, previous, stop[0])
+            previous = stop[0]
+        days.append({
+            'day': number,
+            'date': key if not isinstance(key, int) else None,
+            'destinations': [stop[0] for stop in day_stops],
+            'visit_hours': round(visit, 2),
+            'travel_hours': round(travel, 2),
+            'total_hours': round(visit + travel, 2),
+            'fits': visit + travel <= max_hours and (duration_days is None or number <= duration_days),
+        })
+    return days
@@ -0,0 +1,90 @@
+from django.db.models import Count, Q
+from . import catalog_cache
+from .filters import DEPARTURE_PARAMS
+
+# كل فئة مدى نصف مفتوح [الحد الأدنى، الحد الأعلى)
+DURATION_BUCKETS = (
+    ('1-3', 1, 4),
+    ('4-7', 4, 8),
+    ('8-14', 8, 15),
+    ('15+', 15, None),
+)
+
+PRICE_BUCKETS = (
+    ('0-100', 0, 100),
+    ('100-250', 100, 250),
+    ('250-500', 250, 500),
+    ('500-1000', 500, 1000),
+    ('1000+', 1000, None),
+)
+
+# معاملات لا تؤثر على مجموعة النتائج نفسها
+IGNORED_PARAMS = {'page', 'page_size', 'cursor', 'pagination', 'ordering', 'facets'}
+
+
+def _range_condition(field, low, high):
+    condition = Q(**{f'{field}__gte': low})
+    if high is not None:
+        condition &= Q(**{f'{field}__lt': high})
+    return condition
+
+
+def compute_facets(queryset):
+    """عدد الباقات لكل نوع ومحافظة وفئة مدة وفئة سعر ضمن مجموعة النتائج الحالية"""
+    from .models import Package
+
+    # إعادة بناء المجموعة من المعرفات لإزالة التكرار الناتج عن الربط مع الوجهات
+    packages = Package.objects.filter(id__in=queryset.order_by().values('id'))
+
+    # النوع والمدة والسعر في استعلام تجميعي واحد عبر التجميع الشرطي
+    aggregates = {}
+    for value, _ in Package.PACKAGE_TYPES:
+        aggregates[f'type:{value}'] = Count('id', filter=Q(type=value))
+    for label, low, high in DURATION_BUCKETS:
+        aggregates[f'duration:{label}'] = Count('id', filter=_range_condition('duration_days', low, high))
+    for label, low, high in PRICE_BUCKETS:
+        aggregates[f'price:{label}'] = Count('id', filter=_range_condition('effective_price', low, high))
+    totals = packages.aggregate(**aggregates)
+
+    # المحافظة عبر علاقة many-to-many في استعلام مجمّع ثانٍ
+    governorates = (
+        packages.values('destinations__governorate')
+        .annotate(count=Count('id', distinct=True))
+        .order_by('-count')
+    )
+
+    type_labels = dict(Package.PACKAGE_TYPES)
+    return {
+        'type': [
+            {'value': value, 'label': type_labels[value], 'count': totals[f'type:{value}']}
+            for value, _ in Package.PACKAGE_TYPES
+        ],
+        'governorate': [
+            {'value': row['destinations__governorate'], 'count': row['count']}
+            for row in governorates if row['destinations__governorate']
+        ],
+        'duration': [
+            {'value': label, 'count': totals[f'duration:{label}']}
+            for label, _, _ in DURATION_BUCKETS
+        ],
+        'price': [
+            {'value': label, 'count': totals[f'price:{label}']}
+            for label, _, _ in PRICE_BUCKETS
+        ],
+    }
+
+
+def get_facets(queryset, params):
+    """الفئات مع تخزينها مؤقتاً بنفس أجيال الكتالوج (مستقلة عن رقم الصفحة والترتيب)"""
+    key = catalog_cache.build_key(
+        'facets',
+        catalog_cache.get_generations(['package', 'destination'] + (
+            ['departure'] if any(name in DEPARTURE_PARAMS for name, _ in params) else []
+        )),
+        [item for item in params if item[0] not in IGNORED_PARAMS],
+    )
+    facets = catalog_cache.get_cached(key)
+    if facets is None:
+        facets = compute_facets(queryset)
+        catalog_cache.set_cached(key, facets)
+    return facets
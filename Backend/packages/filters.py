@@ -0,0 +1,63 @@
+from django.db.models import Case, Exists, IntegerField, OuterRef, Value, When
+from django.utils.dateparse import parse_date
+from rest_framework import filters
+from . import search
+from .models import PackageDeparture
+
+DEPARTURE_PARAMS = ('departure_from', 'departure_to', 'travelers')
+
+
+def rank_by_ids(queryset, ranked_ids):
+    """تصفية الاستعلام على نتائج البحث وترتيبها حسب درجة الصلة"""
+    if not ranked_ids:
+        return queryset.annotate(search_rank=Value(0, output_field=IntegerField())).none()
+    rank = Case(
+        *[When(id=package_id, then=Value(position)) for position, package_id in enumerate(ranked_ids)],
+        output_field=IntegerField(),
+    )
+    return queryset.filter(id__in=ranked_ids).annotate(search_rank=rank)
+
+
+def departure_filter(departure_from=None, departure_to=None, travelers=None):
+    """شرط وجود موعد انطلاق نشط في نافذة التاريخ يتسع لعدد المسافرين (استعلام فرعي EXISTS واحد)"""
+    departures = PackageDeparture.objects.filter(package=OuterRef('pk'), is_active=True)
+    if departure_from:
+        departures = departures.filter(departure_date__gte=departure_from)
+    if departure_to:
+        departures = departures.filter(departure_date__lte=departure_to)
+    if travelers:
+        departures = departures.filter(seats_remaining__gte=travelers)
+    return Exists(departures)
+
+
+def departure_params(query_params):
+    """قراءة معاملات نافذة الانطلاق من الطلب مع تجاهل القيم غير الصالحة"""
+    params = {}
+    for name in ('departure_from', 'departure_to'):
+        try:
+            value = parse_date(query_params.get(name) or '')
+        except ValueError:
+            value = None
+        if value:
+            params[name] = value
+    travelers = query_params.get('travelers', '')
+    if travelers.isdigit() and int(travelers) > 0:
+        params['travelers'] = int(travelers)
+    return params
+
+
+class PackageFullTextSearchFilter(filters.SearchFilter):
+    """بحث الباقات عبر فهرس النص الكامل بدلاً من icontains على عدة أعمدة"""
+
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        if not terms:
+            return queryset
+
+        queryset = rank_by_ids(queryset, search.search_package_ids(' '.join(terms), queryset=queryset))
+
+        # الترتيب حسب الصلة ما لم يطلب العميل ترتيباً صريحاً
+        ordering_param = getattr(view, 'ordering_param', filters.OrderingFilter.ordering_param)
+        if queryset.query.is_empty() or request.query_params.get(ordering_param):
+            return queryset
+        return queryset.order_by('search_rank')
@@ -0,0 +1,149 @@
+import math
+
+from django.db.models import Q
+
+EARTH_RADIUS_KM = 6371.0088
+GEOHASH_PRECISION = 9
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+_KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+
+def encode_geohash(latitude, longitude, precision=GEOHASH_PRECISION):
+    """ترميز الإحداثيات كسلسلة geohash (خلايا متداخلة بحيث تشترك الخلايا المتجاورة ببادئة)"""
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True
+    while len(chars) < precision:
+        if even:
+            mid = (lng_range[0] + lng_range[1]) / 2
+            if longitude >= mid:
+                bits = (bits << 1) | 1
+                lng_range[0] = mid
+            else:
+                bits <<= 1
+                lng_range[1] = mid
+        else:
+            mid = (lat_range[0] + lat_range[1]) / 2
+            if latitude >= mid:
+                bits = (bits << 1) | 1
+                lat_range[0] = mid
+            else:
+                bits <<= 1
+                lat_range[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(GEOHASH_ALPHABET[bits])
+            bits = 0
+            bit_count = 0
+    return ''.join(chars)
+
+
+def next_prefix(prefix):
+    """أصغر سلسلة أكبر من كل السلاسل التي تبدأ بالبادئة (حد أعلى لمدى البحث على الفهرس)"""
+    chars = list(prefix)
+    while chars:
+        position = GEOHASH_ALPHABET.index(chars[-1])
+        if position + 1 < len(GEOHASH_ALPHABET):
+            chars[-1] = GEOHASH_ALPHABET[position + 1]
+            return ''.join(chars)
+        chars.pop()
+    return None
+
+
+def cell_size_degrees(precision):
+    """أبعاد خلية geohash بالدرجات (الارتفاع، العرض)"""
+    total_bits = 5 * precision
+    lng_bits = (total_bits + 1) // 2
+    lat_bits = total_bits // 2
+    return 180.0 / (2 ** lat_bits), 360.0 / (2 ** lng_bits)
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """المسافة على سطح الأرض بالكيلومتر بين نقطتين"""
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = (
+        math.sin((lat2 - lat1) / 2) ** 2 +
+        math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def bounding_box(latitude, longitude, radius_km):
+    """المستطيل المحيط بدائرة البحث (أدنى عرض، أعلى عرض، أدنى طول، أعلى طول)"""
+    lat_delta = radius_km / _KM_PER_DEGREE
+    cos_lat = math.cos(math.radians(latitude))
+    if cos_lat < 1e-6 or abs(latitude) + lat_delta >= 90:
+        return max(-90.0, latitude - lat_delta), min(90.0, latitude + lat_delta), -180.0, 180.0
+    lng_delta = min(180.0, radius_km / (_KM_PER_DEGREE * cos_lat))
+    return latitude - lat_delta, latitude + lat_delta, longitude - lng_delta, longitude + lng_delta
+
+
+def covering_cells(latitude, longitude, radius_km):
+    """بادئات geohash التي تغطي المستطيل المحيط (9 خلايا على الأكثر)، أو قائمة فارغة إذا كان النطاق واسعاً"""
+    min_lat, max_lat, min_lng, max_lng = bounding_box(latitude, longitude, radius_km)
+    precision = 0
+    for candidate in range(GEOHASH_PRECISION, 0, -1):
+        height, width = cell_size_degrees(candidate)
+        if height >= (max_lat - min_lat) / 2 and width >= (max_lng - min_lng) / 2:
+            precision = candidate
+            break
+    if not precision:
+        return []
+
+    height, width = cell_size_degrees(precision)
+    cells = set()
+    lat = min_lat
+    while True:
+        lng = min_lng
+        while True:
+            cells.add(encode_geohash(max(-90.0, min(lat, 90.0)), (lng + 180.0) % 360.0 - 180.0, precision))
+            if lng >= max_lng:
+                break
+            lng = min(lng + width, max_lng)
+        if lat >= max_lat:
+            break
+        lat = min(lat + height, max_lat)
+    return sorted(cells)
+
+
+def nearby_filter(latitude, longitude, radius_km, prefix=''):
+    """شرط الفلترة المسبقة: خلايا geohash (مدى على الفهرس) + المستطيل المحيط"""
+    min_lat, max_lat, min_lng, max_lng = bounding_box(latitude, longitude, radius_km)
+    condition = Q(**{
+        f'{prefix}latitude__gte': min_lat,
+        f'{prefix}latitude__lte': max_lat,
+    })
+    if min_lng >= -180.0 and max_lng <= 180.0:
+        condition &= Q(**{f'{prefix}longitude__gte': min_lng, f'{prefix}longitude__lte': max_lng})
+
+    cells = covering_cells(latitude, longitude, radius_km)
+    if cells:
+        cell_condition = Q()
+        for cell in cells:
+            cell_range = Q(**{f'{prefix}geohash__gte': cell})
+            upper = next_prefix(cell)
+            if upper:
+                cell_range &= Q(**{f'{prefix}geohash__lt': upper})
+            cell_condition |= cell_range
+        condition &= cell_condition
+    return condition
+
+
+def nearby_destinations(latitude, longitude, radius_km, queryset=None):
+    """الوجهات ضمن نصف القطر مرتبة حسب المسافة، كقائمة (الوجهة، المسافة)"""
+    from .models import Destination
+
+    if queryset is None:
+        queryset = Destination.objects.filter(is_active=True)
+    results = []
+    for destination in queryset.filter(nearby_filter(latitude, longitude, radius_km)):
+        # التحقق الدقيق بعد الفلترة المسبقة
+        distance = haversine_km(latitude, longitude, destination.latitude, destination.longitude)
+        if distance <= radius_km:
+            results.append((destination, distance))
+    results.sort(key=lambda item: item[1])
+    return results
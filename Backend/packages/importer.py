@@ -0,0 +1,464 @@
+import csv
+import hashlib
+import itertools
+import json
+import os
+
+from django.core.exceptions import ValidationError
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.utils import timezone
+
+from . import catalog_cache, geo, search
+from .models import (
+    CatalogImportRecord, Destination, Package, PackageDestination, PackageService, Service
+)
+
+
+class RowError(Exception):
+    """خطأ في صف واحد من ملف الاستيراد (يُتخطى الصف ويُسجل الخطأ)"""
+
+
+def validate_features(value):
+    if not isinstance(value, list) or not all(isinstance(item, str) for item in value):
+        raise RowError('المميزات يجب أن تكون قائمة نصوص')
+
+
+def validate_daily_schedule(value):
+    # الشكل المعتمد: {"اليوم1": {"صباح": "نشاط", "ظهر": "نشاط", "مساء": "نشاط"}, ...}
+    if not isinstance(value, dict) or not value:
+        raise RowError('الجدول اليومي يجب أن يكون كائناً غير فارغ')
+    for day, slots in value.items():
+        if not isinstance(slots, dict) or not all(isinstance(activity, str) for activity in slots.values()):
+            raise RowError(f'جدول اليوم "{day}" يجب أن يكون كائناً من الفترات والأنشطة')
+
+
+def validate_string_list(value):
+    if not isinstance(value, list) or not all(isinstance(item, str) for item in value):
+        raise RowError('القيمة يجب أن تكون قائمة نصوص')
+
+
+class ImportSpec:
+    """وصف استيراد نموذج واحد: الحقول والمراجع ومفتاح الصف وآثار التغيير على الكتالوج"""
+
+    def __init__(self, name, model, fields, generation, references=None, key_fields=None,
+                 unique_fields=None, validators=None):
+        self.name = name
+        self.model = model
+        self.label = model._meta.label_lower
+        self.fields = [model._meta.get_field(field_name) for field_name in fields]
+        self.generation = generation
+        # مراجع المفاتيح الأجنبية: اسم الحقل -> اسم المواصفة المشار إليها (بالمعرف الخارجي)
+        self.references = references or {}
+        # الروابط بلا معرف خارجي يُشتق مفتاحها من هذه الأعمدة
+        self.key_fields = key_fields
+        # حقول فريدة في قاعدة البيانات لتبنّي السجلات الموجودة مسبقاً بدل تكرارها
+        self.unique_fields = unique_fields
+        self.validators = validators or {}
+        self.has_updated_at = any(field.name == 'updated_at' for field in model._meta.fields)
+        # أعمدة الإدراج: كل الحقول عدا المفتاح الأساسي والأعمدة المولدة في قاعدة البيانات
+        self.insert_fields = [
+            field for field in model._meta.concrete_fields if not field.primary_key and not field.generated
+        ]
+        update_names = set(fields) | {f'{field_name}_id' for field_name in self.references}
+        if model is Destination:
+            update_names.add('geohash')
+        if self.has_updated_at:
+            update_names.add('updated_at')
+        self.update_fields = [field for field in self.insert_fields if field.attname in update_names]
+
+    def external_id(self, row):
+        if self.key_fields:
+            parts = [str(row.get(field_name) or '').strip() for field_name in self.key_fields]
+            if not all(parts):
+                raise RowError(f'الأعمدة {", ".join(self.key_fields)} مطلوبة')
+            return ':'.join(parts)
+        external_id = str(row.get('external_id') or '').strip()
+        if not external_id:
+            raise RowError('العمود external_id مطلوب')
+        return external_id
+
+    def clean(self, row):
+        """تحويل قيم الصف والتحقق منها بقواعد حقول النموذج"""
+        values = {}
+        for field in self.fields:
+            raw = row.get(field.name)
+            if raw is None or raw == '':
+                if field.has_default():
+                    values[field.name] = field.get_default()
+                    continue
+                raw = None
+            elif field.get_internal_type() == 'JSONField' and isinstance(raw, str):
+                try:
+                    raw = json.loads(raw)
+                except ValueError:
+                    raise RowError(f'{field.name}: JSON غير صالح')
+            try:
+                values[field.name] = field.clean(raw, None)
+            except ValidationError as error:
+                raise RowError(f'{field.name}: {" ".join(error.messages)}')
+            if field.name in self.validators and values[field.name] is not None:
+                self.validators[field.name](values[field.name])
+        return values
+
+    def prepare(self, values):
+        if self.model is Destination:
+            # الإدراج المجمع لا يستدعي save() لذا يُحسب الترميز الجغرافي هنا
+            values['geohash'] = geo.encode_geohash(values['latitude'], values['longitude'])
+
+    def affected_packages(self, rows):
+        """الباقات التي يجب إعادة فهرستها بعد تغيّر هذه السجلات"""
+        if self.model is Package:
+            return {values['id'] for values in rows}
+        if self.model in (PackageDestination, PackageService):
+            return {values['package_id'] for values in rows}
+        if self.model is Destination:
+            return set(
+                PackageDestination.objects.filter(destination__in=[values['id'] for values in rows])
+                .values_list('package_id', flat=True)
+            )
+        return set()
+
+
+SPECS = {spec.name: spec for spec in (
+    ImportSpec(
+        'destinations', Destination,
+        ['name', 'type', 'description', 'governorate', 'latitude', 'longitude',
+         'popularity_score', 'best_season', 'image_url', 'is_active'],
+        generation='destination',
+    ),
+    ImportSpec(
+        'services', Service,
+        ['name', 'type', 'level', 'description', 'address', 'contact_phone', 'contact_email',
+         'price_per_unit', 'unit_description', 'capacity', 'persons_per_unit', 'features', 'rating', 'image_urls', 'is_active'],
+        generation='service',
+        references={'destination': 'destinations'},
+        validators={'features': validate_features, 'image_urls': validate_string_list},
+    ),
+    ImportSpec(
+        'packages', Package,
+        ['title', 'type', 'description', 'short_description', 'duration_days', 'base_price',
+         'discount_price', 'included_services', 'excluded_services', 'daily_schedule',
+         'terms_conditions', 'cancellation_policy', 'image_urls', 'is_featured', 'is_active'],
+        generation='package',
+        validators={
+            'daily_schedule': validate_daily_schedule,
+            'included_services': validate_string_list,
+            'excluded_services': validate_string_list,
+            'image_urls': validate_string_list,
+        },
+    ),
+    ImportSpec(
+        'package_destinations', PackageDestination,
+        ['visit_order', 'duration_hours', 'description'],
+        generation='package',
+        references={'package': 'packages', 'destination': 'destinations'},
+        key_fields=['package', 'destination'],
+        unique_fields=['package', 'destination'],
+    ),
+    ImportSpec(
+        'package_services', PackageService,
+        ['day_number', 'time_slot', 'quantity', 'notes'],
+        generation='package',
+        references={'package': 'packages', 'service': 'services'},
+        key_fields=['package', 'service', 'day_number', 'time_slot'],
+    ),
+)}
+
+
+def read_rows(path, file_format=None):
+    """قراءة الصفوف تدريجياً من ملف CSV أو JSONL كأزواج (رقم السطر، الصف)"""
+    file_format = file_format or os.path.splitext(path)[1].lstrip('.').lower()
+    with open(path, encoding='utf-8-sig', newline='') as handle:
+        if file_format == 'csv':
+            reader = csv.DictReader(handle)
+            for row in reader:
+                yield reader.line_num, row
+        elif file_format in ('jsonl', 'ndjson'):
+            for line_number, line in enumerate(handle, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    row = None
+                yield line_number, row if isinstance(row, dict) else RowError('سطر JSON غير صالح')
+        else:
+            raise ValueError(f'صيغة غير مدعومة: {file_format}')
+
+
+# أنواع تُمرر قيمها النظيفة إلى قاعدة البيانات كما هي دون تحويل
+PASSTHROUGH_TYPES = {
+    'CharField', 'TextField', 'EmailField', 'URLField', 'BooleanField', 'FloatField', 'IntegerField',
+    'PositiveIntegerField', 'PositiveBigIntegerField', 'BigIntegerField', 'ForeignKey',
+}
+MEMO_TYPES = {'DateTimeField', 'DecimalField'}
+
+
+def _db_rows(fields, rows, db):
+    """تحويل قيم الصفوف إلى صيغة قاعدة البيانات مباشرة دون بناء كائنات النماذج"""
+    memo = {}
+
+    def preparer(field):
+        internal_type = field.get_internal_type()
+        if internal_type in PASSTHROUGH_TYPES:
+            return None
+        if internal_type not in MEMO_TYPES:
+            return lambda value: field.get_db_prep_save(value, db)
+
+        # القيم المتكررة (تاريخ الاستيراد، الأسعار) تُحوّل مرة واحدة
+        def prepare(value):
+            key = (field.attname, value)
+            if key not in memo:
+                memo[key] = field.get_db_prep_save(value, db)
+            return memo[key]
+        return prepare
+
+    columns = [(field.attname, preparer(field)) for field in fields]
+    return [
+        [
+            values[attname] if prepare is None or values[attname] is None else prepare(values[attname])
+            for attname, prepare in columns
+        ]
+        for values in rows
+    ]
+
+
+def insert_rows(model, fields, rows):
+    """إدراج متعدد الصفوف بعبارات INSERT ... RETURNING وتعيين المعرفات في الصفوف"""
+    if not rows:
+        return
+    # الاتصال الفعلي مرة واحدة بدل المرور بوكيل django.db.connection لكل قيمة
+    connection = connections[DEFAULT_DB_ALIAS]
+    if not connection.features.can_return_rows_from_bulk_insert:
+        objects = [model(**{field.attname: values[field.attname] for field in fields}) for values in rows]
+        model.objects.bulk_create(objects)
+        for values, obj in zip(rows, objects):
+            values['id'] = obj.pk
+        return
+
+    quote = connection.ops.quote_name
+    columns = ', '.join(quote(field.column) for field in fields)
+    placeholder = f'({", ".join(["%s"] * len(fields))})'
+    batch_size = max(connection.ops.bulk_batch_size(fields, rows), 1)
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            cursor.execute(
+                f'INSERT INTO {quote(model._meta.db_table)} ({columns}) '
+                f'VALUES {", ".join([placeholder] * len(batch))} '
+                f'RETURNING {quote(model._meta.pk.column)}',
+                [value for row in _db_rows(fields, batch, connection) for value in row]
+            )
+            for values, (pk,) in zip(batch, cursor.fetchall()):
+                values['id'] = pk
+
+
+def update_rows(model, fields, rows):
+    """تحديث الصفوف حسب المعرف بعبارة واحدة مُعدّة (executemany) بدل CASE WHEN في bulk_update"""
+    if not rows:
+        return
+    connection = connections[DEFAULT_DB_ALIAS]
+    quote = connection.ops.quote_name
+    assignments = ', '.join(f'{quote(field.column)} = %s' for field in fields)
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'UPDATE {quote(model._meta.db_table)} SET {assignments} '
+            f'WHERE {quote(model._meta.pk.column)} = %s',
+            [row + [values['id']] for row, values in zip(_db_rows(fields, rows, connection), rows)]
+        )
+
+
+def row_hash(values, references):
+    payload = json.dumps([values, references], sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+class CatalogImporter:
+    """استيراد مجمع بدفعات: تخطي الصفوف غير المتغيرة وإدراج/تحديث الباقي بمعاملة لكل دفعة"""
+
+    def __init__(self, spec, batch_size=1000, max_errors=100):
+        self.spec = spec
+        self.batch_size = batch_size
+        self.max_errors = max_errors
+        self.created = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.errors = []
+        self.reindex_ids = set()
+        self.record_fields = [
+            CatalogImportRecord._meta.get_field(field_name)
+            for field_name in ('model_label', 'external_id', 'row_hash', 'object_id', 'updated_at')
+        ]
+        self.record_update_fields = [self.record_fields[2], self.record_fields[4]]
+
+    def run(self, rows):
+        rows = iter(rows)
+        while True:
+            chunk = list(itertools.islice(rows, self.batch_size))
+            if not chunk:
+                break
+            self.import_chunk(chunk)
+            if self.max_errors and len(self.errors) >= self.max_errors:
+                break
+        self.finish()
+        return self
+
+    def error(self, line_number, message):
+        self.errors.append((line_number, message))
+
+    def parse_chunk(self, chunk):
+        spec = self.spec
+        parsed = {}
+        for line_number, row in chunk:
+            try:
+                if isinstance(row, RowError):
+                    raise row
+                external_id = spec.external_id(row)
+                values = spec.clean(row)
+                references = {}
+                for field_name in spec.references:
+                    reference = str(row.get(field_name) or '').strip()
+                    if not reference:
+                        raise RowError(f'العمود {field_name} مطلوب')
+                    references[field_name] = reference
+            except RowError as error:
+                self.error(line_number, str(error))
+                continue
+            # عند تكرار المعرف في الدفعة نفسها يُعتمد آخر صف
+            parsed[external_id] = (line_number, values, references)
+        return parsed
+
+    def resolve_references(self, parsed):
+        """تحويل المعرفات الخارجية للمراجع إلى معرفات السجلات باستعلام واحد لكل نموذج"""
+        resolved = {}
+        for field_name, spec_name in self.spec.references.items():
+            external_ids = {references[field_name] for _, _, references in parsed.values()}
+            resolved[field_name] = dict(
+                CatalogImportRecord.objects.filter(
+                    model_label=SPECS[spec_name].label, external_id__in=external_ids
+                ).values_list('external_id', 'object_id')
+            )
+        return resolved
+
+    def load_records(self, external_ids):
+        """سجلات الاستيراد السابقة للدفعة، مع فصل السجلات التي حُذفت من الكتالوج بعد استيرادها"""
+        spec = self.spec
+        records = {
+            external_id: (record_id, object_id, digest)
+            for record_id, external_id, object_id, digest in CatalogImportRecord.objects.filter(
+                model_label=spec.label, external_id__in=external_ids
+            ).values_list('id', 'external_id', 'object_id', 'row_hash')
+        }
+        alive = set(
+            spec.model.objects.filter(pk__in=[object_id for _, object_id, _ in records.values()])
+            .values_list('pk', flat=True)
+        )
+        stale = [record_id for record_id, object_id, _ in records.values() if object_id not in alive]
+        # السجلات المحذوفة تُعامل صفوفها كصفوف جديدة
+        records = {
+            external_id: record for external_id, record in records.items() if record[1] in alive
+        }
+        return records, stale
+
+    def import_chunk(self, chunk):
+        spec = self.spec
+        parsed = self.parse_chunk(chunk)
+        if not parsed:
+            return
+        resolved = self.resolve_references(parsed)
+        records, stale = self.load_records(parsed.keys())
+
+        now = timezone.now()
+        to_create, to_update, changed_records = [], [], []
+        for external_id, (line_number, values, references) in parsed.items():
+            digest = row_hash(values, references)
+            record = records.get(external_id)
+            if record is not None and record[2] == digest:
+                self.unchanged += 1
+                continue
+            try:
+                for field_name, reference in references.items():
+                    if reference not in resolved[field_name]:
+                        raise RowError(f'{field_name}: المعرف الخارجي "{reference}" غير موجود')
+                    values[f'{field_name}_id'] = resolved[field_name][reference]
+            except RowError as error:
+                self.error(line_number, str(error))
+                continue
+
+            spec.prepare(values)
+            if spec.has_updated_at:
+                values['updated_at'] = now
+            if record is None:
+                to_create.append((external_id, digest, values))
+            else:
+                values['id'] = record[1]
+                to_update.append(values)
+                changed_records.append({'id': record[0], 'row_hash': digest, 'updated_at': now})
+
+        with transaction.atomic():
+            if stale:
+                CatalogImportRecord.objects.filter(pk__in=stale).delete()
+            if to_create:
+                self.create_rows(to_create, now)
+            update_rows(spec.model, spec.update_fields, to_update)
+            update_rows(CatalogImportRecord, self.record_update_fields, changed_records)
+
+        self.created += len(to_create)
+        self.updated += len(to_update)
+        if to_create or to_update:
+            self.reindex_ids |= spec.affected_packages([values for _, _, values in to_create] + to_update)
+
+    def create_rows(self, to_create, now):
+        spec = self.spec
+        rows = [values for _, _, values in to_create]
+        if spec.unique_fields:
+            # سجلات أُنشئت يدوياً (من لوحة الإدارة) تُربط بالصف بدل إدراج نسخة مكررة
+            attnames = [f'{field_name}_id' for field_name in spec.unique_fields]
+            existing = {
+                tuple(row[1:]): row[0]
+                for row in spec.model.objects.filter(
+                    **{f'{attnames[0]}__in': {values[attnames[0]] for values in rows}}
+                ).values_list('pk', *attnames)
+            }
+            adopted = []
+            for values in rows:
+                pk = existing.get(tuple(values[attname] for attname in attnames))
+                if pk is not None:
+                    values['id'] = pk
+                    adopted.append(values)
+            update_rows(spec.model, spec.update_fields, adopted)
+            rows = [values for values in rows if 'id' not in values]
+
+        # قيم الأعمدة غير الموجودة في الملف (الافتراضية وتواريخ الإنشاء) تُحسب مرة واحدة للدفعة
+        defaults = {}
+        for field in spec.insert_fields:
+            if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False):
+                defaults[field.attname] = now
+            elif field.has_default():
+                defaults[field.attname] = field.get_default()
+            else:
+                defaults[field.attname] = None
+        complete = [{**defaults, **values} for values in rows]
+        insert_rows(spec.model, spec.insert_fields, complete)
+        for values, row in zip(rows, complete):
+            values['id'] = row['id']
+
+        insert_rows(CatalogImportRecord, self.record_fields, [
+            {
+                'model_label': spec.label,
+                'external_id': external_id,
+                'row_hash': digest,
+                'object_id': values['id'],
+                'updated_at': now,
+            }
+            for external_id, digest, values in to_create
+        ])
+
+    def finish(self):
+        """إبطال ذاكرة الكتالوج وتحديث فهرس البحث (العمليات المجمعة لا تطلق الإشارات)"""
+        if not self.created and not self.updated:
+            return
+        catalog_cache.bump_generation(self.spec.generation)
+        package_ids = sorted(self.reindex_ids)
+        for start in range(0, len(package_ids), 500):
+            search.index_packages(package_ids[start:start + 500])
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from django.conf import settings
+from packages import snapshot
+
+
+class Command(BaseCommand):
+    help = 'بناء لقطة الكتالوج المشتركة بين عمليات الخادم'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default=None, help='مسار ملف اللقطة (CATALOG_SNAPSHOT_PATH افتراضياً)')
+
+    def handle(self, *args, **options):
+        path = options['path'] or settings.CATALOG_SNAPSHOT_PATH
+        header = snapshot.build_snapshot(path)
+        counts = header['counts']
+        self.stdout.write(self.style.SUCCESS(
+            f"تمت كتابة {path}: {counts['destinations']} وجهة، {counts['services']} خدمة، {counts['packages']} باقة"
+        ))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from packages import catalog_cache
+
+
+class Command(BaseCommand):
+    help = 'عرض إحصائيات كاش الكتالوج (الإصابات والإخفاقات)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='تصفير العدادات بعد العرض')
+
+    def handle(self, *args, **options):
+        stats = catalog_cache.get_stats()
+        self.stdout.write(
+            f"hits={stats['hits']} misses={stats['misses']} hit_rate={stats['hit_rate']}"
+        )
+        if options['reset']:
+            catalog_cache.reset_stats()
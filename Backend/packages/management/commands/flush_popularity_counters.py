@@ -0,0 +1,25 @@
+import time
+from django.core.management.base import BaseCommand
+from packages import counters
+
+
+class Command(BaseCommand):
+    help = 'تفريغ عدادات مشاهدات الباقات المعلقة إلى قاعدة البيانات (يتطلب كاشاً مشتركاً مثل Redis)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='التشغيل المستمر كعامل خلفي')
+        parser.add_argument('--interval', type=int, default=30, help='الفاصل بين عمليات التفريغ بالثواني')
+
+    def handle(self, *args, **options):
+        if not counters.is_shared_cache():
+            # بدون كاش مشترك تبقى المشاهدات في ذاكرة كل عامل ويفرغها خيطه الخلفي؛ لا شيء يراه هذا الأمر
+            self.stderr.write(self.style.WARNING(
+                'كاش العدادات محلي لكل عملية (REDIS_URL غير مضبوط): هذا الأمر لا يفرغ شيئاً، '
+                'وكل عامل ويب يفرغ مشاهداته بنفسه'
+            ))
+        while True:
+            flushed = counters.flush()
+            self.stdout.write(f'تم تفريغ {flushed} مشاهدة')
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,29 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from packages.importer import SPECS, CatalogImporter, read_rows
+
+
+class Command(BaseCommand):
+    help = 'استيراد بيانات الكتالوج من ملفات الموردين (CSV أو JSONL) مع تخطي الصفوف غير المتغيرة'
+
+    def add_arguments(self, parser):
+        parser.add_argument('model', choices=sorted(SPECS), help='نوع السجلات في الملف')
+        parser.add_argument('path', help='مسار الملف')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='صيغة الملف (تُستنتج من الامتداد افتراضياً)')
+        parser.add_argument('--batch-size', type=int, default=1000, help='عدد الصفوف في كل معاملة')
+        parser.add_argument('--max-errors', type=int, default=100, help='إيقاف الاستيراد بعد هذا العدد من الأخطاء (0 بلا حد)')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        importer = CatalogImporter(SPECS[options['model']], options['batch_size'], options['max_errors'])
+        try:
+            importer.run(read_rows(options['path'], options['format']))
+        except (OSError, ValueError) as error:
+            raise CommandError(str(error))
+
+        for line_number, message in importer.errors:
+            self.stderr.write(f'السطر {line_number}: {message}')
+        self.stdout.write(self.style.SUCCESS(
+            f'أُضيف {importer.created}، حُدّث {importer.updated}، دون تغيير {importer.unchanged}، '
+            f'أخطاء {len(importer.errors)} خلال {time.monotonic() - started:.1f} ثانية'
+        ))
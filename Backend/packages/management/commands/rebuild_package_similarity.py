@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from packages import similarity
+
+
+class Command(BaseCommand):
+    help = 'إعادة حساب الباقات المشابهة (تدريجياً افتراضياً)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='إعادة الحساب لكل الباقات')
+        parser.add_argument('--top-k', type=int, default=None, help='عدد الباقات المشابهة لكل باقة')
+
+    def handle(self, *args, **options):
+        stats = similarity.rebuild(full=options['full'], top_k=options['top_k'])
+        timings = stats['timings']
+        total = sum(timings.values())
+        self.stdout.write(self.style.SUCCESS(
+            f"{stats['packages']} باقة: تغيّرت {stats['changed']}، حُذفت {stats['removed']}، "
+            f"حُدّثت قوائم {stats['updated']} خلال {total:.2f} ثانية"
+        ))
+        self.stdout.write(' '.join(f'{name}={value:.3f}s' for name, value in timings.items()))
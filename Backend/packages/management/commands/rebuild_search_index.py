@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from packages import search
+
+
+class Command(BaseCommand):
+    help = 'إعادة بناء فهرس البحث النصي للباقات'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        total = search.rebuild_index(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'تمت فهرسة {total} باقة'))
@@ -0,0 +1,24 @@
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    from packages import search
+
+    search.rebuild_index(apps.get_model('packages', 'Package'), schema_editor.connection)
+
+
+def drop_search_index(apps, schema_editor):
+    from packages import search
+
+    search.get_backend(schema_editor.connection).drop(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('packages', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
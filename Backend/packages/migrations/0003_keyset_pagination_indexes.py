@@ -0,0 +1,17 @@
+# Generated by Django 5.2.7 on 2026-10-17 17:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('packages', '0002_package_search_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='package',
+            index=models.Index(fields=['is_active', 'created_at', 'id'], name='packages_is_acti_042aaf_idx'),
+        ),
+    ]
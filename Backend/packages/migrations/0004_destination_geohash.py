@@ -0,0 +1,37 @@
+# Generated by Django 5.2.7 on 2026-10-17 17:43
+
+from django.db import migrations, models
+
+
+def populate_geohash(apps, schema_editor):
+    from packages.geo import encode_geohash
+
+    Destination = apps.get_model('packages', 'Destination')
+    destinations = list(Destination.objects.only('id', 'latitude', 'longitude'))
+    for destination in destinations:
+        destination.geohash = encode_geohash(destination.latitude, destination.longitude)
+    Destination.objects.bulk_update(destinations, ['geohash'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('packages', '0003_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='destination',
+            name='geohash',
+            field=models.CharField(blank=True, editable=False, max_length=12, verbose_name='الترميز الجغرافي'),
+        ),
+        migrations.RunPython(populate_geohash, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='destination',
+            index=models.Index(fields=['geohash'], name='destination_geohash_5ea9f6_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='destination',
+            index=models.Index(fields=['latitude', 'longitude'], name='destination_latitud_6ca23c_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-17 17:47
+
+import django.db.models.functions.comparison
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('packages', '0004_destination_geohash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='package',
+            name='effective_price',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.functions.comparison.Coalesce(django.db.models.functions.comparison.NullIf('discount_price', models.Value(0)), 'base_price'), output_field=models.DecimalField(decimal_places=2, max_digits=10), verbose_name='السعر الفعلي'),
+        ),
+        migrations.AddIndex(
+            model_name='package',
+            index=models.Index(fields=['is_active', 'effective_price'], name='packages_is_acti_c9f31e_idx'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.7 on 2026-10-17 17:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('packages', '0005_package_effective_price'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogImportRecord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model_label', models.CharField(max_length=50, verbose_name='النموذج')),
+                ('external_id', models.CharField(max_length=100, verbose_name='المعرف الخارجي')),
+                ('row_hash', models.CharField(max_length=40, verbose_name='بصمة الصف')),
+                ('object_id', models.PositiveBigIntegerField(verbose_name='معرف السجل')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='آخر استيراد')),
+            ],
+            options={
+                'verbose_name': 'سجل استيراد',
+                'verbose_name_plural': 'سجلات الاستيراد',
+                'db_table': 'catalog_import_records',
+                'constraints': [models.UniqueConstraint(fields=('model_label', 'external_id'), name='unique_catalog_import_record')],
+            },
+        ),
+    ]
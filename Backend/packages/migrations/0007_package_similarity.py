@@ -0,0 +1,44 @@
+# Generated by Django 5.2.7 on 2026-10-17 18:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('packages', '0006_catalog_import_record'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PackageSimilarityState',
+            fields=[
+                ('package', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to='packages.package', verbose_name='الباقة')),
+                ('signature', models.CharField(max_length=40, verbose_name='البصمة')),
+                ('computed_at', models.DateTimeField(auto_now=True, verbose_name='تاريخ الحساب')),
+            ],
+            options={
+                'verbose_name': 'حالة تشابه باقة',
+                'verbose_name_plural': 'حالات تشابه الباقات',
+                'db_table': 'package_similarity_states',
+            },
+        ),
+        migrations.CreateModel(
+            name='PackageSimilarity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField(verbose_name='درجة التشابه')),
+                ('rank', models.PositiveSmallIntegerField(verbose_name='الترتيب')),
+                ('package', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similarities', to='packages.package', verbose_name='الباقة')),
+                ('similar', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='packages.package', verbose_name='الباقة المشابهة')),
+            ],
+            options={
+                'verbose_name': 'تشابه باقة',
+                'verbose_name_plural': 'تشابه الباقات',
+                'db_table': 'package_similarities',
+                'ordering': ['rank'],
+                'constraints': [models.UniqueConstraint(fields=('package', 'rank'), name='unique_package_similarity_rank')],
+            },
+        ),
+    ]
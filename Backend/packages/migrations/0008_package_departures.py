@@ -0,0 +1,33 @@
+# Generated by Django 5.2.7 on 2026-10-17 18:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('packages', '0007_package_similarity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PackageDeparture',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('departure_date', models.DateField(verbose_name='تاريخ الانطلاق')),
+                ('seats', models.PositiveIntegerField(verbose_name='عدد المقاعد')),
+                ('seats_remaining', models.PositiveIntegerField(verbose_name='المقاعد المتبقية')),
+                ('is_active', models.BooleanField(default=True, verbose_name='نشط')),
+                ('package', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='departures', to='packages.package', verbose_name='الباقة')),
+            ],
+            options={
+                'verbose_name': 'موعد انطلاق',
+                'verbose_name_plural': 'مواعيد الانطلاق',
+                'db_table': 'package_departures',
+                'ordering': ['departure_date'],
+                'indexes': [models.Index(condition=models.Q(('is_active', True)), fields=['departure_date', 'seats_remaining', 'package'], name='departure_search_idx')],
+                'constraints': [models.UniqueConstraint(fields=('package', 'departure_date'), name='unique_package_departure_date'), models.CheckConstraint(condition=models.Q(('seats_remaining__lte', models.F('seats'))), name='package_departure_not_oversold')],
+            },
+        ),
+    ]
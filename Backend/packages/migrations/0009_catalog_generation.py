@@ -0,0 +1,25 @@
+# Generated by Django 5.2.7 on 2026-10-17 18:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('packages', '0008_package_departures'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogGeneration',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False, verbose_name='النموذج')),
+                ('value', models.PositiveBigIntegerField(default=0, verbose_name='الجيل')),
+            ],
+            options={
+                'verbose_name': 'جيل الكتالوج',
+                'verbose_name_plural': 'أجيال الكتالوج',
+                'db_table': 'catalog_generations',
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-17 19:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('packages', '0009_catalog_generation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='service',
+            name='persons_per_unit',
+            field=models.PositiveIntegerField(blank=True, help_text='فارغ يعني أن السعر للشخص الواحد', null=True, verbose_name='عدد الأشخاص في الوحدة'),
+        ),
+        migrations.AlterField(
+            model_name='service',
+            name='capacity',
+            field=models.IntegerField(blank=True, help_text='عدد الأشخاص الذين تستوعبهم الخدمة في اليوم الواحد', null=True, verbose_name='السعة'),
+        ),
+    ]
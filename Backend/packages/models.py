@@ -1,6 +1,8 @@
 from django.db import models
 from django.conf import settings
+from django.db.models.functions import Coalesce, Greatest, NullIf
 from django.utils.translation import gettext_lazy as _
+from . import geo
 
 class Destination(models.Model):
     DESTINATION_TYPES = (
@@ -16,6 +18,7 @@ class Destination(models.Model):
     governorate = models.CharField(_('المحافظة'), max_length=50)
     latitude = models.FloatField(_('خط العرض'))
     longitude = models.FloatField(_('خط الطول'))
+    geohash = models.CharField(_('الترميز الجغرافي'), max_length=12, blank=True, editable=False)
     popularity_score = models.IntegerField(_('مستوى الشعبية'), default=0)
     best_season = models.CharField(_('أفضل موسم'), max_length=100)
     image_url = models.URLField(_('صورة'), blank=True, null=True)
@@ -29,11 +32,21 @@ class Destination(models.Model):
         indexes = [
             models.Index(fields=['governorate', 'type']),
             models.Index(fields=['popularity_score']),
+            models.Index(fields=['geohash']),
+            models.Index(fields=['latitude', 'longitude']),
         ]
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        # تحديث الترميز الجغرافي مع كل تعديل للإحداثيات
+        self.geohash = geo.encode_geohash(self.latitude, self.longitude)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'latitude', 'longitude'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'geohash'}
+        super().save(*args, **kwargs)
+
 class Service(models.Model):
     SERVICE_TYPES = (
         ('hotel', 'فندق'),
@@ -60,7 +73,14 @@ class Service(models.Model):
     contact_email = models.EmailField(_('البريد الإلكتروني'), blank=True, null=True)
     price_per_unit = models.DecimalField(_('السعر'), max_digits=10, decimal_places=2)
     unit_description = models.CharField(_('وصف الوحدة'), max_length=100)
-    capacity = models.IntegerField(_('السعة'), blank=True, null=True)
+    # السعة اليومية بعدد الأشخاص: دفتر السعة في الحجوزات يخصم منها عدد المسافرين لكل يوم، وفارغة = غير محدودة
+    capacity = models.IntegerField(
+        _('السعة'), blank=True, null=True, help_text=_('عدد الأشخاص الذين تستوعبهم الخدمة في اليوم الواحد')
+    )
+    # حجم الوحدة المسعّرة (غرفة، مركبة): عدد الوحدات = ceil(المسافرين / persons_per_unit)، وفارغ = السعر للشخص
+    persons_per_unit = models.PositiveIntegerField(
+        _('عدد الأشخاص في الوحدة'), blank=True, null=True, help_text=_('فارغ يعني أن السعر للشخص الواحد')
+    )
     features = models.JSONField(_('المميزات'), default=list)
     rating = models.FloatField(_('التقييم'), default=0.0)
     image_urls = models.JSONField(_('الصور'), default=list)
@@ -96,6 +116,13 @@ class Package(models.Model):
     duration_days = models.PositiveIntegerField(_('عدد الأيام'))
     base_price = models.DecimalField(_('السعر الأساسي'), max_digits=10, decimal_places=2)
     discount_price = models.DecimalField(_('سعر الخصم'), max_digits=10, decimal_places=2, blank=True, null=True)
+    # السعر الفعلي (الخصم إن وجد وإلا السعر الأساسي) تحسبه قاعدة البيانات وتبقيه متزامناً حتى مع update()
+    effective_price = models.GeneratedField(
+        verbose_name=_('السعر الفعلي'),
+        expression=Coalesce(NullIf('discount_price', models.Value(0)), 'base_price'),
+        output_field=models.DecimalField(max_digits=10, decimal_places=2),
+        db_persist=True,
+    )
     destinations = models.ManyToManyField(Destination, through='PackageDestination', verbose_name=_('الوجهات'))
     services = models.ManyToManyField(Service, through='PackageService', verbose_name=_('الخدمات'))
     included_services = models.JSONField(_('الخدمات المشمولة'), default=list)
@@ -117,6 +144,8 @@ class Package(models.Model):
         indexes = [
             models.Index(fields=['type', 'is_active']),
             models.Index(fields=['base_price']),
+            models.Index(fields=['is_active', 'created_at', 'id']),
+            models.Index(fields=['is_active', 'effective_price']),
         ]
 
     def __str__(self):
@@ -164,4 +193,108 @@ class PackageService(models.Model):
         ordering = ['day_number', 'time_slot']
 
     def __str__(self):
-        return f"{self.package.title} - {self.service.name} - اليوم {self.day_number}"
\ No newline at end of file
+        return f"{self.package.title} - {self.service.name} - اليوم {self.day_number}"
+
+class PackageDeparture(models.Model):
+    """موعد انطلاق مجدول للباقة مع عدد المقاعد المتاحة فيه"""
+    package = models.ForeignKey(Package, on_delete=models.CASCADE, related_name='departures', verbose_name=_('الباقة'))
+    departure_date = models.DateField(_('تاريخ الانطلاق'))
+    seats = models.PositiveIntegerField(_('عدد المقاعد'))
+    seats_remaining = models.PositiveIntegerField(_('المقاعد المتبقية'))
+    is_active = models.BooleanField(_('نشط'), default=True)
+
+    class Meta:
+        db_table = 'package_departures'
+        verbose_name = _('موعد انطلاق')
+        verbose_name_plural = _('مواعيد الانطلاق')
+        ordering = ['departure_date']
+        constraints = [
+            models.UniqueConstraint(fields=['package', 'departure_date'], name='unique_package_departure_date'),
+            models.CheckConstraint(condition=models.Q(seats_remaining__lte=models.F('seats')), name='package_departure_not_oversold'),
+        ]
+        indexes = [
+            # البحث بنافذة تاريخ وعدد مسافرين: مدى على التاريخ ثم المقاعد دون الرجوع للجدول
+            models.Index(fields=['departure_date', 'seats_remaining', 'package'], condition=models.Q(is_active=True), name='departure_search_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.package.title} - {self.departure_date} ({self.seats_remaining}/{self.seats})"
+
+    def save(self, *args, **kwargs):
+        shifted = False
+        if self.seats_remaining is None:
+            self.seats_remaining = self.seats
+        elif self.pk is not None:
+            previous = type(self).objects.filter(pk=self.pk).values_list('seats', flat=True).first()
+            if previous is not None and previous != self.seats:
+                # تغيير عدد المقاعد يزيح المتبقي بالفرق نفسه؛ يُحسب من القيمة المخزنة لأن الحجوزات تخصمها بـ F()
+                self.seats_remaining = Greatest(models.F('seats_remaining') + (self.seats - previous), 0)
+                shifted = True
+                update_fields = kwargs.get('update_fields')
+                if update_fields is not None and 'seats_remaining' not in update_fields:
+                    kwargs['update_fields'] = [*update_fields, 'seats_remaining']
+        super().save(*args, **kwargs)
+        if shifted:
+            self.refresh_from_db(fields=['seats_remaining'])
+
+class CatalogImportRecord(models.Model):
+    """ربط صفوف ملفات الموردين بسجلات الكتالوج مع بصمة آخر نسخة مستوردة"""
+    model_label = models.CharField(_('النموذج'), max_length=50)
+    external_id = models.CharField(_('المعرف الخارجي'), max_length=100)
+    row_hash = models.CharField(_('بصمة الصف'), max_length=40)
+    object_id = models.PositiveBigIntegerField(_('معرف السجل'))
+    updated_at = models.DateTimeField(_('آخر استيراد'), auto_now=True)
+
+    class Meta:
+        db_table = 'catalog_import_records'
+        verbose_name = _('سجل استيراد')
+        verbose_name_plural = _('سجلات الاستيراد')
+        constraints = [
+            models.UniqueConstraint(fields=['model_label', 'external_id'], name='unique_catalog_import_record'),
+        ]
+
+    def __str__(self):
+        return f"{self.model_label}:{self.external_id}"
+
+class PackageSimilarity(models.Model):
+    """أقرب الباقات المشابهة لكل باقة (محسوبة مسبقاً بأمر rebuild_package_similarity)"""
+    package = models.ForeignKey(Package, on_delete=models.CASCADE, related_name='similarities', verbose_name=_('الباقة'))
+    similar = models.ForeignKey(Package, on_delete=models.CASCADE, related_name='+', verbose_name=_('الباقة المشابهة'))
+    score = models.FloatField(_('درجة التشابه'))
+    rank = models.PositiveSmallIntegerField(_('الترتيب'))
+
+    class Meta:
+        db_table = 'package_similarities'
+        verbose_name = _('تشابه باقة')
+        verbose_name_plural = _('تشابه الباقات')
+        ordering = ['rank']
+        constraints = [
+            models.UniqueConstraint(fields=['package', 'rank'], name='unique_package_similarity_rank'),
+        ]
+
+    def __str__(self):
+        return f"{self.package_id} ~ {self.similar_id} ({self.score:.3f})"
+
+class PackageSimilarityState(models.Model):
+    """بصمة محتوى الباقة عند آخر حساب للتشابه (لإعادة الحساب التدريجي)"""
+    package = models.OneToOneField(Package, on_delete=models.CASCADE, primary_key=True, verbose_name=_('الباقة'))
+    signature = models.CharField(_('البصمة'), max_length=40)
+    computed_at = models.DateTimeField(_('تاريخ الحساب'), auto_now=True)
+
+    class Meta:
+        db_table = 'package_similarity_states'
+        verbose_name = _('حالة تشابه باقة')
+        verbose_name_plural = _('حالات تشابه الباقات')
+
+class CatalogGeneration(models.Model):
+    """رقم جيل كل نموذج من الكتالوج مشتركاً بين كل العمليات (مفاتيح الكاش تعتمد عليه)"""
+    name = models.CharField(_('النموذج'), max_length=50, primary_key=True)
+    value = models.PositiveBigIntegerField(_('الجيل'), default=0)
+
+    class Meta:
+        db_table = 'catalog_generations'
+        verbose_name = _('جيل الكتالوج')
+        verbose_name_plural = _('أجيال الكتالوج')
+
+    def __str__(self):
+        return f"{self.name}: {self.value}"
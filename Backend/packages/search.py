@@ -0,0 +1,280 @@
+import re
+
+from django.conf import settings
+from django.db import connection as default_connection, transaction
+from django.db.models import Q
+
+SQLITE_TABLE = 'packages_fts'
+POSTGRES_TABLE = 'packages_search'
+
+# أوزان الأعمدة: العنوان، الوصف المختصر، الوصف، الوجهات
+COLUMN_WEIGHTS = (10.0, 4.0, 1.0, 6.0)
+
+_TASHKEEL_RE = re.compile('[\u0610-\u061a\u064b-\u065f\u0670\u06d6-\u06ed\u0640]')
+_CHAR_MAP = str.maketrans({
+    'أ': 'ا',
+    'إ': 'ا',
+    'آ': 'ا',
+    'ٱ': 'ا',
+    'ؤ': 'و',
+    'ئ': 'ي',
+    'ى': 'ي',
+    'ة': 'ه',
+})
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def normalize_arabic(text):
+    """توحيد النص العربي: حذف التشكيل والتطويل وتوحيد أشكال الألف والهمزة والتاء المربوطة والياء"""
+    if not text:
+        return ''
+    text = _TASHKEEL_RE.sub('', str(text))
+    return text.translate(_CHAR_MAP).lower()
+
+
+def tokenize(text):
+    """تقسيم النص الموحد إلى كلمات"""
+    return _TOKEN_RE.findall(normalize_arabic(text))
+
+
+def build_document(title, short_description, description, destination_names):
+    """بناء مستند الفهرس لباقة واحدة (قيم موحدة بترتيب أعمدة الفهرس)"""
+    return (
+        normalize_arabic(title),
+        normalize_arabic(short_description),
+        normalize_arabic(description),
+        normalize_arabic(' '.join(destination_names)),
+    )
+
+
+def _candidates_condition(column, candidates):
+    """شرط قصر نتائج الفهرس على الباقات المصفّاة (استعلام فرعي) قبل LIMIT"""
+    if candidates is None:
+        return '', []
+    sql, params = candidates.order_by().values('id').query.sql_with_params()
+    return f' AND {column} IN ({sql})', list(params)
+
+
+class FallbackSearchBackend:
+    """بحث بدون فهرس (icontains) لقواعد البيانات غير المدعومة"""
+
+    def create(self, connection):
+        pass
+
+    def drop(self, connection):
+        pass
+
+    def upsert(self, connection, rows):
+        pass
+
+    def delete(self, connection, package_ids):
+        pass
+
+    def search(self, connection, query, limit, candidates=None):
+        from .models import Package
+
+        condition = Q()
+        for term in query.split():
+            condition &= (
+                Q(title__icontains=term) |
+                Q(description__icontains=term) |
+                Q(short_description__icontains=term) |
+                Q(destinations__name__icontains=term)
+            )
+        queryset = Package.objects.all() if candidates is None else candidates.order_by()
+        return list(
+            queryset.filter(condition).values_list('id', flat=True).distinct()[:limit]
+        )
+
+
+class SQLiteFTSBackend:
+    """فهرس FTS5 على SQLite مع ترتيب BM25"""
+
+    def create(self, connection):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {SQLITE_TABLE} USING fts5("
+                "title, short_description, description, destinations, "
+                "tokenize='unicode61 remove_diacritics 2')"
+            )
+
+    def drop(self, connection):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS {SQLITE_TABLE}')
+
+    def upsert(self, connection, rows):
+        if not rows:
+            return
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'DELETE FROM {SQLITE_TABLE} WHERE rowid = %s',
+                [(package_id,) for package_id, _ in rows]
+            )
+            cursor.executemany(
+                f'INSERT INTO {SQLITE_TABLE} '
+                '(rowid, title, short_description, description, destinations) '
+                'VALUES (%s, %s, %s, %s, %s)',
+                [(package_id, *document) for package_id, document in rows]
+            )
+
+    def delete(self, connection, package_ids):
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'DELETE FROM {SQLITE_TABLE} WHERE rowid = %s',
+                [(package_id,) for package_id in package_ids]
+            )
+
+    def search(self, connection, query, limit, candidates=None):
+        terms = tokenize(query)
+        if not terms:
+            return []
+        match = ' AND '.join(f'"{term}"*' for term in terms)
+        weights = ', '.join(str(weight) for weight in COLUMN_WEIGHTS)
+        condition, params = _candidates_condition('rowid', candidates)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {SQLITE_TABLE} WHERE {SQLITE_TABLE} MATCH %s{condition} '
+                f'ORDER BY bm25({SQLITE_TABLE}, {weights}) LIMIT %s',
+                [match, *params, limit]
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+class PostgresSearchBackend:
+    """فهرس tsvector على PostgreSQL مع فهرس GIN وترتيب ts_rank_cd"""
+
+    def create(self, connection):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE TABLE IF NOT EXISTS {POSTGRES_TABLE} ('
+                'package_id bigint PRIMARY KEY, document tsvector NOT NULL)'
+            )
+            cursor.execute(
+                f'CREATE INDEX IF NOT EXISTS {POSTGRES_TABLE}_document_idx '
+                f'ON {POSTGRES_TABLE} USING GIN (document)'
+            )
+
+    def drop(self, connection):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS {POSTGRES_TABLE}')
+
+    def upsert(self, connection, rows):
+        if not rows:
+            return
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {POSTGRES_TABLE} (package_id, document) VALUES (%s, '
+                "setweight(to_tsvector('simple', %s), 'A') || "
+                "setweight(to_tsvector('simple', %s), 'B') || "
+                "setweight(to_tsvector('simple', %s), 'D') || "
+                "setweight(to_tsvector('simple', %s), 'B')) "
+                'ON CONFLICT (package_id) DO UPDATE SET document = EXCLUDED.document',
+                [(package_id, *document) for package_id, document in rows]
+            )
+
+    def delete(self, connection, package_ids):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {POSTGRES_TABLE} WHERE package_id = ANY(%s)',
+                [list(package_ids)]
+            )
+
+    def search(self, connection, query, limit, candidates=None):
+        terms = tokenize(query)
+        if not terms:
+            return []
+        tsquery = ' & '.join(f'{term}:*' for term in terms)
+        condition, params = _candidates_condition('package_id', candidates)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT package_id FROM {POSTGRES_TABLE}, to_tsquery('simple', %s) query "
+                f'WHERE document @@ query{condition} ORDER BY ts_rank_cd(document, query) DESC LIMIT %s',
+                [tsquery, *params, limit]
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+BACKENDS = {
+    'sqlite': SQLiteFTSBackend,
+    'postgresql': PostgresSearchBackend,
+}
+
+
+def get_backend(connection=None):
+    """اختيار محرك الفهرس المناسب لقاعدة البيانات الحالية"""
+    connection = connection or default_connection
+    return BACKENDS.get(connection.vendor, FallbackSearchBackend)()
+
+
+def search_package_ids(query, limit=None, queryset=None):
+    """معرفات الباقات المطابقة للاستعلام مرتبة من الأعلى صلة إلى الأدنى.
+
+    queryset: الباقات المصفّاة (النشطة وبقية شروط الطلب)؛ يُطبق داخل استعلام الفهرس قبل LIMIT
+    حتى لا تملأ الباقات غير النشطة أو المستبعدة حد SEARCH_MAX_RESULTS.
+    """
+    limit = limit or getattr(settings, 'SEARCH_MAX_RESULTS', 1000)
+    return get_backend().search(default_connection, query, limit, queryset)
+
+
+def index_packages(package_ids):
+    """إعادة فهرسة مجموعة من الباقات (تُستدعى عند تغيّر الباقة أو وجهاتها)"""
+    from .models import Package
+
+    package_ids = set(package_ids)
+    if not package_ids:
+        return
+    packages = Package.objects.filter(id__in=package_ids).prefetch_related('destinations')
+    rows = [
+        (package.id, build_document(
+            package.title,
+            package.short_description,
+            package.description,
+            [destination.name for destination in package.destinations.all()],
+        ))
+        for package in packages
+    ]
+    backend = get_backend()
+    backend.upsert(default_connection, rows)
+    missing = package_ids - {package_id for package_id, _ in rows}
+    if missing:
+        backend.delete(default_connection, missing)
+
+
+def remove_packages(package_ids):
+    """حذف باقات من الفهرس"""
+    if package_ids:
+        get_backend().delete(default_connection, list(package_ids))
+
+
+def schedule_reindex(package_ids):
+    """جدولة إعادة الفهرسة بعد نجاح المعاملة الحالية"""
+    package_ids = list(package_ids)
+    if package_ids:
+        transaction.on_commit(lambda: index_packages(package_ids))
+
+
+def rebuild_index(package_model=None, connection=None, batch_size=500):
+    """إعادة بناء الفهرس بالكامل (يُستخدم في الترحيل وأمر الإدارة)"""
+    if package_model is None:
+        from .models import Package as package_model
+    connection = connection or default_connection
+    backend = get_backend(connection)
+    backend.drop(connection)
+    backend.create(connection)
+
+    packages = package_model.objects.using(connection.alias).order_by('id').prefetch_related('destinations')
+    total = 0
+    batch = []
+    for package in packages.iterator(chunk_size=batch_size):
+        batch.append((package.id, build_document(
+            package.title,
+            package.short_description,
+            package.description,
+            [destination.name for destination in package.destinations.all()],
+        )))
+        if len(batch) >= batch_size:
+            backend.upsert(connection, batch)
+            total += len(batch)
+            batch = []
+    backend.upsert(connection, batch)
+    return total + len(batch)
@@ -59,4 +59,49 @@ class PackageSearchSerializer(serializers.Serializer):
     max_price = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
     min_duration = serializers.IntegerField(required=False)
     max_duration = serializers.IntegerField(required=False)
-    is_featured = serializers.BooleanField(required=False)
\ No newline at end of file
+    is_featured = serializers.BooleanField(required=False)
+    departure_from = serializers.DateField(required=False)
+    departure_to = serializers.DateField(required=False)
+    travelers = serializers.IntegerField(required=False, min_value=1)
+    facets = serializers.BooleanField(required=False, default=False)
+
+    def validate(self, data):
+        if data.get('departure_from') and data.get('departure_to') and data['departure_from'] > data['departure_to']:
+            raise serializers.ValidationError("بداية نافذة الانطلاق يجب أن تسبق نهايتها")
+        return data
+
+class DepartureCalendarSerializer(serializers.Serializer):
+    month = serializers.DateField(input_formats=['%Y-%m'])
+    travelers = serializers.IntegerField(required=False, min_value=1)
+
+class NearbySearchSerializer(serializers.Serializer):
+    lat = serializers.FloatField(required=False, min_value=-90, max_value=90)
+    lng = serializers.FloatField(required=False, min_value=-180, max_value=180)
+    destination = serializers.IntegerField(required=False)
+    radius_km = serializers.FloatField(default=50, min_value=0.1, max_value=1000)
+    type = serializers.CharField(required=False)
+    limit = serializers.IntegerField(default=20, min_value=1, max_value=100)
+
+    def validate(self, data):
+        has_point = data.get('lat') is not None and data.get('lng') is not None
+        if not has_point and not data.get('destination'):
+            raise serializers.ValidationError("يجب تحديد الإحداثيات (lat, lng) أو وجهة مرجعية")
+        return data
+
+class NearbyDestinationSerializer(DestinationSerializer):
+    distance_km = serializers.FloatField(read_only=True)
+
+class NearbyServiceSerializer(ServiceSerializer):
+    distance_km = serializers.FloatField(read_only=True)
+
+class NearbyPackageSerializer(PackageListSerializer):
+    distance_km = serializers.FloatField(read_only=True)
+
+    class Meta(PackageListSerializer.Meta):
+        fields = PackageListSerializer.Meta.fields + ['distance_km']
+
+class SimilarPackageSerializer(PackageListSerializer):
+    similarity_score = serializers.FloatField(read_only=True)
+
+    class Meta(PackageListSerializer.Meta):
+        fields = PackageListSerializer.Meta.fields + ['similarity_score']
@@ -0,0 +1,78 @@
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+from .models import Destination, Service, Package, PackageDestination, PackageService, PackageDeparture
+from . import catalog_cache, search
+
+
+@receiver(post_save, sender=Package)
+def package_saved(sender, instance, raw=False, **kwargs):
+    """تحديث فهرس البحث عند حفظ الباقة"""
+    if not raw:
+        search.schedule_reindex([instance.pk])
+
+
+@receiver(post_delete, sender=Package)
+def package_deleted(sender, instance, **kwargs):
+    """حذف الباقة من فهرس البحث"""
+    search.remove_packages([instance.pk])
+
+
+@receiver(post_save, sender=Destination)
+def destination_saved(sender, instance, raw=False, **kwargs):
+    """إعادة فهرسة الباقات التي تمر بالوجهة عند تعديلها"""
+    if not raw:
+        search.schedule_reindex(
+            PackageDestination.objects.filter(destination=instance).values_list('package_id', flat=True)
+        )
+
+
+@receiver(post_save, sender=PackageDestination)
+@receiver(post_delete, sender=PackageDestination)
+def package_destination_changed(sender, instance, raw=False, **kwargs):
+    """إعادة فهرسة الباقة عند إضافة أو حذف إحدى وجهاتها"""
+    if not raw:
+        search.schedule_reindex([instance.package_id])
+
+
+@receiver(m2m_changed, sender=Package.destinations.through)
+def package_destinations_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """إعادة الفهرسة عند تعديل وجهات الباقة عبر علاقة many-to-many"""
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            search.schedule_reindex([instance.pk])
+    elif action == 'pre_clear':
+        # بعد المسح لا نعرف الباقات المتأثرة، لذا نجمعها قبله
+        search.schedule_reindex(
+            PackageDestination.objects.filter(destination=instance).values_list('package_id', flat=True)
+        )
+    elif action in ('post_add', 'post_remove') and pk_set:
+        search.schedule_reindex(pk_set)
+
+
+CATALOG_DEPENDENCIES = {
+    Package: ('package',),
+    Destination: ('destination',),
+    Service: ('service',),
+    PackageDestination: ('package',),
+    PackageService: ('package',),
+    PackageDeparture: ('departure',),
+}
+
+
+def catalog_changed(sender, raw=False, **kwargs):
+    """رفع أرقام أجيال الكتالوج لإبطال الردود المخزنة مؤقتاً"""
+    if not raw:
+        catalog_cache.bump_generation_on_commit(*CATALOG_DEPENDENCIES[sender])
+
+
+# مستقبل لكل نموذج بدل مستقبل عام: المستقبل دون sender يمنع الحذف السريع في كل النماذج
+for model in CATALOG_DEPENDENCIES:
+    post_save.connect(catalog_changed, sender=model, dispatch_uid=f'catalog_changed:save:{model._meta.label}')
+    post_delete.connect(catalog_changed, sender=model, dispatch_uid=f'catalog_changed:delete:{model._meta.label}')
+
+
+@receiver(m2m_changed, sender=Package.destinations.through)
+@receiver(m2m_changed, sender=Package.services.through)
+def catalog_relations_changed(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        catalog_cache.bump_generation_on_commit('package')
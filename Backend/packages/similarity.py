@@ -0,0 +1,272 @@
+import hashlib
+import time
+from collections import Counter
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+
+from .search import tokenize
+
+# وزن تشابه النص مقابل الخصائص الرقمية (النوع، المدة، السعر)
+TEXT_WEIGHT = 0.75
+FEATURE_WEIGHT = 0.25
+# كلمات العنوان تُكرر لتأخذ وزناً أكبر من الوصف
+TITLE_BOOST = 2
+# الكلمات الموجودة في أكثر من هذه النسبة من الباقات تُعامل ككلمات شائعة وتُهمل
+MAX_DOCUMENT_FREQUENCY = 0.5
+BATCH_SIZE = 256
+# حد خلايا مصفوفة الدرجات لكل دفعة (صفوف الدفعة × عدد الباقات): الذاكرة ثابتة مهما كبر الكتالوج
+MAX_BATCH_CELLS = 1 << 21
+
+
+def _batch_rows(size):
+    """عدد صفوف الدفعة بحيث لا تتجاوز مصفوفة الدرجات MAX_BATCH_CELLS خلية"""
+    return max(1, min(BATCH_SIZE, MAX_BATCH_CELLS // max(size, 1)))
+
+
+def _ranges(starts, lengths):
+    """فهارس المقاطع [start, start + length) متتالية دون حلقة بايثون"""
+    offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+    return offsets + np.arange(int(lengths.sum()))
+
+
+class PackageVectors:
+    """متجهات TF-IDF متفرقة (CSR) لنصوص الباقات مع خصائصها الرقمية"""
+
+    def __init__(self, ids, indptr, indices, data, term_count, types, durations, prices):
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.size = len(self.ids)
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+        self.types = types
+        self.log_durations = np.log1p(durations)
+        self.log_prices = np.log1p(prices)
+        self.position = {int(package_id): position for position, package_id in enumerate(self.ids)}
+
+        # نسخة حسب الكلمة (CSC) ليكون ضرب المتجهات بقدر القيم غير الصفرية فقط
+        order = np.argsort(indices, kind='stable')
+        self.col_ptr = np.zeros(term_count + 1, dtype=np.int64)
+        np.cumsum(np.bincount(indices, minlength=term_count), out=self.col_ptr[1:])
+        rows = np.repeat(np.arange(self.size), np.diff(indptr))
+        self.col_rows = rows[order]
+        self.col_data = data[order]
+
+    @classmethod
+    def build(cls, documents):
+        """documents: قائمة (المعرف، الكلمات، النوع، عدد الأيام، السعر الفعلي)"""
+        vocabulary = {}
+        counts = []
+        for _, tokens, *_ in documents:
+            counts.append(Counter(vocabulary.setdefault(token, len(vocabulary)) for token in tokens))
+        size = len(documents)
+
+        indptr = np.zeros(size + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum([len(counter) for counter in counts])
+        indices = np.fromiter(
+            (term for counter in counts for term in counter), dtype=np.int64, count=int(indptr[-1])
+        )
+        tf = np.fromiter(
+            (count for counter in counts for count in counter.values()), dtype=np.float64, count=int(indptr[-1])
+        )
+
+        document_frequency = np.bincount(indices, minlength=len(vocabulary))
+        idf = np.log((1 + size) / (1 + document_frequency)) + 1.0
+        weights = (1.0 + np.log(tf)) * idf[indices]
+        # حذف الكلمات الشائعة قبل التطبيع، ثم الكلمات الفريدة بعده (لا تساهم في التشابه بين باقتين)
+        weights[document_frequency[indices] > max(2, MAX_DOCUMENT_FREQUENCY * size)] = 0.0
+        rows = np.repeat(np.arange(size), np.diff(indptr))
+        norms = np.sqrt(np.bincount(rows, weights=weights ** 2, minlength=size))
+        weights /= np.where(norms > 0, norms, 1.0)[rows]
+        keep = (weights > 0) & (document_frequency[indices] > 1)
+
+        indptr = np.zeros(size + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum(np.bincount(rows[keep], minlength=size))
+        type_codes = {}
+        return cls(
+            [document[0] for document in documents],
+            indptr,
+            indices[keep],
+            weights[keep].astype(np.float32),
+            len(vocabulary),
+            np.array([type_codes.setdefault(document[2], len(type_codes)) for document in documents], dtype=np.int32),
+            np.array([document[3] for document in documents], dtype=np.float64),
+            np.array([float(document[4]) for document in documents], dtype=np.float64),
+        )
+
+    def text_scores(self, rows):
+        """تشابه جيب التمام النصي بين الصفوف المحددة وكل الباقات (مصفوفة len(rows) × size)"""
+        starts = self.indptr[rows]
+        lengths = self.indptr[rows + 1] - starts
+        positions = _ranges(starts, lengths)
+        owners = np.repeat(np.arange(len(rows)), lengths)
+        terms = self.indices[positions]
+
+        column_starts = self.col_ptr[terms]
+        column_lengths = self.col_ptr[terms + 1] - column_starts
+        postings = _ranges(column_starts, column_lengths)
+        products = np.repeat(self.data[positions], column_lengths) * self.col_data[postings]
+        cells = np.repeat(owners, column_lengths) * self.size + self.col_rows[postings]
+        return np.bincount(cells, weights=products, minlength=len(rows) * self.size).reshape(len(rows), self.size)
+
+    def feature_scores(self, rows):
+        """تشابه الخصائص: تطابق النوع وقرب المدة والسعر على مقياس لوغاريتمي"""
+        same_type = self.types[rows][:, np.newaxis] == self.types[np.newaxis, :]
+        duration = np.exp(-np.abs(self.log_durations[rows][:, np.newaxis] - self.log_durations[np.newaxis, :]))
+        price = np.exp(-np.abs(self.log_prices[rows][:, np.newaxis] - self.log_prices[np.newaxis, :]))
+        return (same_type + duration + price) / 3.0
+
+    def scores(self, rows):
+        rows = np.asarray(rows, dtype=np.int64)
+        combined = TEXT_WEIGHT * self.text_scores(rows) + FEATURE_WEIGHT * self.feature_scores(rows)
+        combined[np.arange(len(rows)), rows] = -np.inf
+        return combined
+
+    def top_k(self, rows, k):
+        """أقرب k باقة لكل صف: {المعرف: [(المعرف المشابه، الدرجة)، ...]}"""
+        k = min(k, self.size - 1)
+        if k <= 0:
+            return {int(self.ids[row]): [] for row in rows}
+        result = {}
+        batch_rows = _batch_rows(self.size)
+        for start in range(0, len(rows), batch_rows):
+            batch = np.asarray(rows[start:start + batch_rows], dtype=np.int64)
+            scores = self.scores(batch)
+            candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            candidate_scores = np.take_along_axis(scores, candidates, axis=1)
+            order = np.argsort(-candidate_scores, axis=1, kind='stable')
+            candidates = np.take_along_axis(candidates, order, axis=1)
+            candidate_scores = np.take_along_axis(candidate_scores, order, axis=1)
+            for row, neighbours, values in zip(batch, candidates, candidate_scores):
+                result[int(self.ids[row])] = [
+                    (int(self.ids[neighbour]), round(float(value), 6)) for neighbour, value in zip(neighbours, values)
+                ]
+        return result
+
+
+def package_documents():
+    """المستندات والبصمات لكل الباقات النشطة"""
+    from .models import Package
+
+    documents = []
+    signatures = {}
+    packages = (
+        Package.objects.filter(is_active=True).order_by('id')
+        .only('id', 'title', 'description', 'type', 'duration_days', 'effective_price')
+        .prefetch_related('destinations')
+    )
+    for package in packages.iterator(chunk_size=1000):
+        names = ' '.join(destination.name for destination in package.destinations.all())
+        tokens = tokenize(package.title) * TITLE_BOOST + tokenize(package.description) + tokenize(names)
+        documents.append((package.id, tokens, package.type, package.duration_days, package.effective_price))
+        raw = '\x1f'.join(map(str, (
+            package.title, package.description, names, package.type, package.duration_days, package.effective_price
+        )))
+        signatures[package.id] = hashlib.sha1(raw.encode('utf-8')).hexdigest()
+    return documents, signatures
+
+
+def _merge(current, additions, k):
+    merged = dict(current)
+    merged.update(additions)
+    return sorted(merged.items(), key=lambda item: (-item[1], item[0]))[:k]
+
+
+def rebuild(full=False, top_k=None):
+    """إعادة حساب الباقات المشابهة؛ تدريجياً افتراضياً (الباقات المتغيرة ومن تتأثر قوائمهم فقط)"""
+    from .models import PackageSimilarity, PackageSimilarityState
+
+    top_k = top_k or getattr(settings, 'SIMILARITY_TOP_K', 10)
+    timings = {}
+    started = time.perf_counter()
+    documents, signatures = package_documents()
+    timings['load'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    vectors = PackageVectors.build(documents)
+    timings['vectorize'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    stored = dict(PackageSimilarityState.objects.values_list('package_id', 'signature'))
+    neighbours = {}
+    if not full:
+        for package_id, similar_id, score in PackageSimilarity.objects.order_by(
+            'package_id', 'rank'
+        ).values_list('package_id', 'similar_id', 'score'):
+            neighbours.setdefault(package_id, []).append((similar_id, score))
+
+    removed = set(stored) - set(signatures)
+    changed = {
+        package_id for package_id, signature in signatures.items()
+        if full or stored.get(package_id) != signature
+    }
+    # التغيير الواسع يجعل إعادة الحساب الكاملة أرخص من الدمج
+    if len(changed) * 4 > vectors.size:
+        changed = set(signatures)
+    touched = changed | removed
+    recompute = set(changed)
+    for package_id in signatures:
+        current = neighbours.get(package_id)
+        if current is None or len(current) < min(top_k, vectors.size - 1) or any(
+            similar_id in touched for similar_id, _ in current
+        ):
+            recompute.add(package_id)
+
+    results = vectors.top_k([vectors.position[package_id] for package_id in sorted(recompute)], top_k)
+
+    # بقية الباقات: التشابه متماثل، فتُدمج درجات الباقات المتغيرة مع القوائم الحالية
+    if changed and len(recompute) < vectors.size:
+        changed_rows = [vectors.position[package_id] for package_id in sorted(changed)]
+        batch_rows = _batch_rows(vectors.size)
+        for start in range(0, len(changed_rows), batch_rows):
+            batch = changed_rows[start:start + batch_rows]
+            scores = vectors.scores(np.asarray(batch, dtype=np.int64))
+            for package_id, current in neighbours.items():
+                if package_id in recompute or package_id not in vectors.position:
+                    continue
+                column = scores[:, vectors.position[package_id]]
+                additions = {
+                    int(vectors.ids[row]): round(float(value), 6)
+                    for row, value in zip(batch, column) if np.isfinite(value)
+                }
+                merged = _merge(results.get(package_id, current), additions, top_k)
+                if merged != current:
+                    results[package_id] = merged
+    timings['similarity'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    with transaction.atomic():
+        PackageSimilarity.objects.filter(package_id__in=set(results) | removed).delete()
+        PackageSimilarity.objects.filter(similar_id__in=removed).delete()
+        PackageSimilarity.objects.bulk_create([
+            PackageSimilarity(package_id=package_id, similar_id=similar_id, score=score, rank=rank)
+            for package_id, items in results.items()
+            for rank, (similar_id, score) in enumerate(items, start=1)
+        ], batch_size=1000)
+        PackageSimilarityState.objects.filter(package_id__in=changed | removed).delete()
+        PackageSimilarityState.objects.bulk_create([
+            PackageSimilarityState(package_id=package_id, signature=signatures[package_id])
+            for package_id in changed
+        ], batch_size=1000)
+    timings['write'] = time.perf_counter() - started
+
+    return {
+        'packages': vectors.size,
+        'changed': len(changed),
+        'removed': len(removed),
+        'updated': len(results),
+        'timings': {name: round(value, 3) for name, value in timings.items()},
+    }
+
+
+def similar_packages(package_id, limit=None):
+    """الباقات المشابهة النشطة لباقة (بحث واحد على الفهرس (package, rank))"""
+    from .models import PackageSimilarity
+
+    queryset = PackageSimilarity.objects.filter(
+        package_id=package_id, similar__is_active=True
+    ).select_related('similar').prefetch_related('similar__destinations').order_by('rank')
+    if limit:
+        queryset = queryset[:limit]
+    return list(queryset)
@@ -0,0 +1,448 @@
+import atexit
+import bisect
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import threading
+import time
+from array import array
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from .catalog_cache import get_generations
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'TCSNAP\x00\x00'
+FORMAT_VERSION = 2
+_PREFIX = struct.Struct('<8sII')
+_ALIGNMENT = 8
+GENERATION_MODELS = ('destination', 'service', 'package')
+
+# أعمدة كل جدول: (الاسم، رمز المصفوفة). الرمز 'S' عمود نصي يحمل فهارس في جدول النصوص
+DESTINATION_COLUMNS = (
+    ('id', 'q'), ('name', 'S'), ('type', 'S'), ('governorate', 'S'), ('description', 'S'),
+    ('best_season', 'S'), ('latitude', 'd'), ('longitude', 'd'), ('popularity_score', 'q'),
+)
+SERVICE_COLUMNS = (
+    ('id', 'q'), ('name', 'S'), ('type', 'S'), ('level', 'S'), ('destination_id', 'q'),
+    ('price_per_unit', 'd'), ('unit_description', 'S'), ('capacity', 'q'), ('rating', 'd'),
+    ('persons_per_unit', 'q'),
+)
+PACKAGE_COLUMNS = (
+    ('id', 'q'), ('title', 'S'), ('type', 'S'), ('short_description', 'S'), ('duration_days', 'q'),
+    ('base_price', 'd'), ('effective_price', 'd'), ('popularity_count', 'q'), ('is_featured', 'b'),
+)
+
+
+def _generation_key(generations):
+    return ','.join(f'{name}:{generations[name]}' for name in GENERATION_MODELS)
+
+
+class _StringTable:
+    """جدول نصوص موحد: كل نص يُخزن مرة واحدة وتشير إليه الأعمدة برقمه"""
+
+    def __init__(self):
+        self.index = {}
+        self.blob = bytearray()
+        self.offsets = array('Q', [0])
+
+    def add(self, value):
+        value = value or ''
+        position = self.index.get(value)
+        if position is None:
+            position = self.index[value] = len(self.offsets) - 1
+            self.blob += value.encode('utf-8')
+            self.offsets.append(len(self.blob))
+        return position
+
+
+def _columns(rows, columns, strings):
+    arrays = {}
+    for position, (name, typecode) in enumerate(columns):
+        if typecode == 'S':
+            arrays[name] = array('I', (strings.add(row[position]) for row in rows))
+        else:
+            arrays[name] = array(typecode, (row[position] if row[position] is not None else -1 for row in rows))
+    return arrays
+
+
+def build_snapshot(path=None):
+    """كتابة لقطة الكتالوج النشط إلى ملف جديد ثم استبدال الملف الحالي ذرياً"""
+    from .models import Destination, Package, PackageDestination, Service
+
+    path = path or settings.CATALOG_SNAPSHOT_PATH
+    # الجيل يُقرأ قبل الاستعلام: أي تعديل أثناء البناء يجعل اللقطة قديمة فتُبنى من جديد (rebuild_if_stale)
+    generations = get_generations(GENERATION_MODELS)
+
+    strings = _StringTable()
+    destinations = list(
+        Destination.objects.filter(is_active=True).order_by('id')
+        .values_list(*[name for name, _ in DESTINATION_COLUMNS])
+    )
+    services = list(
+        Service.objects.filter(is_active=True, destination__is_active=True).order_by('id')
+        .values_list(*[name for name, _ in SERVICE_COLUMNS])
+    )
+    packages = list(
+        Package.objects.filter(is_active=True).order_by('id')
+        .values_list(*[name for name, _ in PACKAGE_COLUMNS])
+    )
+    links = PackageDestination.objects.filter(
+        package__is_active=True, destination__is_active=True
+    ).order_by('package_id', 'visit_order').values_list('package_id', 'destination_id')
+
+    # وجهات كل باقة بصيغة CSR: مؤشرات بداية لكل باقة ومصفوفة واحدة للمعرفات
+    package_positions = {row[0]: position for position, row in enumerate(packages)}
+    package_destinations = [[] for _ in packages]
+    for package_id, destination_id in links.iterator():
+        package_destinations[package_positions[package_id]].append(destination_id)
+    indptr = array('Q', [0])
+    flat = array('q')
+    for destination_ids in package_destinations:
+        flat.extend(destination_ids)
+        indptr.append(len(flat))
+
+    sections = {}
+    for table, rows, columns in (
+        ('destinations', destinations, DESTINATION_COLUMNS),
+        ('services', services, SERVICE_COLUMNS),
+        ('packages', packages, PACKAGE_COLUMNS),
+    ):
+        for name, values in _columns(rows, columns, strings).items():
+            sections[f'{table}.{name}'] = values
+    sections['packages.destinations_indptr'] = indptr
+    sections['packages.destinations'] = flat
+    sections['strings.offsets'] = strings.offsets
+    sections['strings.blob'] = array('B', strings.blob)
+
+    header = {
+        'generation': _generation_key(generations),
+        'byteorder': sys.byteorder,
+        'built_at': time.time(),
+        'counts': {'destinations': len(destinations), 'services': len(services), 'packages': len(packages)},
+        'sections': {},
+    }
+    # حساب الإزاحات بعد معرفة طول الترويسة (مع محاذاة كل قسم)
+    payload = []
+    offset = 0
+    for name, values in sections.items():
+        data = values.tobytes()
+        header['sections'][name] = [values.typecode, offset, len(values)]
+        payload.append(data + b'\x00' * (-len(data) % _ALIGNMENT))
+        offset += len(payload[-1])
+    header_bytes = json.dumps(header).encode('utf-8')
+    header_bytes += b' ' * (-(_PREFIX.size + len(header_bytes)) % _ALIGNMENT)
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    descriptor, temp_path = tempfile.mkstemp(dir=directory, prefix='.catalog-', suffix='.tmp')
+    try:
+        with os.fdopen(descriptor, 'wb') as handle:
+            handle.write(_PREFIX.pack(MAGIC, FORMAT_VERSION, len(header_bytes)))
+            handle.write(header_bytes)
+            for data in payload:
+                handle.write(data)
+            handle.flush()
+            os.fsync(handle.fileno())
+        # الاستبدال ذري: العمليات التي فتحت الملف القديم تحتفظ بصفحاته حتى تعيد التحميل
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+    return header
+
+
+def _column(name):
+    def getter(self):
+        return self._table.columns[name][self._row]
+    return property(getter)
+
+
+def _string_column(name):
+    def getter(self):
+        return self._table.snapshot.string(self._table.columns[name][self._row])
+    return property(getter)
+
+
+class _Record:
+    """مؤشر خفيف على صف في الجدول: الحقول تُقرأ من الذاكرة المعيّنة عند الوصول إليها"""
+    __slots__ = ('_table', '_row')
+
+    def __init__(self, table, row):
+        self._table = table
+        self._row = row
+
+    def __eq__(self, other):
+        return type(other) is type(self) and other._table is self._table and other._row == self._row
+
+    def __hash__(self):
+        return hash((id(self._table), self._row))
+
+    def __repr__(self):
+        return f'<{type(self).__name__} {self.id}>'
+
+
+def _record_class(class_name, columns, extra=None):
+    attributes = {'__slots__': (), 'string_columns': frozenset(name for name, typecode in columns if typecode == 'S')}
+    for name, typecode in columns:
+        attributes[name] = _string_column(name) if typecode == 'S' else _column(name)
+    attributes.update(extra or {})
+    return type(class_name, (_Record,), attributes)
+
+
+def _package_destination_ids(self):
+    indptr = self._table.columns['destinations_indptr']
+    return self._table.columns['destinations'][indptr[self._row]:indptr[self._row + 1]]
+
+
+def _optional_column(name):
+    # القيمة غير المحددة مخزنة كـ -1 في العمود
+    def getter(self):
+        value = self._table.columns[name][self._row]
+        return value if value >= 0 else None
+    return property(getter)
+
+
+DestinationRecord = _record_class('DestinationRecord', DESTINATION_COLUMNS)
+ServiceRecord = _record_class('ServiceRecord', SERVICE_COLUMNS, {
+    'capacity': _optional_column('capacity'),
+    'persons_per_unit': _optional_column('persons_per_unit'),
+})
+PackageRecord = _record_class('PackageRecord', PACKAGE_COLUMNS, {
+    'destination_ids': property(_package_destination_ids),
+})
+
+
+class _Rows:
+    """تسلسل سجلات فوق مصفوفة أرقام صفوف؛ السجل يُنشأ عند الوصول إليه فقط"""
+    __slots__ = ('_table', '_rows')
+
+    def __init__(self, table, rows):
+        self._table = table
+        self._rows = rows
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return _Rows(self._table, self._rows[index])
+        return self._table.record(self._rows[index])
+
+    def __iter__(self):
+        record = self._table.record
+        for row in self._rows:
+            yield record(row)
+
+
+class _Table:
+    """جدول للقراءة فقط فوق أعمدة الملف المعيّن في الذاكرة.
+
+    لا تُنشأ كائنات للصفوف عند التحميل: الفهارس مصفوفات أرقام صفوف، والسجلات مؤشرات تُنشأ عند الطلب.
+    """
+
+    def __init__(self, snapshot, name, record_class, group_by=()):
+        self.snapshot = snapshot
+        self.record_class = record_class
+        self.columns = {
+            key.split('.', 1)[1]: view
+            for key, view in snapshot.sections.items() if key.startswith(f'{name}.')
+        }
+        self.groups = {column: self._group(column) for column in group_by}
+
+    def _group(self, column):
+        rows = {}
+        for row, value in enumerate(self.columns[column]):
+            positions = rows.get(value)
+            if positions is None:
+                positions = rows[value] = array('I')
+            positions.append(row)
+        if column in self.record_class.string_columns:
+            return {self.snapshot.string(position): positions for position, positions in rows.items()}
+        return rows
+
+    def record(self, row):
+        return self.record_class(self, row)
+
+    def get(self, record_id):
+        ids = self.columns['id']
+        row = bisect.bisect_left(ids, record_id)
+        if row < len(ids) and ids[row] == record_id:
+            return self.record(row)
+        return None
+
+    def by(self, column, value):
+        return _Rows(self, self.groups[column].get(value, array('I')))
+
+    def __iter__(self):
+        return iter(_Rows(self, range(len(self))))
+
+    def __len__(self):
+        return len(self.columns['id'])
+
+
+class CatalogSnapshot:
+    """لقطة كتالوج معيّنة في الذاكرة (mmap) تتشارك العمليات صفحاتها"""
+
+    def __init__(self, path):
+        with open(path, 'rb') as handle:
+            self._mmap = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        buffer = memoryview(self._mmap)
+        magic, version, header_length = _PREFIX.unpack_from(buffer)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError('ملف لقطة الكتالوج غير متوافق')
+        header = json.loads(bytes(buffer[_PREFIX.size:_PREFIX.size + header_length]))
+        if header['byteorder'] != sys.byteorder:
+            raise ValueError('ملف لقطة الكتالوج كُتب بترتيب بايتات مختلف')
+
+        self.path = path
+        self.generation = header['generation']
+        self.built_at = header['built_at']
+        start = _PREFIX.size + header_length
+        self.sections = {}
+        for name, (typecode, offset, length) in header['sections'].items():
+            itemsize = array(typecode).itemsize
+            self.sections[name] = buffer[start + offset:start + offset + length * itemsize].cast(typecode)
+
+        self._strings = {}
+        self.destinations = _Table(self, 'destinations', DestinationRecord, ('type', 'governorate'))
+        self.services = _Table(self, 'services', ServiceRecord, ('type', 'destination_id'))
+        self.packages = _Table(self, 'packages', PackageRecord, ('type',))
+
+    def string(self, position):
+        """النص رقم position، يُفك ترميزه مرة واحدة ويُوحَّد (intern) لتتشارك السجلات الكائن نفسه"""
+        value = self._strings.get(position)
+        if value is None:
+            offsets = self.sections['strings.offsets']
+            raw = self.sections['strings.blob'][offsets[position]:offsets[position + 1]]
+            value = self._strings[position] = sys.intern(bytes(raw).decode('utf-8'))
+        return value
+
+    def destination(self, destination_id):
+        return self.destinations.get(destination_id)
+
+    def service(self, service_id):
+        return self.services.get(service_id)
+
+    def package(self, package_id):
+        return self.packages.get(package_id)
+
+    def destinations_by_type(self, destination_type):
+        return self.destinations.by('type', destination_type)
+
+    def destinations_by_governorate(self, governorate):
+        return self.destinations.by('governorate', governorate)
+
+    def services_by_type(self, service_type):
+        return self.services.by('type', service_type)
+
+    def services_for_destination(self, destination_id):
+        return self.services.by('destination_id', destination_id)
+
+    def packages_by_type(self, package_type):
+        return self.packages.by('type', package_type)
+
+
+_lock = threading.Lock()
+_state = {'snapshot': None, 'checked_at': 0.0, 'worker': None, 'atexit_registered': False}
+_rebuild = threading.Event()
+# مهلة تجميع التعديلات المتتالية (حفظ باقة مع وجهاتها) في إعادة بناء واحدة
+REBUILD_DELAY = 0.5
+
+
+def _read_generation(path):
+    try:
+        with open(path, 'rb') as handle:
+            magic, version, header_length = _PREFIX.unpack(handle.read(_PREFIX.size))
+            if magic != MAGIC or version != FORMAT_VERSION:
+                return None
+            return json.loads(handle.read(header_length))['generation']
+    except (OSError, ValueError, KeyError, struct.error):
+        return None
+
+
+def rebuild_if_stale(path=None):
+    """إعادة بناء اللقطة إن كان جيلها أقدم من أجيال الكتالوج في قاعدة البيانات؛ يعيد True إن بُنيت"""
+    path = path or settings.CATALOG_SNAPSHOT_PATH
+    built = False
+    # بانيان متزامنان قد يستبدل الأبطأ منهما لقطة أحدث بلقطته: يُعاد البناء حتى يطابق الملف الجيل الحالي
+    while _read_generation(path) != _generation_key(get_generations(GENERATION_MODELS)):
+        build_snapshot(path)
+        built = True
+    return built
+
+
+def schedule_rebuild():
+    """طلب إعادة بناء اللقطة في الخيط الخلفي لهذه العملية (تُستدعى بعد رفع أجيال الكتالوج)"""
+    with _lock:
+        if _state['worker'] is None or not _state['worker'].is_alive():
+            worker = threading.Thread(target=_run, name='catalog-snapshot', daemon=True)
+            _state['worker'] = worker
+            worker.start()
+            if not _state['atexit_registered']:
+                # أوامر الإدارة (الاستيراد) تنتهي قبل أن يستيقظ الخيط الخلفي
+                atexit.register(_rebuild_at_exit)
+                _state['atexit_registered'] = True
+    _rebuild.set()
+
+
+def _rebuild_pending():
+    if _rebuild.is_set():
+        _rebuild.clear()
+        rebuild_if_stale()
+
+
+def _rebuild_at_exit():
+    try:
+        _rebuild_pending()
+    except Exception:
+        logger.exception('Catalog snapshot rebuild at exit failed')
+
+
+def _run():
+    while True:
+        _rebuild.wait()
+        time.sleep(REBUILD_DELAY)
+        try:
+            _rebuild_pending()
+        except Exception:
+            logger.exception('Catalog snapshot rebuild failed')
+        finally:
+            close_old_connections()
+
+
+def get_snapshot():
+    """اللقطة الحالية؛ يُتحقق من ملف اللقطة كل CATALOG_SNAPSHOT_CHECK_INTERVAL ثانية على الأكثر.
+
+    الطلبات لا تعيد البناء: الملف يُبنى بأمر build_catalog_snapshot أو بعد تعديل الكتالوج (schedule_rebuild)،
+    وكل عملية تعيد تحميله عند تغيّر جيله. البناء هنا فقط عند غياب الملف تماماً (أول تشغيل).
+    ويُقارن جيل الملف بأجيال الكتالوج في قاعدة البيانات: إن كان أقدم (توقفت العملية التي عدّلت الكتالوج
+    قبل إعادة البناء) تعيد هذه العملية بناءه في خيطها الخلفي.
+    """
+    snapshot = _state['snapshot']
+    interval = getattr(settings, 'CATALOG_SNAPSHOT_CHECK_INTERVAL', 2)
+    if snapshot is not None and time.monotonic() - _state['checked_at'] < interval:
+        return snapshot
+
+    with _lock:
+        snapshot = _state['snapshot']
+        if snapshot is not None and time.monotonic() - _state['checked_at'] < interval:
+            return snapshot
+        path = settings.CATALOG_SNAPSHOT_PATH
+        generation = _read_generation(path)
+        if generation is None:
+            build_snapshot(path)
+            generation = _read_generation(path)
+        elif generation != _generation_key(get_generations(GENERATION_MODELS)):
+            schedule_rebuild()
+        if snapshot is None or snapshot.generation != generation:
+            # الاستبدال ذري: القراء الحاليون يكملون على اللقطة القديمة حتى يتركوها
+            snapshot = _state['snapshot'] = CatalogSnapshot(path)
+        _state['checked_at'] = time.monotonic()
+        return snapshot
@@ -1,3 +1,731 @@
-from django.test import TestCase
+import itertools
+import os
+import tempfile
+from datetime import date
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache, caches
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from travel_core.pagination import KeysetPagination
+from . import catalog_cache, counters, distances, facets, geo, importer, search, similarity, snapshot
+from .models import (
+    CatalogImportRecord, Destination, Package, PackageDestination, PackageSimilarity, Service
+)
+
+
+def create_destination(name, **kwargs):
+    return Destination.objects.create(
+        name=name, type=kwargs.pop('type', 'historical'), description=f'{name} وصف',
+        governorate=kwargs.pop('governorate', 'حلب'), latitude=kwargs.pop('latitude', 36.2),
+        longitude=kwargs.pop('longitude', 37.15),
+        best_season='الربيع', **kwargs
+    )
+
+
+def create_package(title, destinations=(), **kwargs):
+    package = Package.objects.create(
+        title=title, type=kwargs.pop('type', 'cultural'), description=kwargs.pop('description', 'وصف'),
+        short_description=kwargs.pop('short_description', 'مختصر'), duration_days=3,
+        base_price=kwargs.pop('base_price', Decimal('100')), daily_schedule={}, terms_conditions='-', cancellation_policy='-', **kwargs
+    )
+    for order, destination in enumerate(destinations, start=1):
+        PackageDestination.objects.create(package=package, destination=destination, visit_order=order, duration_hours=3)
+    return package
+
+
+class PackageSearchTests(TestCase):
+    """البحث عبر فهرس النص الكامل: الترتيب حسب الصلة وتطبيق التصفية قبل حد النتائج"""
+
+    def setUp(self):
+        cache.clear()
+        citadel = create_destination('قلعة سمعان')
+        self.in_title = create_package('جولة قلعة حلب')
+        self.in_description = create_package('جولة المدينة', description='زيارة قلعة قديمة')
+        self.in_destination = create_package('يوم في حلب', [citadel])
+        self.inactive = create_package('قلعة مغلقة', is_active=False)
+        search.index_packages(Package.objects.values_list('id', flat=True))
+
+    def test_normalize_arabic(self):
+        self.assertEqual(search.normalize_arabic('إِسْلامٌ'), 'اسلام')
+        self.assertEqual(search.normalize_arabic('مدرسة مستشفى'), 'مدرسه مستشفي')
+
+    def test_title_ranks_above_destination_and_description(self):
+        ids = search.search_package_ids('قلعة', queryset=Package.objects.filter(is_active=True))
+        self.assertEqual(ids, [self.in_title.id, self.in_destination.id, self.in_description.id])
+
+    def test_index_follows_edits(self):
+        Package.objects.filter(pk=self.in_description.pk).update(description='سوق المدينة')
+        search.index_packages([self.in_description.pk])
+        self.assertNotIn(self.in_description.id, search.search_package_ids('قلعة'))
+
+    @override_settings(SEARCH_MAX_RESULTS=1)
+    def test_filters_apply_before_limit(self):
+        # الباقة غير النشطة أعلى صلة لكنها لا تستهلك حد النتائج
+        self.assertEqual(search.search_package_ids('قلعة مغلقة'), [self.inactive.id])
+        ids = search.search_package_ids('قلعة', queryset=Package.objects.filter(is_active=True, type='cultural'))
+        self.assertEqual(ids, [self.in_title.id])
+
+    def test_facets_reuse_filtered_results(self):
+        with mock.patch.object(search, 'search_package_ids', wraps=search.search_package_ids) as search_package_ids:
+            response = APIClient().get('/api/packages/', {'search': 'قلعة', 'facets': '1'}, SERVER_NAME='localhost')
+        self.assertEqual(response.status_code, 200)
+        # استعلام البحث يُنفذ مرة واحدة للقائمة والفئات معاً
+        self.assertEqual(search_package_ids.call_count, 1)
+        self.assertEqual(sum(item['count'] for item in response.data['facets']['type']), 3)
+
+    def test_list_endpoint_orders_by_relevance(self):
+        response = APIClient().get('/api/packages/', {'search': 'قلعة'}, SERVER_NAME='localhost')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [package['id'] for package in response.data['results']],
+            [self.in_title.id, self.in_destination.id, self.in_description.id]
+        )
+
+
+class CatalogCacheTests(TestCase):
+    """ذاكرة ردود الكتالوج: إعادة الرد المخزن، وإبطاله برفع جيل النموذج المعدّل فقط بعد نجاح المعاملة"""
+
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch.object(snapshot, 'schedule_rebuild')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = APIClient(SERVER_NAME='localhost')
+        self.destination = create_destination('حلب')
+        self.package = create_package('جولة حلب', [self.destination])
+
+    def get(self, path='/api/packages/', **params):
+        response = self.client.get(path, params)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_repeated_request_is_served_from_cache(self):
+        self.assertEqual(self.get(type='cultural', is_featured='false')['X-Cache'], 'MISS')
+        # ترتيب المعاملات لا يغير المفتاح
+        with self.assertNumQueries(1):
+            self.assertEqual(self.get(is_featured='false', type='cultural')['X-Cache'], 'HIT')
+
+    def test_package_edit_invalidates_list(self):
+        self.get()
+        self.package.title = 'جولة حلب القديمة'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.package.save()
+        response = self.get()
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['results'][0]['title'], 'جولة حلب القديمة')
+
+    def test_unrelated_model_keeps_cache(self):
+        self.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            Service.objects.create(
+                name='فندق', type='hotel', description='-', destination=self.destination, address='-',
+                price_per_unit=Decimal('50'), unit_description='ليلة'
+            )
+        self.assertEqual(self.get()['X-Cache'], 'HIT')
+        self.assertEqual(self.get('/api/packages/services/')['X-Cache'], 'MISS')
+
+    def test_relation_and_bulk_delete_invalidate(self):
+        other = create_destination('حماة')
+        self.get()
+        with self.captureOnCommitCallbacks(execute=True):
+            PackageDestination.objects.create(package=self.package, destination=other, visit_order=2, duration_hours=2)
+        self.assertEqual(self.get()['X-Cache'], 'MISS')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Package.objects.filter(pk=self.package.pk).delete()
+        self.assertEqual(self.get().data['results'], [])
+
+    def test_rolled_back_change_keeps_cache(self):
+        self.get()
+        generations = catalog_cache.get_generations(['package'])
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                self.package.save()
+                raise RuntimeError
+        self.assertEqual(callbacks, [])
+        self.assertEqual(catalog_cache.get_generations(['package']), generations)
+        self.assertEqual(self.get()['X-Cache'], 'HIT')
+
+
+class KeysetPaginationTests(TestCase):
+    """الترقيم بالمؤشر: كل صف يظهر مرة واحدة حتى مع تساوي قيم الترتيب"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient(SERVER_NAME='localhost')
+        for index in range(25):
+            create_package(f'باقة {index}', base_price=Decimal(100 + index % 3))
+
+    def walk(self, url):
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('count', response.data)
+            pages.append([package['id'] for package in response.data['results']])
+            url = response.data['next']
+        return pages
+
+    def test_pages_cover_every_row_once_with_ties(self):
+        pages = self.walk('/api/packages/?pagination=cursor&ordering=base_price&page_size=7')
+        self.assertEqual([len(page) for page in pages], [7, 7, 7, 4])
+        seen = sum(pages, [])
+        self.assertEqual(sorted(seen), sorted(Package.objects.values_list('id', flat=True)))
+        self.assertEqual(len(seen), len(set(seen)))
+        prices = dict(Package.objects.values_list('id', 'base_price'))
+        self.assertEqual([prices[package_id] for package_id in seen], sorted(prices[package_id] for package_id in seen))
+
+    def test_default_ordering_is_newest_first(self):
+        pages = self.walk('/api/packages/?pagination=cursor')
+        # بلا page_size يُستخدم PAGE_SIZE من الإعدادات
+        self.assertEqual([len(page) for page in pages], [20, 5])
+        self.assertEqual(sum(pages, []), list(Package.objects.order_by('-created_at', '-id').values_list('id', flat=True)))
+
+    def test_page_size_param_for_numbered_pages(self):
+        response = self.client.get('/api/packages/', {'page_size': 5, 'page': 2})
+        self.assertEqual((len(response.data['results']), response.data['count']), (5, 25))
+        # الحد الأعلى يُطبق بدل الرفض
+        with mock.patch.object(KeysetPagination, 'max_page_size', 10):
+            response = self.client.get('/api/packages/', {'page_size': 1000})
+        self.assertEqual(len(response.data['results']), 10)
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.client.get('/api/packages/', {'cursor': 'garbage'}).status_code, 404)
+
+    def test_cursor_rejected_for_other_ordering(self):
+        first = self.client.get('/api/packages/?pagination=cursor&ordering=base_price&page_size=5')
+        self.assertEqual(len(first.data['results']), 5)
+        cursor = first.data['next'].split('cursor=')[1].split('&')[0]
+        response = self.client.get('/api/packages/', {'cursor': cursor, 'ordering': '-base_price'})
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(POPULARITY_FLUSH_THRESHOLD=10 ** 6, POPULARITY_FLUSH_INTERVAL=3600)
+class PopularityCounterTests(TestCase):
+    """عدادات المشاهدات: الطلب يزيد الكاش فقط، والتفريغ يكتب المشاهدات المعلقة دفعة واحدة"""
+
+    def setUp(self):
+        cache.clear()
+        caches[counters.COUNTERS_CACHE].clear()
+        self.addCleanup(caches[counters.COUNTERS_CACHE].clear)
+        self.viewed, self.other, self.untouched = create_package('أ'), create_package('ب'), create_package('ج')
+
+    def test_record_view_does_not_write(self):
+        self.assertEqual([counters.record_view(self.viewed.id) for _ in range(3)], [1, 2, 3])
+        self.viewed.refresh_from_db()
+        self.assertEqual(self.viewed.popularity_count, 0)
+        self.assertEqual(counters.get_popularity_count(self.viewed), 3)
+
+    def test_flush_writes_pending_views(self):
+        for _ in range(3):
+            counters.record_view(self.viewed.id)
+        counters.record_view(self.other.id)
+        self.assertEqual(counters.flush(), 4)
+        self.assertEqual(
+            dict(Package.objects.values_list('id', 'popularity_count')),
+            {self.viewed.id: 3, self.other.id: 1, self.untouched.id: 0}
+        )
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(counters.flush(), 0)
+        self.assertEqual(len(queries), 0)
+
+        counters.record_view(self.other.id)
+        self.assertEqual(counters.flush(), 1)
+        self.other.refresh_from_db()
+        self.assertEqual(self.other.popularity_count, 2)
+
+    def test_views_survive_response_cache_pressure(self):
+        packages = [create_package(f'باقة {index}') for index in range(400)]
+        for package in packages:
+            counters.record_view(package.id)
+            counters.record_view(package.id)
+        # ملء كاش الردود بما يتجاوز MAX_ENTRIES (300) فيبدأ القص
+        for index in range(1000):
+            cache.set(f'filler:{index}', index)
+        self.assertEqual(counters.flush(), 800)
+        self.assertEqual(Package.objects.aggregate(total=Sum('popularity_count'))['total'], 800)
+
+    def test_flush_keeps_other_cached_responses(self):
+        client = APIClient(SERVER_NAME='localhost')
+        self.assertEqual(client.get('/api/packages/').headers['X-Cache'], 'MISS')
+        self.assertEqual(client.get(f'/api/packages/{self.viewed.id}/').data['popularity_count'], 1)
+        counters.flush()
+        self.assertEqual(client.get('/api/packages/').headers['X-Cache'], 'HIT')
+        # الرد المخزن للتفاصيل يسبق التفريغ لكن العدد يُقرأ حديثاً
+        response = client.get(f'/api/packages/{self.viewed.id}/')
+        self.assertEqual((response.headers['X-Cache'], response.data['popularity_count']), ('HIT', 2))
+
+
+class CatalogSnapshotTests(TestCase):
+    """لقطة الكتالوج: قراءة الحقول من الملف المعيّن، وإعادة البناء والتحميل عند تغيّر الجيل"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'catalog.snapshot')
+        overrides = self.settings(CATALOG_SNAPSHOT_PATH=self.path, CATALOG_SNAPSHOT_CHECK_INTERVAL=0)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        # إعادة البناء في الخلفية تعمل على اتصال آخر لا يرى بيانات الاختبار، فتُستدعى هنا مباشرة
+        patcher = mock.patch.object(snapshot, 'schedule_rebuild')
+        self.schedule_rebuild = patcher.start()
+        self.addCleanup(patcher.stop)
+        snapshot._state['snapshot'] = None
+        self.addCleanup(snapshot._state.update, snapshot=None)
+
+        self.aleppo = create_destination('قلعة حلب')
+        self.palmyra = create_destination('تدمر', type='archaeological', governorate='حمص')
+        self.hotel = Service.objects.create(
+            name='فندق', type='hotel', description='-', destination=self.aleppo, address='-',
+            price_per_unit=Decimal('50'), unit_description='ليلة', capacity=None
+        )
+        self.package = create_package('باقة', [self.palmyra, self.aleppo])
+
+    def test_lookups_read_from_mapped_file(self):
+        catalog = snapshot.get_snapshot()
+        self.assertEqual(catalog.destination(self.aleppo.id).name, 'قلعة حلب')
+        self.assertIsNone(catalog.destination(10 ** 6))
+        self.assertEqual([record.id for record in catalog.destinations_by_governorate('حمص')], [self.palmyra.id])
+        self.assertEqual([record.id for record in catalog.services_for_destination(self.aleppo.id)], [self.hotel.id])
+        self.assertIsNone(catalog.service(self.hotel.id).capacity)
+        self.assertEqual(list(catalog.package(self.package.id).destination_ids), [self.palmyra.id, self.aleppo.id])
+        self.assertEqual(len(catalog.destinations), 2)
+        # السجلات مؤشرات تُنشأ عند الطلب؛ سجلان للصف نفسه متساويان
+        self.assertEqual(catalog.destination(self.aleppo.id), catalog.destinations_by_type('historical')[0])
+        self.assertEqual(len({catalog.destination(self.aleppo.id), catalog.destination(self.aleppo.id)}), 1)
+
+    def test_rebuild_and_reload_after_catalog_change(self):
+        catalog = snapshot.get_snapshot()
+        with self.captureOnCommitCallbacks(execute=True):
+            create_destination('بصرى', governorate='درعا')
+        # العملية التي عدّلت الكتالوج تطلب إعادة البناء
+        self.schedule_rebuild.assert_called()
+        self.assertTrue(snapshot.rebuild_if_stale())
+        self.assertFalse(snapshot.rebuild_if_stale())
+
+        reloaded = snapshot.get_snapshot()
+        self.assertIsNot(reloaded, catalog)
+        self.assertEqual(len(reloaded.destinations_by_governorate('درعا')), 1)
+        # اللقطة القديمة تبقى صالحة لمن ما زال يستخدمها
+        self.assertEqual(len(catalog.destinations_by_governorate('درعا')), 0)
+
+    def test_stale_file_triggers_rebuild_in_reader(self):
+        catalog = snapshot.get_snapshot()
+        self.schedule_rebuild.reset_mock()
+        # رُفع الجيل في قاعدة البيانات ثم توقفت العملية قبل إعادة بناء الملف
+        catalog_cache.bump_generation('destination')
+        self.schedule_rebuild.reset_mock()
+        self.assertIs(snapshot.get_snapshot(), catalog)
+        self.schedule_rebuild.assert_called_once_with()
+
+        snapshot.rebuild_if_stale()
+        self.schedule_rebuild.reset_mock()
+        self.assertIsNot(snapshot.get_snapshot(), catalog)
+        self.schedule_rebuild.assert_not_called()
+
+
+class PackageSimilarityTests(TestCase):
+    """الباقات المشابهة: إعادة الحساب التدريجية تطابق الحساب الكامل"""
+
+    PACKAGES = (
+        ('حلب التاريخية', 'قلعة حلب القديمة وأسواقها'),
+        ('أسواق حلب', 'قلعة حلب والأسواق القديمة'),
+        ('شاطئ اللاذقية', 'بحر وشاطئ ورمال'),
+        ('بحر طرطوس', 'شاطئ البحر وجزيرة أرواد'),
+        ('جبال كسب', 'غابات وجبال خضراء'),
+        ('غابات صلنفة', 'جبال وغابات باردة'),
+        ('صحراء تدمر', 'آثار الصحراء وأعمدة'),
+        ('آثار بصرى', 'مسرح آثار روماني'),
+    )
+
+    def setUp(self):
+        self.packages = [
+            create_package(title, description=description, base_price=Decimal(100 + 15 * index))
+            for index, (title, description) in enumerate(self.PACKAGES)
+        ]
+        similarity.rebuild(top_k=2)
+
+    def lists(self):
+        lists = {}
+        for package_id, similar_id, score in PackageSimilarity.objects.order_by('package_id', 'rank').values_list(
+            'package_id', 'similar_id', 'score'
+        ):
+            lists.setdefault(package_id, []).append((similar_id, score))
+        return lists
+
+    def ranked_ids(self):
+        return {package_id: [similar_id for similar_id, _ in items] for package_id, items in self.lists().items()}
+
+    def assert_matches_full_rebuild(self):
+        # الدرجات المحفوظة للأزواج غير المتغيرة تبقى بأوزان idf السابقة، فتُقارن القوائم لا الدرجات
+        incremental = self.ranked_ids()
+        similarity.rebuild(full=True, top_k=2)
+        self.assertEqual(incremental, self.ranked_ids())
+
+    def neighbours(self, package):
+        return [similar_id for similar_id, _ in self.lists().get(package.id, [])]
+
+    def test_closest_package_ranks_first(self):
+        aleppo, souks, latakia, tartus = self.packages[:4]
+        self.assertEqual(self.neighbours(aleppo)[0], souks.id)
+        self.assertEqual(self.neighbours(latakia)[0], tartus.id)
+
+    def test_unchanged_catalog_updates_nothing(self):
+        self.assertEqual(similarity.rebuild(top_k=2)['updated'], 0)
+
+    def test_deactivated_package_leaves_every_list(self):
+        souks = self.packages[1]
+        Package.objects.filter(pk=souks.pk).update(is_active=False)
+        stats = similarity.rebuild(top_k=2)
+        self.assertEqual(stats['removed'], 1)
+        self.assertFalse(PackageSimilarity.objects.filter(similar=souks).exists())
+        self.assertFalse(PackageSimilarity.objects.filter(package=souks).exists())
+        self.assert_matches_full_rebuild()
+
+    def test_changed_package_enters_other_lists(self):
+        desert = self.packages[6]
+        Package.objects.filter(pk=desert.pk).update(title='شاطئ طرطوس', description='بحر وشاطئ أرواد')
+        self.assertEqual(similarity.rebuild(top_k=2)['changed'], 1)
+        self.assertIn(desert.id, self.neighbours(self.packages[2]))
+        self.assert_matches_full_rebuild()
+
+    def test_changed_package_leaves_other_lists(self):
+        aleppo, souks = self.packages[:2]
+        Package.objects.filter(pk=souks.pk).update(title='جبال صلنفة', description='غابات وجبال')
+        before = dict(self.lists()[aleppo.id])[souks.id]
+        similarity.rebuild(top_k=2)
+        # لم يعد النص مشتركاً: تبقى الباقة في القائمة بتشابه الخصائص فقط (السعر والمدة)
+        self.assertLess(dict(self.lists()[aleppo.id]).get(souks.id, 0), before / 2)
+        self.assertIn(self.packages[4].id, self.neighbours(souks))
+        self.assert_matches_full_rebuild()
+
+    def test_score_batches_are_capped(self):
+        expected = self.lists()
+        PackageSimilarity.objects.all().delete()
+        with mock.patch.object(similarity, 'MAX_BATCH_CELLS', 16), \
+                mock.patch.object(similarity.PackageVectors, 'scores', autospec=True,
+                                  side_effect=similarity.PackageVectors.scores) as scores:
+            similarity.rebuild(full=True, top_k=2)
+        # ثماني باقات: صفان في كل دفعة حتى لا تتجاوز المصفوفة 16 خلية
+        self.assertTrue(all(len(call.args[1]) * 8 <= 16 for call in scores.call_args_list))
+        self.assertEqual(self.lists(), expected)
+
+
+def destination_row(external_id, name, **overrides):
+    return {
+        'external_id': external_id, 'name': name, 'type': 'historical', 'description': f'{name} وصف',
+        'governorate': 'حلب', 'latitude': '36.2', 'longitude': '37.15', 'best_season': 'الربيع', **overrides
+    }
+
+
+def package_row(external_id, title):
+    return {
+        'external_id': external_id, 'title': title, 'type': 'cultural', 'description': 'وصف',
+        'short_description': 'مختصر', 'duration_days': '3', 'base_price': '100',
+        'daily_schedule': '{"اليوم1": {"صباح": "جولة"}}', 'terms_conditions': '-', 'cancellation_policy': '-',
+    }
+
+
+class CatalogImporterTests(TestCase):
+    """الاستيراد المجمع: تخطي الصفوف غير المتغيرة، تنظيف السجلات القديمة، تبنّي الروابط اليدوية وآثار الإنهاء"""
+
+    def setUp(self):
+        patcher = mock.patch.object(snapshot, 'schedule_rebuild')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def run_import(self, spec_name, rows):
+        return importer.CatalogImporter(importer.SPECS[spec_name]).run(enumerate(rows, start=2))
+
+    def test_unchanged_rows_are_skipped_by_hash(self):
+        rows = [destination_row('d1', 'حلب'), destination_row('d2', 'حماة')]
+        self.assertEqual(self.run_import('destinations', rows).created, 2)
+
+        rows[1] = destination_row('d2', 'حماة', description='وصف جديد')
+        with CaptureQueriesContext(connection) as queries:
+            result = self.run_import('destinations', rows)
+        self.assertEqual((result.created, result.updated, result.unchanged), (0, 1, 1))
+        self.assertEqual(Destination.objects.get(name='حماة').description, 'وصف جديد')
+        # executemany يُسجل كاستعلام واحد بعدد مرات التنفيذ: صف واحد فقط وصل إلى جدول الوجهات
+        updates = [query['sql'] for query in queries if 'UPDATE "destinations"' in query['sql']]
+        self.assertEqual(len(updates), 1)
+        self.assertTrue(updates[0].startswith('1 times'))
+
+    def test_stale_record_is_replaced(self):
+        self.run_import('destinations', [destination_row('d1', 'حلب')])
+        Destination.objects.all().delete()
+
+        result = self.run_import('destinations', [destination_row('d1', 'حلب')])
+        self.assertEqual((result.created, result.unchanged), (1, 0))
+        record = CatalogImportRecord.objects.get()
+        self.assertEqual(record.object_id, Destination.objects.get().pk)
+
+    def test_manual_link_is_adopted(self):
+        self.run_import('destinations', [destination_row('d1', 'حلب')])
+        self.run_import('packages', [package_row('p1', 'جولة حلب')])
+        link = PackageDestination.objects.create(
+            package=Package.objects.get(), destination=Destination.objects.get(), visit_order=1, duration_hours=2
+        )
+
+        result = self.run_import('package_destinations', [
+            {'package': 'p1', 'destination': 'd1', 'visit_order': '1', 'duration_hours': '5'}
+        ])
+        self.assertEqual(result.errors, [])
+        link.refresh_from_db()
+        self.assertEqual(link.duration_hours, 5)
+        self.assertEqual(PackageDestination.objects.count(), 1)
+        self.assertEqual(CatalogImportRecord.objects.get(external_id='p1:d1').object_id, link.pk)
+
+    def test_unresolved_reference_is_row_error(self):
+        result = self.run_import('package_destinations', [
+            {'package': 'p1', 'destination': 'd1', 'visit_order': '1', 'duration_hours': '5'}
+        ])
+        self.assertEqual(result.created, 0)
+        self.assertEqual(len(result.errors), 1)
+        line_number, message = result.errors[0]
+        self.assertEqual(line_number, 2)
+        self.assertIn('"p1"', message)
+
+    def test_bulk_insert_sets_geohash(self):
+        self.run_import('destinations', [destination_row('d1', 'حلب', latitude='33.51', longitude='36.29')])
+        self.assertEqual(Destination.objects.get().geohash, geo.encode_geohash(33.51, 36.29))
+
+    def test_finish_bumps_generation_and_reindexes(self):
+        self.run_import('destinations', [destination_row('d1', 'قلعة سمعان')])
+        self.run_import('packages', [package_row('p1', 'جولة الشمال')])
+        generation = catalog_cache.get_generations(['package'])['package']
+
+        self.run_import('package_destinations', [
+            {'package': 'p1', 'destination': 'd1', 'visit_order': '1', 'duration_hours': '5'}
+        ])
+        self.assertEqual(catalog_cache.get_generations(['package'])['package'], generation + 1)
+        # اسم الوجهة المرتبطة صار في مستند الباقة
+        self.assertEqual(search.search_package_ids('سمعان'), [Package.objects.get().pk])
+
+        # استيراد بلا تغيير لا يرفع الجيل
+        self.run_import('package_destinations', [
+            {'package': 'p1', 'destination': 'd1', 'visit_order': '1', 'duration_hours': '5'}
+        ])
+        self.assertEqual(catalog_cache.get_generations(['package'])['package'], generation + 1)
+
+
+class NearbySearchTests(TestCase):
+    """البحث الجغرافي: فلترة مسبقة بخلايا geohash ثم تحقق دقيق بالمسافة، بنفس نتائج المسح الكامل"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient(SERVER_NAME='localhost')
+        self.damascus = create_destination('دمشق', latitude=33.5138, longitude=36.2765, governorate='دمشق')
+        self.homs = create_destination('حمص', latitude=34.7324, longitude=36.7137, governorate='حمص')
+        self.aleppo = create_destination('حلب', latitude=36.2021, longitude=37.1343)
+
+    def test_encode_geohash(self):
+        self.assertEqual(geo.encode_geohash(57.64911, 10.40744), 'u4pruydqq')
+        self.assertEqual(self.damascus.geohash, geo.encode_geohash(33.5138, 36.2765))
+
+    def test_radius_and_order(self):
+        results = geo.nearby_destinations(33.5138, 36.2765, 200)
+        self.assertEqual([destination for destination, _ in results], [self.damascus, self.homs])
+        self.assertAlmostEqual(results[1][1], geo.haversine_km(33.5138, 36.2765, 34.7324, 36.7137))
+
+    def test_prefilter_matches_full_scan(self):
+        # نقاط على شبكة حول دمشق تعبر حدود خلايا geohash في كل الاتجاهات
+        for index in range(60):
+            create_destination(
+                f'نقطة {index}', latitude=33.0 + (index % 10) * 0.11, longitude=35.8 + (index // 10) * 0.17
+            )
+        destinations = list(Destination.objects.all())
+        for radius_km in (5, 25, 60):
+            expected = sorted(
+                destination.pk for destination in destinations
+                if geo.haversine_km(33.5138, 36.2765, destination.latitude, destination.longitude) <= radius_km
+            )
+            found = sorted(destination.pk for destination, _ in geo.nearby_destinations(33.5138, 36.2765, radius_km))
+            self.assertEqual(found, expected)
+
+    def test_nearby_endpoints(self):
+        package = create_package('جولة حمص', [self.aleppo, self.homs])
+        response = self.client.get('/api/packages/destinations/nearby/', {
+            'destination': self.damascus.id, 'radius_km': 400
+        })
+        self.assertEqual(
+            [(item['id'], item['distance_km'] > 0) for item in response.data['results']],
+            [(self.homs.id, True), (self.aleppo.id, True)]
+        )
+
+        # مسافة الباقة هي مسافة أقرب وجهاتها
+        response = self.client.get('/api/packages/nearby/', {'lat': 33.5138, 'lng': 36.2765, 'radius_km': 400})
+        self.assertEqual([item['id'] for item in response.data['results']], [package.id])
+        self.assertEqual(
+            response.data['results'][0]['distance_km'],
+            round(geo.haversine_km(33.5138, 36.2765, 34.7324, 36.7137), 2)
+        )
+
+        self.assertEqual(self.client.get('/api/packages/nearby/', {'radius_km': 10}).status_code, 400)
+
+
+class DistanceMatrixTests(TestCase):
+    """مصفوفة المسافات وترتيب الزيارة: تحديث جزئي عند تغيّر الوجهات، وترتيب 2-opt، وتوزيع المحطات على الأيام"""
+
+    def setUp(self):
+        patcher = mock.patch.object(snapshot, 'schedule_rebuild')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        distances._state.update(generation=None, matrix=None)
+        self.addCleanup(distances._state.update, generation=None, matrix=None)
+        # وجهات على خط عرض واحد: الترتيب الأمثل هو ترتيب خطوط الطول
+        self.line = [
+            create_destination(f'محطة {index}', latitude=35.0, longitude=36.0 + index * 0.2) for index in range(6)
+        ]
+
+    def ids(self, positions):
+        return [self.line[position].id for position in positions]
+
+    def test_matrix_matches_haversine(self):
+        matrix = distances.get_distance_matrix()
+        first, last = self.line[0], self.line[-1]
+        self.assertAlmostEqual(
+            matrix.distance(first.id, last.id),
+            geo.haversine_km(first.latitude, first.longitude, last.latitude, last.longitude), places=2
+        )
+        self.assertEqual(matrix.distance(first.id, first.id), 0.0)
+
+    def test_catalog_change_recomputes_changed_rows_only(self):
+        matrix = distances.get_distance_matrix()
+        self.assertIs(distances.get_distance_matrix(), matrix)
+
+        moved = self.line[2]
+        with self.captureOnCommitCallbacks(execute=True):
+            moved.latitude = 35.5
+            moved.save()
+            added = create_destination('جديدة', latitude=34.0, longitude=36.5)
+        with mock.patch.object(distances, 'haversine_matrix', wraps=distances.haversine_matrix) as computed:
+            updated = distances.get_distance_matrix()
+        # صفا الوجهة المنقولة والمضافة فقط يُحسبان من جديد
+        self.assertEqual(len(computed.call_args.args[0]), 2)
+        rows = list(Destination.objects.order_by('id').values_list('id', 'latitude', 'longitude'))
+        full = distances.DistanceMatrix.build(rows)
+        self.assertTrue((updated.matrix == full.matrix).all())
+        self.assertGreater(updated.distance(moved.id, added.id), 0)
+
+    def test_optimize_visit_order(self):
+        order, length = distances.optimize_visit_order(self.ids([3, 0, 5, 1, 4, 2]))
+        self.assertIn(order, (self.ids(range(6)), self.ids(reversed(range(6)))))
+        self.assertAlmostEqual(length, distances.route_distance(self.ids(range(6))), places=1)
+
+        # نقطة بداية ثابتة من المنتصف: تبقى أولاً، والباقي أقصر من الترتيب المعطى
+        scrambled = self.ids([2, 5, 0, 4, 1, 3])
+        order, length = distances.optimize_visit_order(scrambled, start_id=self.line[2].id)
+        self.assertEqual(order[0], self.line[2].id)
+        self.assertLess(length, distances.route_distance(scrambled))
+        best = min(
+            distances.route_distance([self.line[2].id] + list(rest))
+            for rest in itertools.permutations(self.ids([0, 1, 3, 4, 5]))
+        )
+        self.assertAlmostEqual(length, best, places=1)
+
+    @override_settings(ITINERARY_MAX_DAY_HOURS=10)
+    def test_plan_days_packs_and_flags(self):
+        stops = [(destination_id, 4, None) for destination_id in self.ids(range(3))]
+        days = distances.plan_days(stops, duration_days=1)
+        self.assertEqual([day['destinations'] for day in days], [self.ids([0, 1]), self.ids([2])])
+        self.assertGreater(days[0]['travel_hours'], 0)
+        # اليوم الثاني يتجاوز مدة الرحلة
+        self.assertEqual([day['fits'] for day in days], [True, False])
+
+        dated = [
+            (self.line[0].id, 6, date(2026, 12, 2)),
+            (self.line[1].id, 6, date(2026, 12, 1)),
+            (self.line[2].id, 2, date(2026, 12, 1)),
+        ]
+        days = distances.plan_days(dated)
+        self.assertEqual([(day['date'], day['destinations']) for day in days], [
+            (date(2026, 12, 1), self.ids([1, 2])), (date(2026, 12, 2), self.ids([0])),
+        ])
+        self.assertEqual([day['fits'] for day in days], [True, True])
+
+
+class FacetTests(TestCase):
+    """أعداد الفئات: ضمن التصفية الحالية، بالسعر الفعلي، ودون تكرار الباقة المارة بعدة وجهات"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient(SERVER_NAME='localhost')
+        aleppo = create_destination('قلعة حلب')
+        souks = create_destination('أسواق حلب')
+        homs = create_destination('حمص', governorate='حمص')
+        create_package('جولة حلب', [aleppo, souks], base_price=Decimal('300'), discount_price=Decimal('90'))
+        create_package('حلب وحمص', [aleppo, homs], base_price=Decimal('120'))
+        create_package('عائلة في حمص', [homs], type='family', base_price=Decimal('600'))
+
+    def facets(self, **params):
+        response = self.client.get('/api/packages/', {'facets': '1', **params})
+        self.assertEqual(response.status_code, 200)
+        return {
+            name: {item['value']: item['count'] for item in items if item['count']}
+            for name, items in response.data['facets'].items()
+        }
+
+    def test_counts(self):
+        self.assertEqual(self.facets(), {
+            'type': {'family': 1, 'cultural': 2},
+            # الباقة الأولى تمر بوجهتين في حلب وتُعد مرة واحدة
+            'governorate': {'حلب': 2, 'حمص': 2},
+            'duration': {'1-3': 3},
+            # الخصم يضع الباقة الأولى في فئة 0-100 لا 250-500
+            'price': {'0-100': 1, '100-250': 1, '500-1000': 1},
+        })
+
+    def test_counts_follow_filters(self):
+        facet_counts = self.facets(type='cultural', max_price='150')
+        self.assertEqual(facet_counts['type'], {'cultural': 2})
+        self.assertEqual(facet_counts['governorate'], {'حلب': 2, 'حمص': 1})
+
+    def test_cached_across_pages_and_ordering(self):
+        self.facets(ordering='base_price')
+        with mock.patch.object(facets, 'compute_facets') as compute_facets:
+            self.facets(ordering='-base_price', page_size='2')
+        compute_facets.assert_not_called()
+
+
+class EffectivePriceTests(TestCase):
+    """السعر الفعلي عمود تولده قاعدة البيانات: يبقى متزامناً مع update() وتعتمد عليه التصفية والترتيب"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient(SERVER_NAME='localhost')
+        self.discounted = create_package('مخفضة', base_price=Decimal('300'), discount_price=Decimal('80'))
+        self.zero_discount = create_package('خصم صفري', base_price=Decimal('150'), discount_price=Decimal('0'))
+        self.regular = create_package('عادية', base_price=Decimal('100'))
+
+    def prices(self):
+        return dict(Package.objects.values_list('title', 'effective_price'))
+
+    def test_column_follows_discount(self):
+        self.assertEqual(self.prices(), {'مخفضة': Decimal('80'), 'خصم صفري': Decimal('150'), 'عادية': Decimal('100')})
+        for package in Package.objects.all():
+            self.assertEqual(package.effective_price, package.final_price)
+
+    def test_bulk_update_keeps_column_in_sync(self):
+        Package.objects.filter(pk=self.regular.pk).update(discount_price=Decimal('60'))
+        Package.objects.filter(pk=self.discounted.pk).update(discount_price=None)
+        self.assertEqual(self.prices()['عادية'], Decimal('60'))
+        self.assertEqual(self.prices()['مخفضة'], Decimal('300'))
+
+    def test_list_filters_and_orders_by_effective_price(self):
+        response = self.client.get('/api/packages/', {'max_price': '120', 'ordering': 'effective_price'})
+        self.assertEqual([item['id'] for item in response.data['results']], [self.discounted.id, self.regular.id])
+
+        response = self.client.get('/api/packages/', {'min_price': '120'})
+        self.assertEqual([item['id'] for item in response.data['results']], [self.zero_discount.id])
+
+    def test_advanced_search_uses_effective_price(self):
+        response = self.client.post('/api/packages/search/advanced/', {'min_price': '50', 'max_price': '90'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['id'] for item in response.data['results']], [self.discounted.id])
@@ -4,7 +4,12 @@ from . import views
 urlpatterns = [
     path('', views.PackageListView.as_view(), name='package-list'),
     path('<int:id>/', views.PackageDetailView.as_view(), name='package-detail'),
+    path('<int:id>/similar/', views.similar_packages, name='package-similar'),
+    path('<int:id>/departures/', views.departure_calendar, name='package-departures'),
     path('search/advanced/', views.package_search, name='package-search'),
+    path('nearby/', views.nearby_packages, name='package-nearby'),
     path('destinations/', views.DestinationListView.as_view(), name='destination-list'),
+    path('destinations/nearby/', views.nearby_destinations, name='destination-nearby'),
     path('services/', views.ServiceListView.as_view(), name='service-list'),
+    path('services/nearby/', views.nearby_services, name='service-nearby'),
 ]
\ No newline at end of file
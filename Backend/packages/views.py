@@ -1,26 +1,45 @@
+from datetime import timedelta
+
 from rest_framework import generics, permissions, filters, status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import Q
-from .models import Package, Destination, Service
+from django.db.models import Q, Sum
+from django.shortcuts import get_object_or_404
+from .models import Package, Destination, Service, PackageDestination, PackageDeparture
 from .serializers import (
     PackageListSerializer, PackageDetailSerializer, DestinationSerializer,
-    ServiceSerializer, PackageSearchSerializer
+    ServiceSerializer, PackageSearchSerializer, NearbySearchSerializer, DepartureCalendarSerializer,
+    NearbyDestinationSerializer, NearbyServiceSerializer, NearbyPackageSerializer,
+    SimilarPackageSerializer
 )
+from .filters import DEPARTURE_PARAMS, PackageFullTextSearchFilter, departure_filter, departure_params, rank_by_ids
+from .catalog_cache import CatalogCacheMixin
+from . import catalog_cache, counters, facets, geo, search, similarity
 
-class PackageListView(generics.ListAPIView):
+class PackageListView(CatalogCacheMixin, generics.ListAPIView):
     """قائمة جميع الباقات مع إمكانية البحث والتصفية"""
     queryset = Package.objects.filter(is_active=True).prefetch_related(
         'destinations', 'packagedestination_set__destination'
     )
     serializer_class = PackageListSerializer
     permission_classes = [permissions.AllowAny]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter, PackageFullTextSearchFilter]
     filterset_fields = ['type', 'is_featured']
     search_fields = ['title', 'description', 'short_description', 'destinations__name']
-    ordering_fields = ['base_price', 'duration_days', 'popularity_count', 'created_at']
+    ordering_fields = ['base_price', 'effective_price', 'duration_days', 'popularity_count', 'created_at']
     ordering = ['-created_at']
+    cache_models = ('package', 'destination')
+
+    def get_cache_models(self, request):
+        # المقاعد المتبقية تتغير مع كل حجز؛ جيل المواعيد يدخل المفتاح فقط عند التصفية بها
+        models = self.cache_models
+        if any(request.query_params.get(name) for name in DEPARTURE_PARAMS):
+            models += ('departure',)
+        # تفريغ عدادات المشاهدات يبطل القوائم المرتبة بها فقط
+        if 'popularity_count' in request.query_params.get('ordering', ''):
+            models += ('popularity',)
+        return models
 
     def get_queryset(self):
         queryset = super().get_queryset()
@@ -29,9 +48,9 @@ class PackageListView(generics.ListAPIView):
         min_price = self.request.query_params.get('min_price')
         max_price = self.request.query_params.get('max_price')
         if min_price:
-            queryset = queryset.filter(base_price__gte=min_price)
+            queryset = queryset.filter(effective_price__gte=min_price)
         if max_price:
-            queryset = queryset.filter(base_price__lte=max_price)
+            queryset = queryset.filter(effective_price__lte=max_price)
             
         # تصفية حسب المدة
         min_duration = self.request.query_params.get('min_duration')
@@ -45,10 +64,30 @@ class PackageListView(generics.ListAPIView):
         governorate = self.request.query_params.get('governorate')
         if governorate:
             queryset = queryset.filter(destinations__governorate__icontains=governorate)
+        
+        # تصفية حسب موعد انطلاق ضمن نافذة التاريخ يتسع لعدد المسافرين
+        departures = departure_params(self.request.query_params)
+        if departures:
+            queryset = queryset.filter(departure_filter(**departures))
             
         return queryset.distinct()
 
-class PackageDetailView(generics.RetrieveAPIView):
+    def filter_queryset(self, queryset):
+        # تُحفظ المجموعة المصفّاة لتعيد الفئات استخدامها دون تكرار التصفية واستعلام البحث
+        self.filtered_queryset = super().filter_queryset(queryset)
+        return self.filtered_queryset
+
+    def uncached_list(self, request, *args, **kwargs):
+        response = super().uncached_list(request, *args, **kwargs)
+        # ?facets=1 يضيف أعداد النتائج لكل فئة ضمن نفس التصفية
+        if request.query_params.get('facets') in ('1', 'true') and response.status_code == 200:
+            response.data['facets'] = facets.get_facets(
+                self.filtered_queryset,
+                catalog_cache.normalize_params(request.query_params)
+            )
+        return response
+
+class PackageDetailView(CatalogCacheMixin, generics.RetrieveAPIView):
     """تفاصيل باقة معينة"""
     queryset = Package.objects.filter(is_active=True).prefetch_related(
         'packagedestination_set__destination',
@@ -57,16 +96,18 @@ class PackageDetailView(generics.RetrieveAPIView):
     serializer_class = PackageDetailSerializer
     permission_classes = [permissions.AllowAny]
     lookup_field = 'id'
+    cache_models = ('package', 'destination', 'service')
 
     def retrieve(self, request, *args, **kwargs):
-        instance = self.get_object()
-        # زيادة عداد المشاهدات
-        instance.popularity_count += 1
-        instance.save(update_fields=['popularity_count'])
-        serializer = self.get_serializer(instance)
-        return Response(serializer.data)
-
-class DestinationListView(generics.ListAPIView):
+        response = self.cached_response(request, super().retrieve, *args, **kwargs)
+        if response.status_code == 200:
+            # تسجيل المشاهدة في العداد المؤقت (تُكتب لاحقاً دفعة واحدة)
+            counters.record_view(response.data['id'])
+            # العدد في الرد المخزن قد يسبق آخر تفريغ، فيُقرأ من قاعدة البيانات مع المعلق
+            response.data['popularity_count'] = counters.current_count(response.data['id'])
+        return response
+
+class DestinationListView(CatalogCacheMixin, generics.ListAPIView):
     """قائمة الوجهات"""
     queryset = Destination.objects.filter(is_active=True)
     serializer_class = DestinationSerializer
@@ -74,8 +115,9 @@ class DestinationListView(generics.ListAPIView):
     filter_backends = [filters.SearchFilter, DjangoFilterBackend]
     search_fields = ['name', 'governorate', 'description']
     filterset_fields = ['type', 'governorate']
+    cache_models = ('destination',)
 
-class ServiceListView(generics.ListAPIView):
+class ServiceListView(CatalogCacheMixin, generics.ListAPIView):
     """قائمة الخدمات"""
     queryset = Service.objects.filter(is_active=True).select_related('destination')
     serializer_class = ServiceSerializer
@@ -83,6 +125,7 @@ class ServiceListView(generics.ListAPIView):
     filter_backends = [filters.SearchFilter, DjangoFilterBackend]
     search_fields = ['name', 'description', 'address']
     filterset_fields = ['type', 'level', 'destination']
+    cache_models = ('service', 'destination')
 
 @api_view(['POST'])
 @permission_classes([permissions.AllowAny])
@@ -94,17 +137,9 @@ def package_search(request):
         data = serializer.validated_data
         queryset = Package.objects.filter(is_active=True)
         
-        # بناء استعلام البحث
+        # بناء استعلام التصفية
         query = Q()
         
-        if data.get('query'):
-            query &= Q(
-                Q(title__icontains=data['query']) |
-                Q(description__icontains=data['query']) |
-                Q(short_description__icontains=data['query']) |
-                Q(destinations__name__icontains=data['query'])
-            )
-            
         if data.get('package_type'):
             query &= Q(type=data['package_type'])
             
@@ -112,10 +147,10 @@ def package_search(request):
             query &= Q(destinations__governorate__icontains=data['governorate'])
             
         if data.get('min_price'):
-            query &= Q(base_price__gte=data['min_price'])
+            query &= Q(effective_price__gte=data['min_price'])
             
         if data.get('max_price'):
-            query &= Q(base_price__lte=data['max_price'])
+            query &= Q(effective_price__lte=data['max_price'])
             
         if data.get('min_duration'):
             query &= Q(duration_days__gte=data['min_duration'])
@@ -125,13 +160,188 @@ def package_search(request):
             
         if data.get('is_featured') is not None:
             query &= Q(is_featured=data['is_featured'])
+            
+        if data.get('departure_from') or data.get('departure_to') or data.get('travelers'):
+            query &= departure_filter(data.get('departure_from'), data.get('departure_to'), data.get('travelers'))
         
-        packages = queryset.filter(query).distinct().prefetch_related('destinations')
+        packages = queryset.filter(query).distinct()
+        # البحث النصي عبر الفهرس ضمن الباقات المصفّاة مع الترتيب حسب الصلة
+        if data.get('query'):
+            packages = rank_by_ids(packages, search.search_package_ids(data['query'], queryset=packages))
+            packages = packages.order_by('search_rank')
+        packages = packages.prefetch_related('destinations')
         result_serializer = PackageListSerializer(packages, many=True)
         
-        return Response({
+        result = {
             'count': packages.count(),
             'results': result_serializer.data
+        }
+        if data.get('facets'):
+            result['facets'] = facets.get_facets(packages, sorted(
+                (key, [str(value)]) for key, value in data.items()
+            ))
+        return Response(result)
+    
+    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+def _nearby_destinations(data):
+    """الوجهات القريبة من نقطة البحث أو من الوجهة المرجعية مع المسافات"""
+    queryset = Destination.objects.filter(is_active=True)
+    if data.get('destination'):
+        origin = get_object_or_404(Destination, id=data['destination'])
+        latitude, longitude = origin.latitude, origin.longitude
+        queryset = queryset.exclude(id=origin.id)
+    else:
+        latitude, longitude = data['lat'], data['lng']
+    return geo.nearby_destinations(latitude, longitude, data['radius_km'], queryset)
+
+@api_view(['GET'])
+@permission_classes([permissions.AllowAny])
+def nearby_destinations(request):
+    """الوجهات القريبة مرتبة حسب المسافة"""
+    serializer = NearbySearchSerializer(data=request.query_params)
+    
+    if serializer.is_valid():
+        data = serializer.validated_data
+        results = _nearby_destinations(data)
+        if data.get('type'):
+            results = [(destination, distance) for destination, distance in results if destination.type == data['type']]
+        
+        destinations = []
+        for destination, distance in results[:data['limit']]:
+            destination.distance_km = round(distance, 2)
+            destinations.append(destination)
+        
+        return Response({
+            'count': len(results),
+            'results': NearbyDestinationSerializer(destinations, many=True).data
+        })
+    
+    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+@api_view(['GET'])
+@permission_classes([permissions.AllowAny])
+def nearby_services(request):
+    """الخدمات القريبة (حسب موقع وجهتها) مرتبة حسب المسافة"""
+    serializer = NearbySearchSerializer(data=request.query_params)
+    
+    if serializer.is_valid():
+        data = serializer.validated_data
+        distances = {destination.id: distance for destination, distance in _nearby_destinations(data)}
+        if data.get('destination'):
+            distances[data['destination']] = 0.0
+        
+        services = Service.objects.filter(
+            is_active=True, destination_id__in=distances
+        ).select_related('destination')
+        if data.get('type'):
+            services = services.filter(type=data['type'])
+        
+        services = sorted(services, key=lambda service: (distances[service.destination_id], -service.rating))
+        for service in services:
+            service.distance_km = round(distances[service.destination_id], 2)
+        
+        return Response({
+            'count': len(services),
+            'results': NearbyServiceSerializer(services[:data['limit']], many=True).data
+        })
+    
+    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+@api_view(['GET'])
+@permission_classes([permissions.AllowAny])
+def nearby_packages(request):
+    """الباقات التي تمر بوجهات قريبة مرتبة حسب أقرب وجهة فيها"""
+    serializer = NearbySearchSerializer(data=request.query_params)
+    
+    if serializer.is_valid():
+        data = serializer.validated_data
+        distances = {destination.id: distance for destination, distance in _nearby_destinations(data)}
+        if data.get('destination'):
+            distances[data['destination']] = 0.0
+        
+        # مسافة الباقة = مسافة أقرب وجهة من وجهاتها
+        package_distances = {}
+        links = PackageDestination.objects.filter(
+            destination_id__in=distances, package__is_active=True
+        ).values_list('package_id', 'destination_id')
+        for package_id, destination_id in links:
+            distance = distances[destination_id]
+            if distance < package_distances.get(package_id, float('inf')):
+                package_distances[package_id] = distance
+        
+        packages = Package.objects.filter(id__in=package_distances).prefetch_related('destinations')
+        if data.get('type'):
+            packages = packages.filter(type=data['type'])
+        
+        packages = sorted(packages, key=lambda package: package_distances[package.id])
+        for package in packages:
+            package.distance_km = round(package_distances[package.id], 2)
+        
+        return Response({
+            'count': len(packages),
+            'results': NearbyPackageSerializer(packages[:data['limit']], many=True).data
+        })
+    
+    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+@api_view(['GET'])
+@permission_classes([permissions.AllowAny])
+def similar_packages(request, id):
+    """الباقات المشابهة لباقة معينة (محسوبة مسبقاً)"""
+    if not Package.objects.filter(id=id, is_active=True).exists():
+        return Response({'error': 'الباقة غير موجودة'}, status=status.HTTP_404_NOT_FOUND)
+    try:
+        limit = min(int(request.query_params.get('limit', 10)), 50)
+    except ValueError:
+        return Response({'error': 'قيمة limit غير صالحة'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    packages = []
+    for item in similarity.similar_packages(id, limit):
+        item.similar.similarity_score = round(item.score, 4)
+        packages.append(item.similar)
+    
+    return Response({
+        'count': len(packages),
+        'results': SimilarPackageSerializer(packages, many=True).data
+    })
+
+@api_view(['GET'])
+@permission_classes([permissions.AllowAny])
+def departure_calendar(request, id):
+    """تقويم شهري لمواعيد انطلاق الباقة: المقاعد والمتبقي لكل يوم"""
+    serializer = DepartureCalendarSerializer(data=request.query_params)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    if not Package.objects.filter(id=id, is_active=True).exists():
+        return Response({'error': 'الباقة غير موجودة'}, status=status.HTTP_404_NOT_FOUND)
+    
+    data = serializer.validated_data
+    first_day = data['month']
+    next_month = (first_day + timedelta(days=32)).replace(day=1)
+    # تجميع واحد على فهرس (package, departure_date) يعيد مقاعد كل يوم فيه انطلاق
+    rows = PackageDeparture.objects.filter(
+        package_id=id, is_active=True, departure_date__gte=first_day, departure_date__lt=next_month
+    ).values('departure_date').annotate(
+        seats=Sum('seats'), seats_remaining=Sum('seats_remaining')
+    ).order_by('departure_date')
+    by_date = {row['departure_date']: row for row in rows}
+    
+    travelers = data.get('travelers') or 1
+    days = []
+    for offset in range((next_month - first_day).days):
+        date = first_day + timedelta(days=offset)
+        row = by_date.get(date)
+        days.append({
+            'date': date,
+            'seats': row['seats'] if row else 0,
+            'seats_remaining': row['seats_remaining'] if row else 0,
+            'available': bool(row) and row['seats_remaining'] >= travelers
         })
     
-    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+    return Response({
+        'package': id,
+        'month': first_day.strftime('%Y-%m'),
+        'travelers': travelers,
+        'days': days
+    })
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-17 17:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0002_keyset_pagination_indexes'),
+        ('payments', '0002_paymentgateway_payment_currency_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['created_at', 'id'], name='payments_created_d7f01e_idx'),
+        ),
+    ]
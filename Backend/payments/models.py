@@ -2,6 +2,7 @@ from django.db import models
 from django.conf import settings
 from django.utils.translation import gettext_lazy as _
 from bookings.models import Booking
+from bookings.numbering import save_with_number
 
 class Payment(models.Model):
     PAYMENT_STATUS = (
@@ -50,6 +51,7 @@ class Payment(models.Model):
             models.Index(fields=['payment_number']),
             models.Index(fields=['booking', 'status']),
             models.Index(fields=['transaction_id']),
+            models.Index(fields=['created_at', 'id']),
         ]
 
     def __str__(self):
@@ -57,9 +59,7 @@ class Payment(models.Model):
 
     def save(self, *args, **kwargs):
         if not self.payment_number:
-            import random
-            import string
-            self.payment_number = 'PAY' + ''.join(random.choices(string.digits, k=8))
+            return save_with_number(self, 'payment_number', 'payment', 'PAY', super().save, *args, **kwargs)
         super().save(*args, **kwargs)
     
     @property
@@ -1,5 +1,6 @@
 import json
 import random
+from django.db import transaction
 from django.utils import timezone
 from .models import Payment
 
@@ -36,12 +37,14 @@ class PaymentProcessor:
             'message': 'تمت العملية بنجاح',
             'timestamp': timezone.now().isoformat()
         }
-        payment.save()
-        
-        # تحديث حالة الحجز
-        booking = payment.booking
-        booking.status = 'paid'
-        booking.save()
+        # تسجيل نتيجة البوابة في الدفعة والحجز معاً
+        with transaction.atomic():
+            payment.save()
+            
+            # تحديث حالة الحجز
+            booking = payment.booking
+            booking.status = 'paid'
+            booking.save()
         
         return True
     
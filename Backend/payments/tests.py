@@ -1,3 +1,106 @@
-from django.test import TestCase
+from datetime import date
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+
+from rest_framework.test import APIClient
+
+from bookings.models import Booking, IdempotencyKey
+from packages.models import Package
+from .models import Payment
+from .services import PaymentProcessor
+
+
+def create_user(username='traveler'):
+    return get_user_model().objects.create_user(username=username, password='secret', email=f'{username}@example.com')
+
+
+def create_booking(user):
+    package = Package.objects.create(
+        title='باقة', type='cultural', description='وصف', short_description='مختصر', duration_days=3,
+        base_price=Decimal('100'), daily_schedule={}, terms_conditions='-', cancellation_policy='-'
+    )
+    return Booking.objects.create(
+        user=user, booking_type='package', package=package, total_price=Decimal('100'),
+        start_date=date(2026, 12, 1), end_date=date(2026, 12, 3)
+    )
+
+
+class PaymentInitiationTests(TransactionTestCase):
+    """بدء الدفع: الدفعة والمفتاح يُثبتان قبل بوابة الدفع، والبوابة تُستدعى خارج أي معاملة"""
+
+    def setUp(self):
+        self.user = create_user()
+        self.booking = create_booking(self.user)
+        self.client = APIClient(SERVER_NAME='localhost')
+        self.client.force_authenticate(self.user)
+        self.url = f'/api/payments/initiate/{self.booking.booking_number}/'
+
+    def post(self, key='k1'):
+        return self.client.post(self.url, {'payment_method': 'credit_card'}, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_gateway_runs_outside_transaction(self):
+        seen = {}
+
+        def gateway(payment):
+            seen['in_atomic_block'] = connection.in_atomic_block
+            # ما يراه اتصال آخر: الدفعة والمفتاح مثبتان قبل الاتصال بالبوابة
+            seen['payment'] = Payment.objects.get(pk=payment.pk).status
+            seen['key'] = IdempotencyKey.objects.get().status
+            return PaymentProcessor._simulate_successful_payment(payment)
+
+        with mock.patch.object(PaymentProcessor, 'process_payment', side_effect=gateway) as process_payment:
+            first = self.post()
+            second = self.post()
+        self.assertEqual(seen, {'in_atomic_block': False, 'payment': 'processing', 'key': 'processing'})
+        self.assertEqual((first.status_code, second.status_code), (200, 200))
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(process_payment.call_count, 1)
+        self.assertEqual(Payment.objects.get().status, 'completed')
+        self.booking.refresh_from_db()
+        self.assertEqual(self.booking.status, 'paid')
+
+    def test_failed_payment_is_replayed(self):
+        with mock.patch.object(PaymentProcessor, 'process_payment', side_effect=PaymentProcessor._simulate_failed_payment):
+            first = self.post()
+            second = self.post()
+        self.assertEqual((first.status_code, second.status_code), (400, 400))
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(Payment.objects.get().status, 'failed')
+
+    def test_payment_in_progress_is_not_stored(self):
+        Payment.objects.create(booking=self.booking, amount=Decimal('100'), payment_method='credit_card', status='processing')
+        with mock.patch.object(PaymentProcessor, 'process_payment') as process_payment:
+            response = self.post()
+        self.assertEqual(response.status_code, 409)
+        process_payment.assert_not_called()
+        # التعارض مؤقت فلا يُحفظ رده مع المفتاح
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+
+class PaymentListQueryTests(TestCase):
+    """قائمة الدفعات باستعلامين (العدّ والصفحة مع الحجز وعلاقاته) مهما زاد عدد الدفعات"""
+
+    def setUp(self):
+        self.user = create_user()
+        self.client = APIClient(SERVER_NAME='localhost')
+        self.client.force_authenticate(self.user)
+
+    def add_payments(self, count):
+        for _ in range(count):
+            Payment.objects.create(booking=create_booking(self.user), amount=Decimal('100'), payment_method='credit_card')
+
+    def assert_list_queries(self, expected_rows):
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/payments/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), expected_rows)
+
+    def test_query_count_is_constant(self):
+        self.add_payments(1)
+        self.assert_list_queries(1)
+        self.add_payments(6)
+        self.assert_list_queries(7)
@@ -3,6 +3,7 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from django.db import transaction
 from django.utils import timezone
+from django.utils.decorators import method_decorator
 from .models import Payment, PaymentGateway
 from .serializers import (
     PaymentSerializer, PaymentCreateSerializer, PaymentMethodSerializer,
@@ -11,18 +12,18 @@ from .serializers import (
 from rest_framework import serializers
 from .services import PaymentProcessor
 from bookings.models import Booking
+from bookings.idempotency import idempotent
+from travel_core.mixins import EagerLoadingMixin
 
-class PaymentListView(generics.ListAPIView):
+class PaymentListView(EagerLoadingMixin, generics.ListAPIView):
     """قائمة الدفعات للمستخدم"""
     serializer_class = PaymentSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return Payment.objects.filter(booking__user=self.request.user).select_related(
-            'booking', 'booking__package', 'booking__custom_trip'
-        ).order_by('-created_at')
+        return Payment.objects.filter(booking__user=self.request.user).order_by('-created_at')
 
-class PaymentDetailView(generics.RetrieveAPIView):
+class PaymentDetailView(EagerLoadingMixin, generics.RetrieveAPIView):
     """تفاصيل دفعة معينة"""
     serializer_class = PaymentSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -31,56 +32,67 @@ class PaymentDetailView(generics.RetrieveAPIView):
     def get_queryset(self):
         return Payment.objects.filter(booking__user=self.request.user)
 
+@method_decorator(idempotent('payment-create', atomic=False), name='post')
 class PaymentCreateView(generics.CreateAPIView):
     """إنشاء دفعة جديدة"""
     serializer_class = PaymentCreateSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def perform_create(self, serializer):
-        with transaction.atomic():
-            payment = serializer.save()
-            
-            # معالجة الدفعة
-            success = PaymentProcessor.process_payment(payment)
-            
-            if not success:
-                raise serializers.ValidationError("فشل في معالجة الدفعة")
+        # صف الدفعة يُثبت قبل الاتصال ببوابة الدفع ولا تبقى معاملة مفتوحة أثناءه
+        payment = serializer.save(status='processing')
+        
+        # معالجة الدفعة
+        success = PaymentProcessor.process_payment(payment)
+        
+        if not success:
+            raise serializers.ValidationError("فشل في معالجة الدفعة")
 
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
+@idempotent('payment-initiate', atomic=False)
 def initiate_payment(request, booking_number):
     """بدء عملية دفع لحجز معين"""
     try:
-        booking = Booking.objects.get(booking_number=booking_number, user=request.user)
-        
-        # التحقق من أن الحجز في حالة يمكن الدفع لها
-        if booking.status not in ['confirmed', 'pending']:
-            return Response(
-                {'error': 'لا يمكن الدفع لهذا الحجز في حالته الحالية'}, 
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        # التحقق من عدم وجود دفعة سابقة ناجحة لنفس الحجز
-        existing_payment = Payment.objects.filter(
-            booking=booking, 
-            status='completed'
-        ).first()
-        
-        if existing_payment:
-            return Response(
-                {'error': 'تم دفع هذا الحجز مسبقاً'}, 
-                status=status.HTTP_400_BAD_REQUEST
+        with transaction.atomic():
+            booking = Booking.objects.select_for_update().get(booking_number=booking_number, user=request.user)
+            
+            # التحقق من أن الحجز في حالة يمكن الدفع لها
+            if booking.status not in ['confirmed', 'pending']:
+                return Response(
+                    {'error': 'لا يمكن الدفع لهذا الحجز في حالته الحالية'}, 
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            
+            # التحقق من عدم وجود دفعة سابقة ناجحة لنفس الحجز
+            existing_payment = Payment.objects.filter(
+                booking=booking, 
+                status='completed'
+            ).first()
+            
+            if existing_payment:
+                return Response(
+                    {'error': 'تم دفع هذا الحجز مسبقاً'}, 
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            # دفعة أخرى لنفس الحجز ما زالت لدى بوابة الدفع
+            if Payment.objects.filter(booking=booking, status='processing').exists():
+                return Response(
+                    {'error': 'توجد عملية دفع قيد المعالجة لهذا الحجز'},
+                    status=status.HTTP_409_CONFLICT
+                )
+
+            # إنشاء دفعة جديدة تُثبت قبل الاتصال ببوابة الدفع
+            payment = Payment.objects.create(
+                booking=booking,
+                amount=booking.total_price,
+                payment_method=request.data.get('payment_method', 'credit_card'),
+                currency=request.data.get('currency', 'SYP'),
+                status='processing'
             )
 
-        # إنشاء دفعة جديدة
-        payment = Payment.objects.create(
-            booking=booking,
-            amount=booking.total_price,
-            payment_method=request.data.get('payment_method', 'credit_card'),
-            currency=request.data.get('currency', 'SYP')
-        )
-
-        # معالجة الدفعة
+        # معالجة الدفعة خارج المعاملة: لا أقفال أثناء الاتصال، والنتيجة تُسجل بعده
         success = PaymentProcessor.process_payment(payment)
         
         if success:
@@ -0,0 +1,79 @@
+from functools import lru_cache
+
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+from rest_framework.relations import ManyRelatedField, RelatedField
+
+
+def _relation(model, name):
+    """حقل العلاقة باسم الوصول (بما فيه العلاقات العكسية مثل foo_set) أو None"""
+    try:
+        field = model._meta.get_field(name)
+    except FieldDoesNotExist:
+        field = next(
+            (rel for rel in model._meta.related_objects if rel.get_accessor_name() == name), None
+        )
+    return field if field is not None and field.is_relation else None
+
+
+def _collect(serializer, model, prefix, in_prefetch, select, prefetch):
+    for field in serializer.fields.values():
+        if field.write_only:
+            continue
+        # حقل المفتاح الأجنبي يقرأ المعرف من الصف نفسه دون استعلام
+        if isinstance(field, RelatedField) and field.use_pk_only_optimization():
+            continue
+
+        nested = field.child if isinstance(field, serializers.ListSerializer) else field
+        if field.source == '*':
+            if isinstance(nested, serializers.BaseSerializer):
+                _collect(nested, model, prefix, in_prefetch, select, prefetch)
+            continue
+
+        # أطول بادئة من المصدر تمثل سلسلة علاقات (user.get_full_name ← user)
+        names, current, many = [], model, in_prefetch
+        for name in field.source.split('.'):
+            relation = _relation(current, name)
+            if relation is None:
+                break
+            names.append(name)
+            many = many or relation.many_to_many or relation.one_to_many
+            current = relation.related_model
+        if not names:
+            continue
+
+        path = prefix + '__'.join(names)
+        (prefetch if many or isinstance(field, ManyRelatedField) else select)[path] = None
+        if len(names) == len(field.source.split('.')) and isinstance(nested, serializers.BaseSerializer):
+            _collect(nested, current, path + '__', many, select, prefetch)
+
+    # علاقات لا تظهر في مصادر الحقول (خصائص، SerializerMethodField) تُعلن صراحة
+    for path in getattr(serializer, 'select_related_fields', ()):
+        (prefetch if in_prefetch else select)[prefix + path] = None
+    for path in getattr(serializer, 'prefetch_related_fields', ()):
+        prefetch[prefix + path] = None
+
+
+@lru_cache(maxsize=None)
+def eager_loading_plan(serializer_class):
+    """خطة التحميل المسبق المشتقة من حقول المُسلسِل والمُسلسِلات المتداخلة فيه: (select_related, prefetch_related)"""
+    select, prefetch = {}, {}
+    _collect(serializer_class(), serializer_class.Meta.model, '', False, select, prefetch)
+    return tuple(select), tuple(prefetch)
+
+
+def setup_eager_loading(queryset, serializer_class):
+    """تطبيق خطة المُسلسِل على الاستعلام: عدد ثابت من الاستعلامات مهما كان حجم الصفحة"""
+    select, prefetch = eager_loading_plan(serializer_class)
+    if select:
+        queryset = queryset.select_related(*select)
+    if prefetch:
+        queryset = queryset.prefetch_related(*prefetch)
+    return queryset
+
+
+class EagerLoadingMixin:
+    """عروض القوائم والتفاصيل: تحميل كل العلاقات التي يقرأها المُسلسِل مسبقاً بعد التصفية"""
+
+    def filter_queryset(self, queryset):
+        return setup_eager_loading(super().filter_queryset(queryset), self.get_serializer_class())
@@ -0,0 +1,114 @@
+import base64
+import json
+import uuid
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(PageNumberPagination):
+    """ترقيم بأرقام الصفحات افتراضياً، وبالمؤشر (keyset) عند طلب ?pagination=cursor أو ?cursor="""
+    cursor_query_param = 'cursor'
+    mode_query_param = 'pagination'
+    # حجم الصفحة من العميل (?page_size=) بحد أعلى يمنع طلب الجدول كاملاً
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    invalid_cursor_message = 'مؤشر غير صالح'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.cursor_mode = self.wants_cursor(request)
+        if not self.cursor_mode:
+            return super().paginate_queryset(queryset, request, view)
+
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        self.ordering = self.get_ordering(queryset)
+        queryset = queryset.order_by(*self.ordering)
+
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded:
+            queryset = queryset.filter(self.build_seek_filter(self.decode_cursor(encoded)))
+
+        # جلب صف إضافي لمعرفة وجود صفحة تالية
+        results = list(queryset[:page_size + 1])
+        self.has_next = len(results) > page_size
+        self.page = results[:page_size]
+        return self.page
+
+    def get_paginated_response(self, data):
+        if not self.cursor_mode:
+            return super().get_paginated_response(data)
+        return Response({
+            'next': self.get_next_cursor_link(),
+            'results': data,
+        })
+
+    def wants_cursor(self, request):
+        return (
+            self.cursor_query_param in request.query_params or
+            request.query_params.get(self.mode_query_param) == 'cursor'
+        )
+
+    def get_ordering(self, queryset):
+        """حقول الترتيب الحالية مع إضافة المعرف لضمان ترتيب فريد"""
+        ordering = list(queryset.query.order_by or queryset.model._meta.ordering or ['-pk'])
+        if not all(isinstance(field, str) for field in ordering):
+            raise NotFound('الترتيب الحالي لا يدعم الترقيم بالمؤشر')
+        names = [field.lstrip('-') for field in ordering]
+        if 'id' not in names and 'pk' not in names:
+            ordering.append('-id' if ordering[-1].startswith('-') else 'id')
+        return ordering
+
+    def build_seek_filter(self, values):
+        """شرط (f1, f2, ...) بعد/قبل القيم الأخيرة بالمقارنة المعجمية"""
+        condition = Q()
+        equal = Q()
+        for field, value in zip(self.ordering, values):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+
+        # شرط إضافي على الحقل الأول ليستفيد المحرك من الفهرس كمسح مدى
+        first = self.ordering[0]
+        first_lookup = 'lte' if first.startswith('-') else 'gte'
+        return Q(**{f'{first.lstrip("-")}__{first_lookup}': values[0]}) & condition
+
+    def get_next_cursor_link(self):
+        if not self.has_next or not self.page:
+            return None
+        last = self.page[-1]
+        values = [self._serialize_value(getattr(last, field.lstrip('-'))) for field in self.ordering]
+        url = remove_query_param(self.request.build_absolute_uri(), self.page_query_param)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(values))
+
+    def encode_cursor(self, values):
+        payload = json.dumps({'o': self.ordering, 'v': values}, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+
+    def decode_cursor(self, encoded):
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+            values = payload['v']
+        except (TypeError, ValueError, KeyError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+        # المؤشر صالح فقط لنفس الترتيب الذي أُنشئ به
+        if payload.get('o') != self.ordering or len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return values
+
+    @staticmethod
+    def _serialize_value(value):
+        if isinstance(value, (datetime, date)):
+            return value.isoformat()
+        if isinstance(value, (Decimal, uuid.UUID)):
+            return str(value)
+        return value
@@ -1,5 +1,7 @@
 import os
+import tempfile
 from pathlib import Path
+from corsheaders.defaults import default_headers
 from decouple import config
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -76,6 +78,45 @@ DATABASES = {
     }
 }
 
+# Cache
+# يُفضَّل Redis في الإنتاج حتى تتشارك العمليات نفس الكاش والعدادات
+REDIS_URL = config('REDIS_URL', default='')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        },
+        # عدادات المشاهدات المعلقة: يجب ألا يطردها Redis (سياسة maxmemory-policy من نوع volatile-* أو noeviction)
+        'counters': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+            'KEY_PREFIX': 'counters',
+        },
+    }
+else:
+    # كاش خاص بكل عملية: الردود تُخزن لكل عامل على حدة، وأجيال الكتالوج في قاعدة البيانات فلا تُخدم بيانات قديمة
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'travel-core',
+        },
+        # عدادات المشاهدات المعلقة بلا قص: عددها محدود بعدد الباقات ولا تُفقد بضغط كاش الردود
+        'counters': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'travel-core-counters',
+            'OPTIONS': {'MAX_ENTRIES': 10 ** 9},
+        },
+    }
+
+CATALOG_CACHE_TIMEOUT = config('CATALOG_CACHE_TIMEOUT', default=300, cast=int)
+
+# لقطة الكتالوج المشتركة بين العمليات (ملف معيّن في الذاكرة)
+CATALOG_SNAPSHOT_PATH = config(
+    'CATALOG_SNAPSHOT_PATH', default=os.path.join(tempfile.gettempdir(), 'travel_core_catalog.snapshot')
+)
+CATALOG_SNAPSHOT_CHECK_INTERVAL = config('CATALOG_SNAPSHOT_CHECK_INTERVAL', default=2, cast=float)
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -127,13 +168,14 @@ REST_FRAMEWORK = {
         'rest_framework.filters.SearchFilter',
         'rest_framework.filters.OrderingFilter',
     ),
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_PAGINATION_CLASS': 'travel_core.pagination.KeysetPagination',
     'PAGE_SIZE': 20,
 }
 
 # CORS settings
 CORS_ALLOWED_ORIGINS = config('CORS_ALLOWED_ORIGINS', default='http://localhost:3000').split(',')
 CORS_ALLOW_CREDENTIALS = True
+CORS_ALLOW_HEADERS = (*default_headers, 'idempotency-key')
 
 # JWT Settings
 from datetime import timedelta
@@ -142,6 +184,49 @@ SIMPLE_JWT = {
     'REFRESH_TOKEN_LIFETIME': timedelta(days=config('JWT_EXPIRATION_DAYS', default=7, cast=int)),
 }
 
+# Search settings
+SEARCH_MAX_RESULTS = config('SEARCH_MAX_RESULTS', default=1000, cast=int)
+
+# Package similarity settings
+SIMILARITY_TOP_K = config('SIMILARITY_TOP_K', default=10, cast=int)
+
+# Popularity counter settings
+POPULARITY_FLUSH_THRESHOLD = config('POPULARITY_FLUSH_THRESHOLD', default=100, cast=int)
+POPULARITY_FLUSH_INTERVAL = config('POPULARITY_FLUSH_INTERVAL', default=60, cast=int)
+
+# Itinerary settings
+ITINERARY_MAX_DAY_HOURS = config('ITINERARY_MAX_DAY_HOURS', default=10, cast=float)
+ITINERARY_AVERAGE_SPEED_KMH = config('ITINERARY_AVERAGE_SPEED_KMH', default=60, cast=float)
+ITINERARY_ROAD_FACTOR = config('ITINERARY_ROAD_FACTOR', default=1.3, cast=float)
+
+# AI assistant settings (rules: المساعد القائم على القواعد، fake: نموذج وهمي للاختبارات، openai: واجهة متوافقة مع OpenAI)
+AI_BACKEND = config('AI_BACKEND', default='rules')
+AI_FAKE_BACKEND_DELAY = config('AI_FAKE_BACKEND_DELAY', default=0.0, cast=float)
+AI_API_BASE = config('AI_API_BASE', default='https://api.openai.com/v1')
+AI_API_KEY = config('AI_API_KEY', default='')
+AI_MODEL_NAME = config('AI_MODEL_NAME', default='travel-assistant')
+AI_REQUEST_TIMEOUT = config('AI_REQUEST_TIMEOUT', default=10.0, cast=float)
+AI_MAX_RETRIES = config('AI_MAX_RETRIES', default=2, cast=int)
+AI_RETRY_BACKOFF = config('AI_RETRY_BACKOFF', default=0.25, cast=float)
+AI_MAX_CONCURRENCY = config('AI_MAX_CONCURRENCY', default=8, cast=int)
+AI_QUEUE_TIMEOUT = config('AI_QUEUE_TIMEOUT', default=1.0, cast=float)
+AI_CIRCUIT_FAILURE_THRESHOLD = config('AI_CIRCUIT_FAILURE_THRESHOLD', default=5, cast=int)
+AI_CIRCUIT_RESET_TIMEOUT = config('AI_CIRCUIT_RESET_TIMEOUT', default=30.0, cast=float)
+AI_MEMO_MAX_ENTRIES = config('AI_MEMO_MAX_ENTRIES', default=1024, cast=int)
+AI_MEMO_TTL = config('AI_MEMO_TTL', default=600, cast=int)
+AI_LOG_BUFFER_SIZE = config('AI_LOG_BUFFER_SIZE', default=1000, cast=int)
+AI_LOG_BATCH_SIZE = config('AI_LOG_BATCH_SIZE', default=100, cast=int)
+AI_LOG_FLUSH_INTERVAL = config('AI_LOG_FLUSH_INTERVAL', default=2.0, cast=float)
+AI_LOG_OVERFLOW = config('AI_LOG_OVERFLOW', default='wait')
+AI_LOG_OVERFLOW_WAIT = config('AI_LOG_OVERFLOW_WAIT', default=0.1, cast=float)
+
+# أرقام الحجوزات والدفعات: حجم المجال المحجوز لكل عملية ومفتاح تبعثر الأرقام (افتراضياً SECRET_KEY)
+NUMBERING_BLOCK_SIZE = config('NUMBERING_BLOCK_SIZE', default=100, cast=int)
+NUMBERING_KEY = config('NUMBERING_KEY', default='')
+
+# مفاتيح Idempotency-Key: مدة الاحتفاظ بالرد المحفوظ
+IDEMPOTENCY_TTL = config('IDEMPOTENCY_TTL', default=86400, cast=int)
+
 # Logging
 LOGGING = {
     'version': 1,
@@ -157,4 +242,4 @@ LOGGING = {
         'handlers': ['file'],
         'level': 'DEBUG',
     },
-}
\ No newline at end of file
+}
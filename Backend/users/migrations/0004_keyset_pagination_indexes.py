@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-17 17:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('users', '0003_user_users_created_6541e9_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['created_at', 'id'], name='users_created_1b562c_idx'),
+        ),
+    ]
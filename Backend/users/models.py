@@ -28,6 +28,7 @@ class User(AbstractUser):
             models.Index(fields=['email', 'is_active']),
             models.Index(fields=['role', 'is_verified']),
             models.Index(fields=['created_at']),
+            models.Index(fields=['created_at', 'id']),
         ]
 
     def __str__(self):
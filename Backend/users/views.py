@@ -88,7 +88,7 @@ def logout_user(request):
 
 class UserListAPIView(generics.ListAPIView):
     """قائمة المستخدمين (للمشرفين فقط)"""
-    queryset = User.objects.all()
+    queryset = User.objects.order_by('-created_at')
     serializer_class = UserProfileSerializer
     permission_classes = [permissions.IsAdminUser]
     filter_fields = ['role', 'is_active', 'is_verified']
\ No newline at end of file